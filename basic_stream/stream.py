@@ -1,15 +1,24 @@
 import cv2
+import os
+import sys
+
+# The shared frame source code lives in full_code/.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "full_code")
+)
+from frame_source import open_source
 
 
 def main():
     # Update camera_index if your camera is not at index 0
     camera_index = 1
 
-    # Create a VideoCapture object
-    cap = cv2.VideoCapture(camera_index)
+    # camera_index may also be a video file, a photo directory or
+    # "synthetic" to run without the camera (see full_code/frame_source.py).
+    cap = open_source(camera_index)
 
     if not cap.isOpened():
-        print(f"Cannot open camera at index {camera_index}")
+        print(f"Cannot open frame source {camera_index}")
         return
 
     while True:
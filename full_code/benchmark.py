@@ -0,0 +1,479 @@
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from frame_source import FAST, ImageDirectorySource
+from image_writer import read_image
+from palette import (
+    PaletteCache,
+    TemperatureLUT,
+    TemperaturePalette,
+    estimate_temperature,
+    extract_color_temp_map,
+    temperature_map,
+)
+from pipeline import CaptureThread, StageThread
+from points import PointSampler
+from regions import RegionStats
+from temperature_log import TemperatureLogWriter
+
+PHOTOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "photos")
+# Results of a reference run on this machine, written by --save-baseline
+# and compared against by --baseline without a file name.
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"
+)
+# Results of the latest run; like the baseline, not kept in git.
+RESULTS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_results.json"
+)
+SCALE_BOX = (306, 36, 315, 211)
+# The photos' scale range; any range times the same.
+MIN_TEMP = 20.0
+MAX_TEMP = 40.0
+
+# The grids the cases are run over.
+POINT_COUNTS = (1, 5, 25, 100)
+PALETTE_ROWS = (44, 175, 700)  # 175 is the scale bar of the FLIR stream.
+INDEX_ROWS = (2800, 11200)  # extra rows for the nearest-color index scaling
+INDEX_COLORS = 5000  # distinct frame colors per nearest-color index run
+SCALE_FACTORS = (1, 2, 4)  # frame sizes 320x246, 640x492 and 1280x984.
+PIPELINE_POINTS = 25
+
+
+def random_points(count, scale_box, height, seed=0):
+    """count (x, y, name) points left of the scale bar."""
+    rng = np.random.default_rng(seed)
+    xs = rng.integers(0, scale_box[0] - 20, count)
+    ys = rng.integers(0, height, count)
+    return [(int(x), int(y), f"Point {i+1}") for i, (x, y) in enumerate(zip(xs, ys))]
+
+
+def resample_palette(palette, rows):
+    """The palette stretched or squeezed to rows rows, as a taller or shorter scale bar."""
+    old = np.linspace(0.0, 1.0, len(palette))
+    new = np.linspace(0.0, 1.0, rows)
+    colors = np.stack(
+        [np.interp(new, old, palette.colors[:, c]) for c in range(3)], axis=1
+    )
+    temps = np.linspace(palette.temps[0], palette.temps[-1], rows)
+    return TemperaturePalette(temps, colors)
+
+
+def distinct_colors(frame, count):
+    """Up to count distinct BGR colors of frame, left of the scale bar."""
+    pixels = frame[:, : SCALE_BOX[0]].reshape(-1, 3)
+    colors = np.unique(pixels, axis=0)
+    return np.random.default_rng(0).permutation(colors)[:count]
+
+
+def scaled(frames, factor):
+    """frames and the scale box enlarged factor times, keeping palette colors exact."""
+    if factor == 1:
+        return frames, SCALE_BOX
+    box = tuple(v * factor for v in SCALE_BOX)
+    frames = [
+        cv2.resize(f, None, fx=factor, fy=factor, interpolation=cv2.INTER_NEAREST)
+        for f in frames
+    ]
+    return frames, box
+
+
+def make_cases(frames, palette_photos, photo_paths):
+    """
+    Return {name: (setup, run, teardown)} for frames, read from photo_paths.
+    setup() runs once before the
+    timed runs and returns the state run(state) works on; run processes
+    every frame once and returns the number of calls it made, which the time
+    is divided by. teardown(state), if not None, cleans up afterwards.
+    """
+    cases = {}
+
+    for factor in SCALE_FACTORS:
+
+        def setup(factor=factor):
+            return scaled(frames, factor)
+
+        def run(state):
+            scaled_frames, (x1, y1, x2, y2) = state
+            for frame in scaled_frames:
+                extract_color_temp_map(frame, MIN_TEMP, MAX_TEMP, x1, y1, x2, y2)
+            return len(scaled_frames)
+
+        width, height = frames[0].shape[1] * factor, frames[0].shape[0] * factor
+        cases[f"extract_color_temp_map[res={width}x{height}]"] = (setup, run, None)
+
+    def palettes(rows):
+        result = []
+        for frame in frames:
+            palette = extract_color_temp_map(frame, MIN_TEMP, MAX_TEMP)
+            result.append(palette if rows is None else resample_palette(palette, rows))
+        return result
+
+    # The per-point estimate, as the single-point scripts call it; timed per
+    # call, i.e. per point.
+    for count in POINT_COUNTS:
+
+        def setup(count=count):
+            height = frames[0].shape[0]
+            return palettes(None), random_points(count, SCALE_BOX, height)
+
+        def run(state):
+            frame_palettes, points = state
+            for frame, palette in zip(frames, frame_palettes):
+                for x, y, _ in points:
+                    estimate_temperature(frame, palette, x, y)
+            return len(frames) * len(points)
+
+        cases[f"estimate_temperature[points={count}]"] = (setup, run, None)
+
+    for rows in PALETTE_ROWS:
+
+        def setup(rows=rows):
+            height = frames[0].shape[0]
+            return palettes(rows), random_points(5, SCALE_BOX, height)
+
+        def run(state):
+            frame_palettes, points = state
+            for frame, palette in zip(frames, frame_palettes):
+                for x, y, _ in points:
+                    estimate_temperature(frame, palette, x, y)
+            return len(frames) * len(points)
+
+        cases[f"estimate_temperature[points=5,rows={rows}]"] = (setup, run, None)
+
+        # What a palette cache miss costs on top of extracting the palette:
+        # the index build and an empty LUT.
+        def setup(rows=rows):
+            return palettes(rows)[:palette_photos]
+
+        def run(state):
+            for palette in state:
+                TemperaturePalette(palette.temps, palette.colors).prepare()
+            return len(state)
+
+        cases[f"palette_build[rows={rows}]"] = (setup, run, None)
+
+    # The exact nearest-row search per distinct color, over taller and taller
+    # scale bars; timed per color. The k-d tree keeps this logarithmic in the
+    # number of rows where the per-row scan is linear.
+    for rows in PALETTE_ROWS + INDEX_ROWS:
+
+        def setup(rows=rows):
+            palette = resample_palette(palettes(None)[0], rows)
+            return palette.index, distinct_colors(frames[0], INDEX_COLORS)
+
+        def run(state):
+            index, colors = state
+            index.query_rows(colors)
+            return len(colors)
+
+        cases[f"nearest_color_index[rows={rows}]"] = (setup, run, None)
+
+    # The batched point lookup the capture pipeline uses.
+    for count in POINT_COUNTS:
+
+        def setup(count=count):
+            height = frames[0].shape[0]
+            palette = palettes(None)[0]
+            palette.index
+            return palette, PointSampler(random_points(count, SCALE_BOX, height))
+
+        def run(state):
+            palette, sampler = state
+            for frame in frames:
+                sampler.sample(frame, palette)
+            return len(frames)
+
+        cases[f"point_sampler[points={count}]"] = (setup, run, None)
+
+    # Whole-frame temperature maps, searched every time and through the LUT;
+    # the warm-up run fills each palette's LUT, so lut=on is a frame whose
+    # colors have all been seen before.
+    for use_lut in (False, True):
+
+        def setup(use_lut=use_lut):
+            result = []
+            for palette in palettes(None):
+                palette.use_lut = use_lut
+                palette.prepare()
+                result.append(palette)
+            return result
+
+        def run(state):
+            for frame, palette in zip(frames, state):
+                temperature_map(frame, palette)
+            return len(frames)
+
+        lut = "on" if use_lut else "off"
+        cases[f"temperature_map[lut={lut}]"] = (setup, run, None)
+
+    # The first frame under a new scale: every color goes through an empty LUT.
+    def setup():
+        result = palettes(None)
+        for palette in result:
+            palette.prepare()
+        return result
+
+    def run(state):
+        for frame, palette in zip(frames, state):
+            TemperatureLUT(palette).lookup(frame)
+        return len(frames)
+
+    cases["temperature_map[lut=empty]"] = (setup, run, None)
+
+    # One processing-stage iteration as in user_input.py: palette from the
+    # cache, all points, the temperature map and two region summaries.
+    for factor in SCALE_FACTORS:
+
+        def setup(factor=factor):
+            scaled_frames, box = scaled(frames, factor)
+            height, width = scaled_frames[0].shape[:2]
+            x1, y1, x2, y2 = box
+            cache = PaletteCache(x1=x1, y1=y1, x2=x2, y2=y2)
+            sampler = PointSampler(random_points(PIPELINE_POINTS, box, height))
+            regions = RegionStats(
+                [
+                    ("rect", [(10, 10), (x1 // 2, height // 2)], "Rect"),
+                    (
+                        "poly",
+                        [
+                            (x1 // 2, height // 2),
+                            (x1 - 10, height // 2),
+                            (x1 // 2, height - 10),
+                        ],
+                        "Poly",
+                    ),
+                ]
+            )
+            return scaled_frames, cache, sampler, regions
+
+        def run(state):
+            scaled_frames, cache, sampler, regions = state
+            for frame in scaled_frames:
+                palette = cache.get(frame, MIN_TEMP, MAX_TEMP)
+                sampler.sample(frame, palette)
+                box = regions.bounds(frame.shape[:2])
+                regions.compute(temperature_map(frame, palette, box))
+            return len(scaled_frames)
+
+        width, height = frames[0].shape[1] * factor, frames[0].shape[0] * factor
+        cases[f"pipeline[res={width}x{height}]"] = (setup, run, None)
+
+    # The threaded pipeline end to end: the benchmarked photos read from disk
+    # by a frame source as fast as possible, processed, and logged to a
+    # binary log. The palette cache carries over from the warm-up run, as in
+    # a long session.
+    def setup():
+        height = frames[0].shape[0]
+        sampler = PointSampler(random_points(PIPELINE_POINTS, SCALE_BOX, height))
+        work_dir = tempfile.mkdtemp(prefix="benchmark_")
+        photos_dir = os.path.join(work_dir, "photos")
+        os.makedirs(photos_dir)
+        for path in photo_paths:
+            shutil.copy2(path, photos_dir)
+        return work_dir, photos_dir, sampler, PaletteCache()
+
+    def run(state):
+        log_dir, photos_dir, sampler, cache = state
+        source = ImageDirectorySource(photos_dir, FAST)
+        log = TemperatureLogWriter(
+            os.path.join(log_dir, "benchmark.bin"), sampler.names, overwrite=True
+        )
+
+        def process(sample):
+            _, capture_time, frame = sample
+            palette = cache.get(frame, MIN_TEMP, MAX_TEMP)
+            return capture_time, sampler.sample(frame, palette)
+
+        def record(result):
+            log.append(result[0], 0, result[1])
+
+        capture = CaptureThread(source, 0.0, display=False)
+        processing = StageThread("processing", process, capture.samples, outbox_size=4)
+        sink = StageThread("sink", record, processing.outbox)
+        for thread in (capture, processing, sink):
+            thread.start()
+        for thread in (capture, processing, sink):
+            thread.join()
+        log.close()
+        return sink.counter.count
+
+    def teardown(state):
+        shutil.rmtree(state[0])
+
+    cases["end_to_end[source=photos]"] = (setup, run, teardown)
+    return cases
+
+
+def time_case(setup, run, repeat, teardown=None, min_time=0.2):
+    """
+    Run a case once to warm up, then time it repeat times; per-call times in
+    microseconds. Like timeit, fast cases make several passes over the
+    frames per timed run, so every run lasts at least min_time seconds.
+    """
+    state = setup()
+    try:
+        start = time.perf_counter()
+        run(state)
+        passes = max(1, math.ceil(min_time / (time.perf_counter() - start)))
+        per_call = []
+        for _ in range(repeat):
+            calls = 0
+            start = time.perf_counter()
+            for _ in range(passes):
+                calls += run(state)
+            per_call.append((time.perf_counter() - start) / calls * 1e6)
+    finally:
+        if teardown is not None:
+            teardown(state)
+    return {
+        "median_us": statistics.median(per_call),
+        "min_us": min(per_call),
+        "max_us": max(per_call),
+        "calls": calls,
+        "repeat": repeat,
+    }
+
+
+def environment():
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print every case against the baseline and return the names of those
+    whose median got more than threshold (a fraction) slower.
+    """
+    regressions = []
+    print(f"{'case':<44} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<44} {'-':>12} {result['median_us']:>10.1f}us {'new':>8}")
+            continue
+        change = result["median_us"] / before["median_us"] - 1.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(
+            f"{name:<44} {before['median_us']:>10.1f}us {result['median_us']:>10.1f}us "
+            f"{change:>+7.1%}{flag}"
+        )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the temperature estimation path over the bundled photos."
+    )
+    parser.add_argument(
+        "--output",
+        default=RESULTS_FILE,
+        help=f"JSON file for the results (default: {os.path.basename(RESULTS_FILE)})",
+    )
+    parser.add_argument(
+        "--baseline",
+        nargs="?",
+        const=BASELINE_FILE,
+        help="JSON results to compare against (default: the saved baseline)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help=f"also save the results as the baseline, {os.path.basename(BASELINE_FILE)}",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="slowdown that counts as a regression (default 0.10 = 10%%)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument(
+        "--photos", type=int, help="use only the first this many photos"
+    )
+    parser.add_argument(
+        "--palette-photos",
+        type=int,
+        default=3,
+        help="photos whose palettes are rebuilt in the palette_build cases",
+    )
+    parser.add_argument("--filter", help="only run cases whose name contains this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = sorted(
+        os.path.join(PHOTOS_DIR, name)
+        for name in os.listdir(PHOTOS_DIR)
+        if name.lower().endswith(".png")
+    )[: args.photos]
+    frames = [read_image(path) for path in paths]
+    print(f"Benchmarking over {len(frames)} photos from '{PHOTOS_DIR}'.")
+
+    cases = make_cases(frames, args.palette_photos, paths)
+    if args.save_baseline and args.filter:
+        print("Warning: the saved baseline will only hold the filtered cases.")
+    results = {}
+    for name, (setup, run, teardown) in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = time_case(setup, run, args.repeat, teardown)
+        result = results[name]
+        print(
+            f"{name:<44} {result['median_us']:>10.1f}us per call "
+            f"(min {result['min_us']:.1f}us, {result['calls']} calls)"
+        )
+
+    report = {"environment": environment(), "photos": len(frames), "results": results}
+    outputs = [args.output] + ([BASELINE_FILE] if args.save_baseline else [])
+    for output in outputs:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to '{output}'.")
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(
+                f"Error: No baseline at '{args.baseline}'; record one with --save-baseline."
+            )
+            sys.exit(2)
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline["environment"]["platform"] != platform.platform():
+            print("Warning: the baseline was recorded on a different platform.")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(
+                f"{len(regressions)} cases regressed by more than {args.threshold:.0%}."
+            )
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+
+from frame_store import FrameStore, is_frame_store
+from image_writer import read_image
+from synthetic_frames import SyntheticFlirGenerator
+
+# Replay speeds: play recordings at the pace they were captured, or as fast
+# as frames can be produced. A number plays at that many frames per second.
+REALTIME = "realtime"
+FAST = "fast"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".npy")
+
+
+def parse_speed(speed):
+    """
+    Return a replay speed setting as REALTIME, FAST or a positive frame rate;
+    raise ValueError for anything else.
+    """
+    if speed in (REALTIME, FAST):
+        return speed
+    try:
+        rate = float(speed)
+    except (TypeError, ValueError):
+        rate = math.nan
+    if not 0 < rate < math.inf:
+        raise ValueError(
+            f"Invalid replay speed {speed!r}: use '{REALTIME}', '{FAST}' or a "
+            "positive number of frames per second."
+        )
+    return rate
+
+
+class FrameSource:
+    """
+    Base class for everything the capture scripts can read frames from. It
+    has the isOpened()/read()/release() subset of cv2.VideoCapture, so a
+    source can be used wherever a camera was. Subclasses implement
+    _next_frame(image), returning (frame, seconds since the first frame) or
+    None at the end; read() then paces the frames according to speed. As
+    with cv2.VideoCapture.read(image), a frame-sized image array passed to
+    read() is filled in place, e.g. a shared memory slot; cameras and videos
+    decode straight into it. Only a
+    camera is live: CaptureThread never holds up a live source, but lets
+    the processing stages keep up with a recording rather than drop frames.
+    """
+
+    live = False
+
+    def __init__(self, speed=REALTIME):
+        self.speed = parse_speed(speed)
+        self._start = None
+        self._count = 0
+
+    def isOpened(self):
+        return True
+
+    def _next_frame(self, image=None):
+        raise NotImplementedError
+
+    def read(self, image=None):
+        item = self._next_frame(image)
+        if item is None:
+            return False, None
+        frame, offset = item
+        if image is not None and frame is not image:
+            # Raises ValueError if the frame does not fit the array.
+            image[...] = frame
+            frame = image
+
+        # Wait until the frame is due: its own offset for real-time replay,
+        # or a fixed step for a fixed rate.
+        if self._start is None:
+            self._start = time.monotonic()
+        if self.speed == REALTIME:
+            due = self._start + offset
+        elif self.speed == FAST:
+            due = None
+        else:
+            due = self._start + self._count / self.speed
+        self._count += 1
+        if due is not None:
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return True, frame
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    """A live camera; it delivers frames at its own rate whatever the speed."""
+
+    live = True
+
+    def __init__(self, camera_index):
+        super().__init__(FAST)
+        self.cap = cv2.VideoCapture(camera_index)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _next_frame(self, image=None):
+        ret, frame = self.cap.read(image)
+        return (frame, 0.0) if ret else None
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """A recorded video; real-time replay follows the file's frame rate."""
+
+    def __init__(self, video_path, speed=REALTIME):
+        super().__init__(speed)
+        self.cap = cv2.VideoCapture(video_path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else 30.0
+        self._index = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _next_frame(self, image=None):
+        ret, frame = self.cap.read(image)
+        if not ret:
+            return None
+        offset = self._index / self.fps
+        self._index += 1
+        return frame, offset
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    """
+    The photos in a directory, in filename order, or the frames of a frame
+    store. Real-time replay follows the capture times: file modification
+    times for photos, the index timestamps for a frame store. With loop the
+    recording starts over at the end.
+    """
+
+    def __init__(self, directory, speed=REALTIME, loop=False):
+        super().__init__(speed)
+        self.directory = directory
+        self.loop = loop
+        self._position = 0
+        self._cycle_offset = 0.0
+        if is_frame_store(directory):
+            self._store = FrameStore(directory)
+            self._paths = None
+            times = self._store.timestamps
+        else:
+            self._store = None
+            self._paths = [
+                os.path.join(directory, name)
+                for name in sorted(os.listdir(directory))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+            times = np.array([os.path.getmtime(path) for path in self._paths])
+        self._offsets = times - times[0] if len(times) else times
+        # Leave the average gap between the last and first frame on a loop.
+        span = self._offsets[-1] if len(times) else 0.0
+        self._cycle = span + (span / (len(times) - 1) if len(times) > 1 else 0.0)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def isOpened(self):
+        return len(self) > 0
+
+    def _next_frame(self, image=None):
+        # Unreadable photos are skipped, for at most one full pass.
+        for _ in range(len(self)):
+            if self._position == len(self):
+                if not self.loop:
+                    return None
+                self._position = 0
+                self._cycle_offset += self._cycle
+            index = self._position
+            self._position += 1
+            if self._store is not None and image is not None:
+                frame = image
+                frame[...] = self._store.frame(index)
+            elif self._store is not None:
+                # The source's frames are handed to other threads, so they get
+                # a copy rather than a view into the memory-mapped chunk.
+                frame = np.array(self._store.frame(index))
+            else:
+                frame = read_image(self._paths[index])
+                if frame is None:
+                    print(
+                        f"WARNING: Could not read image {self._paths[index]}. Skipping."
+                    )
+                    continue
+            return frame, self._cycle_offset + self._offsets[index]
+        if len(self):
+            print(f"WARNING: No readable image left in '{self.directory}'. Stopping.")
+        return None
+
+
+class SyntheticSource(FrameSource):
+    """
+    Frames generated in memory by make_frame(index, t), where t is the
+    frame's time in seconds at the nominal fps; count frames, or endless.
+    """
+
+    def __init__(self, make_frame, fps=30.0, count=None, speed=REALTIME):
+        super().__init__(speed)
+        self.make_frame = make_frame
+        self.fps = fps
+        self.count = count
+        self._index = 0
+
+    def _next_frame(self, image=None):
+        if self.count is not None and self._index >= self.count:
+            return None
+        t = self._index / self.fps
+        frame = self.make_frame(self._index, t)
+        self._index += 1
+        return frame, t
+
+
+def open_source(source, speed=REALTIME):
+    """
+    Open a frame source from a setting: a camera index (1 or "1"), a video
+    file, a directory of photos or a frame store, or "synthetic" for
+    generated FLIR-style frames (see synthetic_frames.py), optionally with a
+    frame size as in "synthetic:640x492".
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        return CameraSource(int(source))
+    if str(source).startswith("synthetic"):
+        _, _, size = str(source).partition(":")
+        if size:
+            width, height = (int(n) for n in size.lower().split("x"))
+            generator = SyntheticFlirGenerator(width, height)
+        else:
+            generator = SyntheticFlirGenerator()
+        return SyntheticSource(generator, speed=speed)
+    if os.path.isdir(source):
+        return ImageDirectorySource(source, speed)
+    return VideoFileSource(source, speed)
@@ -0,0 +1,187 @@
+import json
+import os
+
+import numpy as np
+
+# One index record per stored frame; the frame number is its position.
+INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("chunk", "<u4"), ("slot", "<u4")])
+
+META_FILE = "meta.json"
+INDEX_FILE = "index.bin"
+
+
+def is_frame_store(store_dir):
+    """True if store_dir holds a frame store."""
+    return os.path.isfile(os.path.join(store_dir, META_FILE))
+
+
+def shape_store_dir(store_dir, shape):
+    """The store beside store_dir for frames of another shape: store_dir_WxH."""
+    height, width = shape[:2]
+    return f"{os.path.normpath(store_dir)}_{width}x{height}"
+
+
+def _chunk_path(store_dir, chunk):
+    return os.path.join(store_dir, f"chunk_{chunk:05d}.bin")
+
+
+class FrameStoreWriter:
+    """
+    Append-only store of fixed-shape uint8 frames. Frames are copied into
+    memory-mapped chunk files of chunk_frames frames each, preallocated when
+    the chunk is started, and every frame gets a (timestamp, chunk, slot)
+    record appended to index.bin. The index record is written after the
+    frame data, so readers never see a half-written frame.
+    Appending to an existing store continues after its last frame. If the
+    existing store holds frames of another shape, e.g. from a camera with
+    another resolution, the session's frames go to a store of their own
+    beside it instead (see shape_store_dir); store_dir names the store in use.
+    """
+
+    def __init__(self, store_dir, chunk_frames=256):
+        self._open(store_dir, chunk_frames)
+
+    def _open(self, store_dir, chunk_frames):
+        self.store_dir = store_dir
+        self.chunk_frames = chunk_frames
+        self.frame_shape = None
+        self._chunk = None
+        self._chunk_map = None
+        self._count = 0
+        self._appended = 0
+
+        if is_frame_store(store_dir):
+            with open(os.path.join(store_dir, META_FILE), "r") as f:
+                meta = json.load(f)
+            self.frame_shape = tuple(meta["shape"])
+            self.chunk_frames = meta["chunk_frames"]
+            self._count = os.path.getsize(self._index_path) // INDEX_DTYPE.itemsize
+            # Drop a record cut short by a crash so new records stay aligned.
+            with open(self._index_path, "r+b") as index:
+                index.truncate(self._count * INDEX_DTYPE.itemsize)
+        else:
+            os.makedirs(store_dir, exist_ok=True)
+        self._index = open(self._index_path, "ab")
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.store_dir, INDEX_FILE)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, frame, timestamp):
+        """Store a copy of frame and return its frame number."""
+        if self.frame_shape is None:
+            # The first frame fixes the shape of the whole store.
+            self.frame_shape = frame.shape
+            with open(os.path.join(self.store_dir, META_FILE), "w") as f:
+                json.dump(
+                    {
+                        "shape": list(frame.shape),
+                        "dtype": "uint8",
+                        "chunk_frames": self.chunk_frames,
+                    },
+                    f,
+                )
+        elif frame.shape != self.frame_shape and not self._appended:
+            # Stored by an earlier session; start or continue the store for
+            # this shape instead.
+            chunk_frames = self.chunk_frames
+            self.close()
+            self._open(shape_store_dir(self.store_dir, frame.shape), chunk_frames)
+            return self.append(frame, timestamp)
+        elif frame.shape != self.frame_shape:
+            raise ValueError(
+                f"Frame shape {frame.shape} does not match the store's {self.frame_shape}"
+            )
+
+        chunk, slot = divmod(self._count, self.chunk_frames)
+        if chunk != self._chunk:
+            self._open_chunk(chunk)
+        self._chunk_map[slot] = frame
+
+        record = np.array([(timestamp, chunk, slot)], dtype=INDEX_DTYPE)
+        self._index.write(record.tobytes())
+        self._index.flush()
+        self._count += 1
+        self._appended += 1
+        return self._count - 1
+
+    def _open_chunk(self, chunk):
+        if self._chunk_map is not None:
+            self._chunk_map.flush()
+        path = _chunk_path(self.store_dir, chunk)
+        shape = (self.chunk_frames,) + tuple(self.frame_shape)
+        # "w+" preallocates the whole chunk; an existing one is reopened as is.
+        mode = "r+" if os.path.exists(path) else "w+"
+        self._chunk_map = np.memmap(path, dtype=np.uint8, mode=mode, shape=shape)
+        self._chunk = chunk
+
+    def close(self):
+        if self._chunk_map is not None:
+            self._chunk_map.flush()
+            self._chunk_map = None
+        self._index.close()
+
+
+class FrameStore:
+    """
+    Read a frame store written by FrameStoreWriter. Frames are returned as
+    read-only views into the memory-mapped chunk files, so nothing is copied
+    until the caller does. Call refresh() to see frames appended since the
+    store was opened.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, META_FILE), "r") as f:
+            meta = json.load(f)
+        self.frame_shape = tuple(meta["shape"])
+        self.chunk_frames = meta["chunk_frames"]
+        self._chunks = {}
+        self.refresh()
+
+    def refresh(self):
+        """Reload the index to pick up newly appended frames."""
+        index = np.fromfile(os.path.join(self.store_dir, INDEX_FILE), dtype=np.uint8)
+        # Ignore a record still being written.
+        whole = len(index) - len(index) % INDEX_DTYPE.itemsize
+        self.index = index[:whole].view(INDEX_DTYPE)
+        self.timestamps = self.index["timestamp"]
+
+    def __len__(self):
+        return len(self.index)
+
+    def _chunk_map(self, chunk):
+        chunk_map = self._chunks.get(chunk)
+        if chunk_map is None:
+            shape = (self.chunk_frames,) + self.frame_shape
+            chunk_map = np.memmap(
+                _chunk_path(self.store_dir, chunk),
+                dtype=np.uint8,
+                mode="r",
+                shape=shape,
+            )
+            self._chunks[chunk] = chunk_map
+        return chunk_map
+
+    def frame(self, frame_number):
+        """Zero-copy view of one frame."""
+        record = self.index[frame_number]
+        return self._chunk_map(int(record["chunk"]))[int(record["slot"])]
+
+    def frame_number_at(self, timestamp):
+        """Number of the last frame taken at or before timestamp (or the first frame)."""
+        return max(
+            int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1, 0
+        )
+
+    def frame_at(self, timestamp):
+        """Zero-copy view of the last frame taken at or before timestamp."""
+        return self.frame(self.frame_number_at(timestamp))
+
+    def frame_numbers_between(self, start_time, end_time):
+        """range of the frame numbers taken in [start_time, end_time)."""
+        first, last = np.searchsorted(self.timestamps, [start_time, end_time])
+        return range(int(first), int(last))
@@ -0,0 +1,201 @@
+import bisect
+import json
+import threading
+import time
+
+# Bucket upper bounds in seconds: 12 per decade from 1 us to 100 s, so a
+# percentile read from the buckets is within about 20% of the exact value.
+BUCKET_BOUNDS = [1e-6 * 10 ** (i / 12) for i in range(12 * 8 + 1)]
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram of one stage's latencies. Recording is a binary
+    search and a counter increment, so memory and cost do not grow with the
+    number of samples; the exact maximum and total are kept alongside.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        bucket = bisect.bisect_left(BUCKET_BOUNDS, seconds)
+        # Stages such as image writes are timed on several threads.
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        """Consistent (bucket counts, count, total seconds), e.g. for export."""
+        with self._lock:
+            return list(self.counts), self.count, self.total
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile, at most max."""
+        with self._lock:
+            rank = q / 100 * self.count
+            seen = 0
+            for bucket, count in enumerate(self.counts):
+                seen += count
+                if count and seen >= rank:
+                    if bucket == len(BUCKET_BOUNDS):
+                        return self.max
+                    return min(BUCKET_BOUNDS[bucket], self.max)
+        return 0.0
+
+    def stats(self):
+        """count, mean, percentiles and max, in milliseconds."""
+        stats = {"count": self.count}
+        stats["mean_ms"] = 1000 * self.total / self.count if self.count else 0.0
+        for q in PERCENTILES:
+            stats[f"p{q}_ms"] = 1000 * self.percentile(q)
+        stats["max_ms"] = 1000 * self.max
+        return stats
+
+
+class _Timing:
+    """Times one with-block into a histogram."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class _NoTiming:
+    """Stands in for _Timing while measurement is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMING = _NoTiming()
+
+
+class LatencyRecorder:
+    """
+    Per-stage latency histograms. Every dump_interval seconds a background
+    thread prints the statistics so far and, with dump_path, also appends
+    them to that file as one JSON line; close() dumps a last time.
+    """
+
+    def __init__(self, dump_interval=60.0, dump_path=None):
+        self.dump_interval = dump_interval
+        self.dump_path = dump_path
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        if dump_interval:
+            self._thread = threading.Thread(
+                target=self._run, name="latency", daemon=True
+            )
+            self._thread.start()
+
+    def histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram(stage))
+        return histogram
+
+    def record(self, stage, seconds):
+        self.histogram(stage).record(seconds)
+
+    def timer(self, stage):
+        return _Timing(self.histogram(stage))
+
+    def _run(self):
+        while not self._stop_event.wait(self.dump_interval):
+            self.dump()
+
+    def summary(self):
+        lines = [
+            f"{'Latency (ms)':<20} {'count':>8} {'mean':>8} {'p50':>8} "
+            f"{'p95':>8} {'p99':>8} {'max':>8}"
+        ]
+        for name, histogram in list(self.histograms.items()):
+            stats = histogram.stats()
+            lines.append(
+                f"  {name:<18} {stats['count']:>8} {stats['mean_ms']:>8.2f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                f"{stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}"
+            )
+        return "\n".join(lines)
+
+    def dump(self):
+        print(self.summary())
+        if self.dump_path:
+            stages = {
+                name: histogram.stats()
+                for name, histogram in list(self.histograms.items())
+            }
+            with open(self.dump_path, "a") as f:
+                f.write(json.dumps({"time": time.time(), "stages": stages}) + "\n")
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump()
+
+
+# Measurement is off until enable() is called; timer() and record() then
+# cost one global lookup and a no-op.
+_recorder = None
+
+
+def enable(dump_interval=60.0, dump_path=None):
+    """Start measuring stage latencies; returns the LatencyRecorder."""
+    global _recorder
+    if _recorder is None:
+        _recorder = LatencyRecorder(dump_interval, dump_path)
+    return _recorder
+
+
+def disable():
+    """Stop measuring and dump the final statistics, if measuring was on."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+
+
+def recorder():
+    """The active LatencyRecorder, or None while measurement is off."""
+    return _recorder
+
+
+def timer(stage):
+    """Context manager timing its block as one latency of stage."""
+    if _recorder is None:
+        return _NO_TIMING
+    return _recorder.timer(stage)
+
+
+def record(stage, seconds):
+    """Record a latency measured by the caller, e.g. one it needs anyway."""
+    if _recorder is not None:
+        _recorder.record(stage, seconds)
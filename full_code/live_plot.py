@@ -0,0 +1,114 @@
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+
+class LivePlot:
+    """
+    Live temperature chart over a sliding window of the last window seconds.
+    History lives in a RingBuffer, so memory and redraw cost stay flat over
+    long runs. refresh() redraws at most max_fps times a second and, while
+    the data fits the current axes, only redraws the lines over a cached
+    background (blitting). The axes are rescaled with a full redraw only
+    when the data leaves them: the time axis then jumps ahead by a quarter
+    window and the temperature axis grows with some margin.
+    """
+
+    def __init__(self, names, window=300.0, capacity=1000, max_fps=5, few_points=True):
+        self.window = window
+        self.min_interval = 1.0 / max_fps
+        self.buffer = RingBuffer(capacity, len(names))
+        self._last_refresh = 0.0
+        self._dirty = False
+        self._y_scaled = False
+
+        # Initialize real-time plotting in interactive mode.
+        plt.ion()
+        self.fig, self.ax = plt.subplots()
+        self.ax.set_xlabel("Time (s)")
+        self.ax.set_ylabel("Temperature (C)")
+        self.ax.set_title("Real-Time Temperature Data")
+        # Markers and the legend only help for a few points.
+        self.lines = [
+            self.ax.plot(
+                [], [], marker="o" if few_points else None, label=name, animated=True
+            )[0]
+            for name in names
+        ]
+        if few_points:
+            self.ax.legend()
+        self.ax.set_xlim(0, window)
+        self._background = None
+        self._blit = self.fig.canvas.supports_blit
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def _on_draw(self, event):
+        # Any full redraw (including a resized window) refreshes the background.
+        self._background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.lines:
+            self.ax.draw_artist(line)
+
+    def add(self, t, temps):
+        """Record one sample; cheap, the chart catches up on refresh()."""
+        self.buffer.append(t, temps)
+        self._dirty = True
+
+    def _rescale(self, times, values):
+        """Move or grow the axes if the data left them; True if they changed."""
+        changed = False
+        x_min, x_max = self.ax.get_xlim()
+        if times[-1] > x_max:
+            x_max = times[-1] + self.window / 4
+            self.ax.set_xlim(x_max - self.window, x_max)
+            changed = True
+
+        valid = values[~np.isnan(values)]
+        if valid.size:
+            low, high = float(valid.min()), float(valid.max())
+            y_min, y_max = self.ax.get_ylim()
+            if not self._y_scaled or low < y_min or high > y_max:
+                margin = max((high - low) * 0.1, 0.5)
+                self.ax.set_ylim(low - margin, high + margin)
+                self._y_scaled = True
+                changed = True
+        return changed
+
+    def refresh(self):
+        """Redraw if there are new samples and the refresh interval has passed."""
+        now = time.monotonic()
+        if not self._dirty or now - self._last_refresh < self.min_interval:
+            return
+        self._last_refresh = now
+        self._dirty = False
+
+        times, values = self.buffer.view()
+        first = np.searchsorted(times, times[-1] - self.window)
+        times, values = times[first:], values[first:]
+        for i, line in enumerate(self.lines):
+            line.set_data(times, values[:, i])
+
+        if self._rescale(times, values) or not self._blit or self._background is None:
+            # Full redraw; _on_draw recaptures the background and draws the lines.
+            self.fig.canvas.draw()
+        else:
+            self.fig.canvas.restore_region(self._background)
+            for line in self.lines:
+                self.ax.draw_artist(line)
+            self.fig.canvas.blit(self.ax.bbox)
+        self.fig.canvas.flush_events()
+
+    def finish(self):
+        """Turn the chart into a normal static figure for plt.show()."""
+        self._dirty = True
+        self._last_refresh = 0.0
+        if len(self.buffer):
+            self.refresh()
+        for line in self.lines:
+            line.set_animated(False)
+        plt.ioff()
+        self.fig.canvas.draw_idle()
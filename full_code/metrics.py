@@ -0,0 +1,218 @@
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import latency
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Latency buckets exported: every third histogram bound, 4 per decade up to
+# 100 s. Each is a bound of the recorded histogram, so the counts are exact.
+LATENCY_BUCKETS = latency.BUCKET_BOUNDS[::3]
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class MetricsServer:
+    """
+    Serve metrics in the Prometheus text format at http://host:port/metrics
+    from a background thread. Metrics are registered as functions that read
+    the current value when the page is scraped, e.g. a stage's item count,
+    so the capture loop itself does no extra work; the values are plain
+    attributes that are only ever replaced or incremented by their owner.
+    A function returns a number, or a {label value: number} dict for a
+    metric with one label.
+    """
+
+    def __init__(self, port=9108, host="127.0.0.1"):
+        self.host = host
+        self.port = port
+        self._metrics = []
+        self._server = None
+        self._thread = None
+
+    def counter(self, name, help_text, read, label=None):
+        self._metrics.append((name, "counter", help_text, read, label))
+
+    def gauge(self, name, help_text, read, label=None):
+        self._metrics.append((name, "gauge", help_text, read, label))
+
+    def render(self):
+        lines = []
+        for name, kind, help_text, read, label in self._metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            try:
+                value = read()
+            except Exception as e:
+                # A broken metric must not take the page down.
+                lines.append(f"# {name} unavailable: {e}")
+                continue
+            if label is None:
+                lines.append(f"{name} {format_value(value)}")
+            else:
+                for key, item in value.items():
+                    lines.append(
+                        f'{name}{{{label}="{escape_label(key)}"}} {format_value(item)}'
+                    )
+        lines.extend(self._latency_lines())
+        return "\n".join(lines) + "\n"
+
+    def _latency_lines(self):
+        """The stage latency histograms, while latency measurement is on."""
+        recorder = latency.recorder()
+        if recorder is None:
+            return []
+        name = "flir_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each pipeline stage.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, histogram in list(recorder.histograms.items()):
+            counts, count, total = histogram.snapshot()
+            stage = escape_label(stage)
+            cumulative = 0
+            next_bucket = 0
+            for index, bound in enumerate(latency.BUCKET_BOUNDS):
+                cumulative += counts[index]
+                if bound == LATENCY_BUCKETS[next_bucket]:
+                    lines.append(
+                        f'{name}_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}'
+                    )
+                    next_bucket += 1
+                    if next_bucket == len(LATENCY_BUCKETS):
+                        break
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {format_value(total)}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        return lines
+
+    def start(self):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes would otherwise be logged to stderr every few seconds.
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        # With port 0 the system picks a free port.
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+
+def register_pipeline(
+    server, capture, stages, palette_cache, point_names, latest_sample
+):
+    """
+    Register the health metrics of a capture pipeline: frames read, samples
+    taken, dropped frames and samples, queue depths, stage time, palette
+    cache hits and misses, and the latest temperature of every point.
+    latest_sample() returns the (timestamp, temperatures) of the last logged
+    sample, or None before the first one.
+    """
+    server.counter(
+        "flir_frames_read_total",
+        "Frames read from the source.",
+        lambda: capture.counter.count,
+    )
+    server.counter(
+        "flir_samples_taken_total",
+        "Frames handed to processing as samples.",
+        lambda: capture.samples_taken,
+    )
+    server.counter(
+        "flir_dropped_total",
+        "Items dropped from a full queue.",
+        lambda: {
+            "display": capture.counter.dropped,
+            "samples": capture.samples_dropped,
+            **{stage.name: stage.counter.dropped for stage in stages},
+        },
+        label="queue",
+    )
+    queues = {"display": capture.frames, "samples": capture.samples}
+    queues.update(
+        {stage.name: stage.outbox for stage in stages if stage.outbox is not None}
+    )
+    server.gauge(
+        "flir_queue_depth",
+        "Items waiting in each pipeline queue.",
+        lambda: {name: q.qsize() for name, q in queues.items()},
+        label="queue",
+    )
+    server.counter(
+        "flir_stage_items_total",
+        "Items handled by each pipeline stage.",
+        lambda: {stage.name: stage.counter.count for stage in [capture] + stages},
+        label="stage",
+    )
+    server.counter(
+        "flir_stage_busy_seconds_total",
+        "Time each pipeline stage spent handling items.",
+        lambda: {stage.name: stage.counter.busy for stage in [capture] + stages},
+        label="stage",
+    )
+    server.counter(
+        "flir_palette_cache_hits_total",
+        "Frames whose scale bar palette was reused.",
+        lambda: palette_cache.hits,
+    )
+    server.counter(
+        "flir_palette_cache_misses_total",
+        "Frames whose scale bar palette had to be extracted.",
+        lambda: palette_cache.misses,
+    )
+
+    def temperatures():
+        sample = latest_sample()
+        if sample is None or sample[1] is None:
+            return {name: math.nan for name in point_names}
+        return dict(zip(point_names, sample[1]))
+
+    server.gauge(
+        "flir_temperature_celsius",
+        "Latest estimated temperature of each point; NaN if it failed.",
+        temperatures,
+        label="point",
+    )
+    server.gauge(
+        "flir_last_sample_timestamp_seconds",
+        "Capture time of the latest logged sample.",
+        lambda: math.nan if latest_sample() is None else latest_sample()[0],
+    )
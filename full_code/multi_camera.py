@@ -0,0 +1,315 @@
+import argparse
+import json
+import math
+import multiprocessing
+import queue
+import signal
+import time
+from datetime import datetime
+
+import numpy as np
+
+from frame_source import REALTIME, open_source, parse_speed
+from palette import PaletteCache
+from pipeline import CaptureThread
+from points import PointSampler, load_points
+from temperature_log import TemperatureLogWriter, export_csv
+
+SCALE_BOX = (306, 36, 315, 211)
+
+
+def load_config(config_path):
+    """
+    Read the camera list, a JSON file such as
+        {
+            "interval": 2.0,
+            "cameras": [
+                {"name": "north", "source": 1, "points_file": "north.txt",
+                 "min_temp": 20, "max_temp": 40},
+                {"name": "replay", "source": "photos", "speed": "fast",
+                 "points_file": "points.txt", "min_temp": 20, "max_temp": 40,
+                 "scale_box": [306, 36, 315, 211]}
+            ]
+        }
+    source, speed and scale_box are as in frame_source.open_source and
+    PaletteCache; speed defaults to "realtime" and scale_box to the FLIR
+    stream's scale bar. A camera may set its own interval and max_frames.
+    """
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    interval = float(config.get("interval", 2.0))
+    cameras = []
+    names = set()
+    for index, camera in enumerate(config["cameras"]):
+        missing = [
+            key
+            for key in ("source", "points_file", "min_temp", "max_temp")
+            if key not in camera
+        ]
+        if missing:
+            raise ValueError(f"Camera {index + 1} needs {', '.join(missing)}.")
+        camera = dict(camera)
+        camera.setdefault("name", f"Camera {index + 1}")
+        camera["speed"] = parse_speed(camera.get("speed", REALTIME))
+        camera.setdefault("scale_box", list(SCALE_BOX))
+        camera.setdefault("interval", interval)
+        camera.setdefault("max_frames", None)
+        if camera["name"] in names:
+            raise ValueError(f"Camera name '{camera['name']}' is used twice.")
+        names.add(camera["name"])
+        cameras.append(camera)
+    return interval, cameras
+
+
+def camera_worker(camera, results, stop_event):
+    """
+    Worker process for one camera: capture from its source on a thread,
+    estimate the points of every sample and send ("sample", name,
+    timestamp, temperatures or None) to the results queue, then ("done",
+    name, summary) once the source ends or stop_event is set.
+    """
+    # Ctrl+C is handled by the supervisor, which sets stop_event.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    name = camera["name"]
+    summary = ""
+    try:
+        sampler = PointSampler(load_points(camera["points_file"]))
+        x1, y1, x2, y2 = camera["scale_box"]
+        palette_cache = PaletteCache(x1=x1, y1=y1, x2=x2, y2=y2)
+        cap = open_source(camera["source"], camera["speed"])
+        if not cap.isOpened():
+            summary = f"cannot open frame source {camera['source']}"
+            return
+
+        capture = CaptureThread(
+            cap, camera["interval"], display=False, max_frames=camera["max_frames"]
+        )
+        capture.start()
+        while True:
+            if stop_event.is_set():
+                capture.stop()
+            try:
+                sample = capture.samples.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if sample is None:
+                break
+            _, capture_time, frame = sample
+            try:
+                palette = palette_cache.get(
+                    frame, camera["min_temp"], camera["max_temp"]
+                )
+                temps = sampler.sample(frame, palette)
+            except ValueError as e:
+                print(f"{name}: error processing image: {e}")
+                temps = None
+            results.put(("sample", name, capture_time, temps))
+        capture.join()
+        cap.release()
+        summary = (
+            f"{capture.summary()}; palette cache {palette_cache.hits} hits, "
+            f"{palette_cache.misses} misses"
+        )
+    except Exception as e:
+        summary = f"failed: {e}"
+    finally:
+        results.put(("done", name, summary))
+
+
+class SampleAggregator:
+    """
+    Merge the samples of several cameras into one time-aligned log. Time is
+    cut into slots of interval seconds; each log record is one slot, holding
+    the mean of every camera's samples in it per point and NaN for cameras
+    without a sample. A slot is written once every running camera has sent
+    a sample from a later slot, or once it is max_delay seconds older than
+    the newest sample, so a stalled camera only leaves gaps in its columns.
+    """
+
+    def __init__(self, log_path, cameras, interval, max_delay=None):
+        self.interval = interval
+        self.max_delay = 2 * interval if max_delay is None else max_delay
+        self.offsets = {}
+        columns = []
+        for name, point_names in cameras:
+            self.offsets[name] = (len(columns), len(columns) + len(point_names))
+            columns += [f"{name} {point} (C)" for point in point_names]
+        self.columns = columns
+        self.log = TemperatureLogWriter(log_path, columns, overwrite=True)
+        self.running = set(self.offsets)
+        self.latest_slot = {name: None for name in self.offsets}
+        self.newest = None
+        self.slots = {}
+        self._next_slot = None
+        self.written = 0
+        self.late = 0
+
+    def add(self, name, timestamp, temps):
+        slot = int(timestamp // self.interval)
+        if self._next_slot is not None and slot < self._next_slot:
+            # Its slot has been written already.
+            self.late += 1
+            return
+        sums, counts = self.slots.get(slot, (None, None))
+        if sums is None:
+            sums = np.zeros(len(self.columns))
+            counts = np.zeros(len(self.columns), dtype=np.int64)
+            self.slots[slot] = (sums, counts)
+        if temps is not None:
+            start, end = self.offsets[name]
+            valid = ~np.isnan(temps)
+            sums[start:end][valid] += temps[valid]
+            counts[start:end] += valid
+        self.latest_slot[name] = slot
+        self.newest = timestamp if self.newest is None else max(self.newest, timestamp)
+        self.flush()
+
+    def finish_camera(self, name):
+        """Stop waiting for a camera that has ended."""
+        self.running.discard(name)
+        self.flush()
+
+    def flush(self, everything=False):
+        """Write every slot that no running camera can still add to."""
+        if self.running and not everything:
+            waiting = [self.latest_slot[name] for name in self.running]
+            complete = -math.inf if None in waiting else min(waiting)
+            stale = -math.inf
+            if self.newest is not None:
+                stale = (self.newest - self.max_delay) // self.interval
+            ready = max(complete, stale)
+        else:
+            ready = math.inf
+        for slot in sorted(self.slots):
+            if slot >= ready:
+                break
+            sums, counts = self.slots.pop(slot)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = (sums / counts).astype(np.float32)
+            self.log.append(
+                slot * self.interval, slot, values if counts.any() else None
+            )
+            self.written += 1
+            self._next_slot = slot + 1
+            timestamp_str = datetime.fromtimestamp(slot * self.interval).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+            cameras = sum(
+                bool(counts[start:end].any()) for start, end in self.offsets.values()
+            )
+            print(
+                f"Logged {timestamp_str} with samples from {cameras}/{len(self.offsets)} cameras."
+            )
+
+    def close(self):
+        self.flush(everything=True)
+        self.log.close()
+
+
+def supervise(cameras, interval, log_path, duration=None):
+    """
+    Run one worker process per camera and aggregate their samples into
+    log_path until every source ends, duration seconds pass or Ctrl+C.
+    """
+    names = []
+    for camera in cameras:
+        names.append(
+            (camera["name"], [n for _, _, n in load_points(camera["points_file"])])
+        )
+    aggregator = SampleAggregator(log_path, names, interval)
+
+    results = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    workers = [
+        multiprocessing.Process(
+            target=camera_worker,
+            args=(camera, results, stop_event),
+            name=f"camera {camera['name']}",
+            daemon=True,
+        )
+        for camera in cameras
+    ]
+    for worker in workers:
+        worker.start()
+    print(f"Started {len(workers)} camera processes. Press Ctrl+C to stop.")
+
+    summaries = {}
+
+    def receive():
+        """Handle one message from the workers; False if none came."""
+        try:
+            message = results.get(timeout=0.5)
+        except queue.Empty:
+            # A worker that crashed never sends "done", so stop waiting for it.
+            for worker, camera in zip(workers, cameras):
+                name = camera["name"]
+                if worker.exitcode not in (None, 0) and name in aggregator.running:
+                    summaries[name] = f"exited with code {worker.exitcode}"
+                    aggregator.finish_camera(name)
+            return False
+        if message[0] == "sample":
+            _, name, timestamp, temps = message
+            aggregator.add(name, timestamp, temps)
+        else:
+            _, name, summary = message
+            summaries[name] = summary
+            aggregator.finish_camera(name)
+        return True
+
+    start = time.monotonic()
+    try:
+        while aggregator.running:
+            if duration is not None and time.monotonic() - start >= duration:
+                stop_event.set()
+            receive()
+    except KeyboardInterrupt:
+        print("Stopping the cameras...")
+        stop_event.set()
+        # Collect what the workers send while they shut down.
+        deadline = time.monotonic() + 10.0
+        while aggregator.running and time.monotonic() < deadline:
+            receive()
+
+    for worker in workers:
+        worker.join(timeout=5.0)
+    aggregator.close()
+    for name, _ in names:
+        print(f"{name}: {summaries.get(name, 'did not finish')}")
+    if aggregator.late:
+        print(f"{aggregator.late} samples arrived after their slot was written.")
+    return aggregator.written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Capture from several cameras or frame sources in parallel."
+    )
+    parser.add_argument("config", help="JSON file listing the cameras")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument(
+        "--log",
+        default="multi_camera_temperature_data.bin",
+        help="aggregated temperature log",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        interval, cameras = load_config(args.config)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: invalid camera config '{args.config}': {e}")
+        return
+    for camera in cameras:
+        try:
+            load_points(camera["points_file"])
+        except FileNotFoundError:
+            print(f"Error: File '{camera['points_file']}' not found.")
+            return
+
+    written = supervise(cameras, interval, args.log, args.duration)
+    csv_filename = args.log.rsplit(".", 1)[0] + ".csv"
+    export_csv(args.log, csv_filename)
+    print(f"{written} time slots saved to '{args.log}' and '{csv_filename}'.")
+
+
+if __name__ == "__main__":
+    main()
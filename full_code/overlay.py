@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+
+class SparklineOverlay:
+    """
+    Draw a small chart of the recent temperatures of every point, with the
+    current value and the min/max over that history, straight into the
+    video frame with OpenCV, as a lightweight alternative to the matplotlib
+    window. The polyline vertices are recomputed into preallocated arrays
+    only when a sample arrives, so drawing a frame is a handful of OpenCV
+    calls per point.
+    """
+
+    def __init__(self, points, history=60, width=50, height=14):
+        self.points = points
+        self.width = width
+        self.height = height
+        self.buffer = RingBuffer(history, len(points))
+        # Sparkline x offsets are fixed: the newest sample at the right edge.
+        self._x_offsets = np.linspace(0, width - 1, history).astype(np.int32)
+        self._vertices = np.zeros((len(points), history, 2), dtype=np.int32)
+        self._lengths = np.zeros(len(points), dtype=np.intp)
+        self._labels = [None] * len(points)
+
+    def add(self, temps):
+        """Record one sample and lay out the sparklines for the next frames."""
+        self.buffer.append(0.0, temps)
+        _, history = self.buffer.view()
+        for i, (x, y, _) in enumerate(self.points):
+            values = history[:, i]
+            values = values[~np.isnan(values)]
+            self._lengths[i] = len(values)
+            if not len(values):
+                self._labels[i] = ("Error", "")
+                continue
+
+            low, high = float(values.min()), float(values.max())
+            span = high - low if high > low else 1.0
+            count = len(values)
+            vertices = self._vertices[i, :count]
+            vertices[:, 0] = x + 8 + self._x_offsets[-count:]
+            # Hotter is higher; the box starts just below the point's name.
+            vertices[:, 1] = y + 4 + self.height - 1
+            vertices[:, 1] -= ((values - low) / span * (self.height - 1)).astype(
+                np.int32
+            )
+            current = "Error" if np.isnan(temps[i]) else f"{temps[i]:.1f}"
+            self._labels[i] = (current, f"{low:.1f}-{high:.1f}")
+
+    def draw(self, frame):
+        for i, (x, y, _) in enumerate(self.points):
+            if self._labels[i] is None:
+                continue
+            left, top = x + 8, y + 4
+            # Dark backing box so the line stays readable on any palette color.
+            cv2.rectangle(
+                frame,
+                (left - 1, top - 1),
+                (left + self.width, top + self.height),
+                (0, 0, 0),
+                cv2.FILLED,
+            )
+            if self._lengths[i] > 1:
+                cv2.polylines(
+                    frame,
+                    [self._vertices[i, : self._lengths[i]]],
+                    False,
+                    (0, 255, 255),
+                    1,
+                )
+            current, spread = self._labels[i]
+            cv2.putText(
+                frame,
+                current,
+                (left + self.width + 3, top + self.height // 2),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.35,
+                (255, 255, 255),
+                1,
+                cv2.LINE_AA,
+            )
+            cv2.putText(
+                frame,
+                spread,
+                (left, top + self.height + 11),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.3,
+                (255, 255, 255),
+                1,
+                cv2.LINE_AA,
+            )
@@ -0,0 +1,471 @@
+from collections import OrderedDict
+
+import numpy as np
+
+import latency
+
+# Pixels times scale rows up to which temperatures() compares every pixel
+# against every row instead of searching the index: the index walk has a
+# fixed cost of about half a millisecond, a few points cost microseconds.
+SCAN_SIZE = 1 << 16
+
+
+def pack_bgr(pixels, bins):
+    """
+    Pack uint8 BGR pixels of shape (..., 3) into flat lookup table indices.
+    Each channel is quantized to `bins` levels by dropping its low bits.
+    """
+    shift = 8 - (bins.bit_length() - 1)
+    pixels = np.asarray(pixels, dtype=np.intp) >> shift
+    return (pixels[..., 0] * bins + pixels[..., 1]) * bins + pixels[..., 2]
+
+
+def unpack_bgr(packed):
+    """Return the (N, 3) BGR colors of pack_bgr(pixels, 256) indices."""
+    packed = np.asarray(packed)
+    return np.stack([packed >> 16, (packed >> 8) & 255, packed & 255], axis=-1)
+
+
+def lut_bins(lut):
+    """Return the number of quantization levels per channel of a lookup table."""
+    return 1 << ((lut.size.bit_length() - 1) // 3)
+
+
+class TemperaturePalette:
+    """
+    Color-to-temperature mapping of the scale bar, stored as two contiguous
+    arrays: temps of shape (N,) in ascending order and colors of shape (N, 3)
+    holding the average BGR of each scale row. Iterating yields the same
+    (temp, [b, g, r]) pairs as the old list-of-tuples map, so code written
+    for that format keeps working. The LUT and nearest-color index are built
+    on first use. lookup() is exact either way; with use_lut it remembers
+    every color it has converted (see TemperatureLUT), otherwise it searches
+    the index every time.
+    """
+
+    def __init__(self, temps, colors, use_lut=True):
+        self.temps = np.ascontiguousarray(temps, dtype=np.float64)
+        self.colors = np.ascontiguousarray(colors, dtype=np.float64).reshape(-1, 3)
+        if len(self.temps) != len(self.colors):
+            raise ValueError("Palette needs one color per temperature.")
+        self.use_lut = use_lut
+        self._rgb = self.colors[:, ::-1] / 255.0
+        self._lut = None
+        self._index = None
+
+    @classmethod
+    def from_scale(cls, image, min_temp, max_temp, x1=306, y1=36, x2=315, y2=211):
+        """
+        Build the palette from the scale bar region (x1, y1) to (x2, y2) with
+        a single reduction over the crop width.
+        """
+        height, width, _ = image.shape
+        if x1 < 0 or x2 > width or y1 < 0 or y2 > height:
+            raise ValueError("Scale bar coordinates are out of image bounds.")
+
+        cropped_scale = image[y1:y2, x1:x2]
+        scale_height = cropped_scale.shape[0]
+        colors = cropped_scale.mean(axis=1)
+        # Interpolate temperature from top (max_temp) to bottom (min_temp).
+        if scale_height > 1:
+            fraction = np.arange(scale_height) / (scale_height - 1)
+        else:
+            fraction = np.zeros(scale_height)
+        temps = max_temp - fraction * (max_temp - min_temp)
+
+        order = np.argsort(temps, kind="stable")
+        return cls(temps[order], colors[order])
+
+    @classmethod
+    def from_map(cls, color_temp_map):
+        """Return color_temp_map as a palette, converting a list of (temp, bgr) pairs."""
+        if isinstance(color_temp_map, cls):
+            return color_temp_map
+        temps = [temp for temp, _ in color_temp_map]
+        colors = [bgr for _, bgr in color_temp_map]
+        return cls(temps, np.array(colors, dtype=np.float64).reshape(-1, 3))
+
+    def __len__(self):
+        return len(self.temps)
+
+    def __iter__(self):
+        return zip(self.temps.tolist(), self.colors.tolist())
+
+    def __getitem__(self, row):
+        return self.temps[row].item(), self.colors[row].tolist()
+
+    @property
+    def lut(self):
+        if self._lut is None:
+            self._lut = TemperatureLUT(self)
+        return self._lut
+
+    @property
+    def index(self):
+        if self._index is None:
+            with latency.timer("index build"):
+                self._index = NearestColorIndex(self)
+        return self._index
+
+    def prepare(self):
+        """Build the nearest-color index, and the LUT if used, ahead of lookups."""
+        self.index
+        if self.use_lut:
+            self.lut
+
+    def temperature_at(self, image, x_target, y_target):
+        """
+        Estimate the temperature at the specified (x, y) point, comparing the
+        pixel's normalized RGB against every row at once.
+        """
+        height, width, _ = image.shape
+        if not (0 <= x_target < width and 0 <= y_target < height):
+            raise ValueError("Target coordinates are out of image bounds.")
+
+        return self.temps[self._scan_rows(image[y_target, x_target])].item()
+
+    def _scan_rows(self, pixels):
+        """Nearest row of uint8 BGR pixels of shape (..., 3), comparing every row."""
+        diff = np.asarray(pixels)[..., None, ::-1] / 255.0 - self._rgb
+        distance = np.sqrt(diff[..., 0] ** 2 + diff[..., 1] ** 2 + diff[..., 2] ** 2)
+        return np.argmin(distance, axis=-1)
+
+    def temperatures(self, pixels):
+        """Exact temperatures for uint8 BGR pixels of shape (..., 3)."""
+        pixels = np.asarray(pixels)
+        if pixels.size // 3 * len(self) <= SCAN_SIZE:
+            return self.temps[self._scan_rows(pixels)]
+        if pixels.size <= 3 * 256:
+            return self.index.query(pixels)
+        # Frames repeat colors, so each distinct color is only searched once.
+        packed = pack_bgr(pixels, 256)
+        unique, inverse = np.unique(packed.ravel(), return_inverse=True)
+        return self.index.query(unpack_bgr(unique))[inverse].reshape(packed.shape)
+
+    def lookup(self, pixels):
+        """
+        Exact temperatures for uint8 BGR pixels of shape (..., 3), through the
+        LUT when use_lut is set.
+        """
+        if not self.use_lut:
+            return self.temperatures(pixels)
+        return self.lut.lookup(pixels)
+
+
+class TemperatureLUT:
+    """
+    Exact lookup table from all 2**24 BGR colors to their nearest scale row,
+    filled lazily: a color is searched with the palette's nearest-color
+    index the first time a frame shows it and read back with one gather
+    after that. Frames of the same scene repeat nearly all of their colors,
+    so once warm a whole frame converts about a hundred times faster than
+    searching it. The table holds row + 1 per color, 0 for colors not seen
+    yet, in the smallest unsigned type that fits: one byte per color for a
+    scale bar of up to 254 rows. It is allocated zeroed, which the OS only
+    commits page by page as colors are filled; a full table is 16 MB.
+    """
+
+    def __init__(self, palette):
+        self.palette = palette
+        self.rows = np.zeros(1 << 24, dtype=np.min_scalar_type(len(palette)))
+        self._temps = np.concatenate([[np.nan], palette.temps])
+
+    def lookup(self, pixels):
+        """Temperatures for uint8 BGR pixels of shape (..., 3)."""
+        packed = np.asarray(pack_bgr(pixels, 256))
+        rows = self.rows[packed]
+        unseen = rows == 0
+        if unseen.any():
+            colors = np.unique(packed[unseen])
+            self.rows[colors] = self.palette.index.query_rows(unpack_bgr(colors)) + 1
+            rows = self.rows[packed]
+        return self._temps[rows]
+
+
+def extract_color_temp_map(image, min_temp, max_temp, x1=306, y1=36, x2=315, y2=211):
+    """
+    Extract the color-to-temperature mapping from the scale bar region.
+    Coordinates (x1, y1) to (x2, y2) should cover the vertical temperature scale.
+    """
+    return TemperaturePalette.from_scale(image, min_temp, max_temp, x1, y1, x2, y2)
+
+
+def estimate_temperature(image, color_temp_map, x_target, y_target):
+    """
+    Estimate the temperature at the specified (x, y) point.
+    Compares the target pixel's normalized RGB to each row's color in the scale.
+    """
+    palette = TemperaturePalette.from_map(color_temp_map)
+    return palette.temperature_at(image, x_target, y_target)
+
+
+def build_temperature_lut(color_temp_map, bins=32, chunk_size=4096):
+    """
+    Compile the color-to-temperature mapping into a dense quantized lookup
+    table. The table has bins**3 entries indexed by packed BGR (see
+    pack_bgr); each entry holds the temperature of the scale row nearest to
+    the centre of its color cell, so every cell has a value. Also returns
+    the error bound: the largest difference, over every pixel of every
+    cell, between the table value and the exact nearest-row temperature of
+    estimate_temperature. Colors between scale rows can share a cell with
+    pixels nearest to rows of very different temperatures, e.g. where the
+    palette folds back on itself, so the bound is far looser than the
+    typical error; TemperatureLUT gives exact values at full resolution.
+    """
+    if bins < 2 or bins > 256 or bins & (bins - 1):
+        raise ValueError("LUT bins must be a power of two between 2 and 256.")
+
+    palette = TemperaturePalette.from_map(color_temp_map)
+    temps, colors = palette.temps, palette.colors
+
+    # Pixels in a cell are integers in [k * step, k * step + step - 1].
+    step = 256 // bins
+    half = (step - 1) / 2.0
+    levels = np.arange(bins) * step + half
+    b, g, r = np.meshgrid(levels, levels, levels, indexing="ij")
+    centres = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=1)
+
+    lut = np.empty(len(centres), dtype=np.float32)
+    max_error = 0.0
+    for start in range(0, len(centres), chunk_size):
+        cells = centres[start : start + chunk_size]
+        diff = np.abs(cells[:, None, :] - colors[None, :, :])
+        dist = np.einsum("ijk,ijk->ij", diff, diff)
+        # argmin keeps the first (coolest) row on ties, like the linear scan.
+        cell_temps = temps[np.argmin(dist, axis=1)]
+        lut[start : start + chunk_size] = cell_temps
+
+        # A row can only be the nearest for some pixel in the cell if its
+        # closest approach to the cell beats every row's farthest point.
+        far = dist + 2.0 * half * diff.sum(axis=2) + 3.0 * half * half
+        np.maximum(diff - half, 0.0, out=diff)
+        near = np.einsum("ijk,ijk->ij", diff, diff)
+        reachable = near <= far.min(axis=1, keepdims=True)
+        errors = np.where(reachable, np.abs(temps[None, :] - cell_temps[:, None]), 0.0)
+        max_error = max(max_error, float(errors.max()))
+
+    return lut, max_error
+
+
+def lookup_temperature(image, palette, x_target, y_target):
+    """
+    Estimate the temperature at the specified (x, y) point with the
+    palette's lookup(), a single LUT index for colors seen before.
+    """
+    height, width, _ = image.shape
+    if not (0 <= x_target < width and 0 <= y_target < height):
+        raise ValueError("Target coordinates are out of image bounds.")
+
+    return float(palette.lookup(image[y_target, x_target, :]))
+
+
+def temperature_map(image, palette, box=None):
+    """
+    Convert a whole BGR frame into a float32 (H, W) temperature array with
+    the palette's lookup(): one gather from the LUT for the colors it has
+    seen, and an exact search for the rest. With box (x1, y1, x2, y2), x2
+    and y2 exclusive, only that part is converted and the rest is NaN.
+    """
+    if box is None:
+        return palette.lookup(image).astype(np.float32)
+    x1, y1, x2, y2 = box
+    temp_map = np.full(image.shape[:2], np.nan, dtype=np.float32)
+    temp_map[y1:y2, x1:x2] = palette.lookup(image[y1:y2, x1:x2])
+    return temp_map
+
+
+class NearestColorIndex:
+    """
+    Exact nearest-row search over the scale colors for batches of pixels.
+    The scale rows are stored in a k-d tree over normalized RGB. Every query
+    first descends to its own leaf for an initial best distance, then all
+    queries walk the tree together level by level, skipping any node whose
+    bounding box is farther away than a row is known to be. Results
+    match estimate_temperature exactly, including its preference for the
+    first row on ties.
+    """
+
+    def __init__(self, color_temp_map, leaf_size=8):
+        if not len(color_temp_map):
+            raise ValueError("Cannot index an empty color-to-temperature map.")
+
+        palette = TemperaturePalette.from_map(color_temp_map)
+        self.temps = palette.temps
+        # Same normalized RGB values that bgr_to_rgb produces for each row.
+        self.rgb = palette.colors[:, ::-1] / 255.0
+        count = len(self.rgb)
+
+        # Leaves are padded to leaf_size with a row that is infinitely far away.
+        self._padded_rgb = np.vstack([self.rgb, np.full((1, 3), np.inf)])
+        lower, upper, left, right = [], [], [], []
+        split_dim, split_value, leaf_slot, leaf_rows = [], [], [], []
+
+        def build(rows):
+            node = len(lower)
+            points = self.rgb[rows]
+            lower.append(points.min(axis=0))
+            upper.append(points.max(axis=0))
+            left.append(-1)
+            right.append(-1)
+            split_dim.append(0)
+            split_value.append(0.0)
+            leaf_slot.append(-1)
+            if len(rows) <= leaf_size:
+                leaf_slot[node] = len(leaf_rows)
+                padding = leaf_size - len(rows)
+                leaf_rows.append(np.pad(rows, (0, padding), constant_values=count))
+                return node
+
+            dim = int(np.argmax(upper[node] - lower[node]))
+            rows = rows[np.argsort(points[:, dim], kind="stable")]
+            half = len(rows) // 2
+            split_dim[node] = dim
+            split_value[node] = (
+                self.rgb[rows[half - 1], dim] + self.rgb[rows[half], dim]
+            ) / 2.0
+            left[node] = build(rows[:half])
+            right[node] = build(rows[half:])
+            return node
+
+        build(np.arange(count))
+        self.lower = np.array(lower)
+        self.upper = np.array(upper)
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.split_dim = np.array(split_dim, dtype=np.intp)
+        self.split_value = np.array(split_value)
+        self.leaf_slot = np.array(leaf_slot, dtype=np.intp)
+        self.leaf_rows = np.array(leaf_rows, dtype=np.intp)
+
+    def _scan_leaves(self, rgb, queries, slots, best_dist, best_row):
+        """Update the best row of each query from the rows of one leaf each."""
+        rows = self.leaf_rows[slots]
+        diff = rgb[queries][:, None, :] - self._padded_rgb[rows]
+        # Same Euclidean distance, term order included, as estimate_temperature.
+        dist = np.sqrt(diff[..., 0] ** 2 + diff[..., 1] ** 2 + diff[..., 2] ** 2)
+        leaf_dist = dist.min(axis=1)
+        leaf_row = np.where(dist == leaf_dist[:, None], rows, len(self.rgb)).min(axis=1)
+
+        # A query may reach several leaves at once; keep its closest, first row.
+        order = np.lexsort((leaf_row, leaf_dist, queries))
+        queries, leaf_dist, leaf_row = queries[order], leaf_dist[order], leaf_row[order]
+        first = np.ones(len(queries), dtype=bool)
+        first[1:] = queries[1:] != queries[:-1]
+        queries, leaf_dist, leaf_row = queries[first], leaf_dist[first], leaf_row[first]
+
+        better = (leaf_dist < best_dist[queries]) | (
+            (leaf_dist == best_dist[queries]) & (leaf_row < best_row[queries])
+        )
+        best_dist[queries[better]] = leaf_dist[better]
+        best_row[queries[better]] = leaf_row[better]
+
+    def query_rows(self, pixels):
+        """
+        Return the index of the nearest scale row for every uint8 BGR pixel in
+        an array of shape (..., 3).
+        """
+        pixels = np.asarray(pixels)
+        shape = pixels.shape[:-1]
+        rgb = pixels.reshape(-1, 3)[:, ::-1] / 255.0
+        total = len(rgb)
+        best_dist = np.full(total, np.inf)
+        best_row = np.full(total, len(self.rgb), dtype=np.intp)
+
+        # Descend to each query's own leaf for a tight initial bound.
+        nodes = np.zeros(total, dtype=np.intp)
+        inner = np.flatnonzero(self.leaf_slot[nodes] < 0)
+        while inner.size:
+            current = nodes[inner]
+            go_right = rgb[inner, self.split_dim[current]] > self.split_value[current]
+            nodes[inner] = np.where(go_right, self.right[current], self.left[current])
+            inner = inner[self.leaf_slot[nodes[inner]] < 0]
+        self._scan_leaves(
+            rgb, np.arange(total), self.leaf_slot[nodes], best_dist, best_row
+        )
+
+        # Walk the tree from the root, pruning boxes beyond the best distance.
+        # Each box is the tight bounds of its rows, so every face touches a
+        # row: the distance to the nearer face along one axis and the farther
+        # faces along the others also bounds the nearest distance. Tightening
+        # that bound as the boxes shrink level by level leaves each query a
+        # few nodes per level, so queries cost O(log rows). Both distances are
+        # compared squared.
+        bound = best_dist**2
+        queries = np.arange(total)
+        nodes = np.zeros(total, dtype=np.intp)
+        while queries.size:
+            points = rgb[queries]
+            lower, upper = self.lower[nodes], self.upper[nodes]
+            to_lower, to_upper = (lower - points) ** 2, (points - upper) ** 2
+            near = np.minimum(to_lower, to_upper)
+            far = np.maximum(to_lower, to_upper)
+            face = (far.sum(axis=1)[:, None] - far + near).min(axis=1)
+            np.minimum.at(bound, queries, face)
+            inside = (lower <= points) & (points <= upper)
+            gap = np.where(inside, 0.0, near).sum(axis=1)
+            keep = gap <= bound[queries] + 1e-9
+            queries, nodes = queries[keep], nodes[keep]
+
+            leaf = self.leaf_slot[nodes] >= 0
+            if leaf.any():
+                self._scan_leaves(
+                    rgb, queries[leaf], self.leaf_slot[nodes[leaf]], best_dist, best_row
+                )
+            queries, nodes = queries[~leaf], nodes[~leaf]
+            queries = np.concatenate([queries, queries])
+            nodes = np.concatenate([self.left[nodes], self.right[nodes]])
+
+        return best_row.reshape(shape)
+
+    def query(self, pixels):
+        """Return the temperature for every uint8 BGR pixel in an array of shape (..., 3)."""
+        return self.temps[self.query_rows(pixels)]
+
+
+class PaletteCache:
+    """
+    Reuse the color-to-temperature map of previous frames while the scale bar
+    is unchanged. Entries are keyed by min/max temperature and the raw bytes
+    of the scale bar crop, which is only a few kilobytes, and the least
+    recently used entry is dropped once max_entries is reached. A cached
+    palette keeps its LUT, so the colors it has learned carry over to every
+    later frame with the same scale; each LUT grows up to 16 MB.
+    """
+
+    def __init__(self, use_lut=True, max_entries=8, x1=306, y1=36, x2=315, y2=211):
+        self.use_lut = use_lut
+        self.max_entries = max_entries
+        self.scale_box = (x1, y1, x2, y2)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, image, min_temp, max_temp):
+        """
+        Return the TemperaturePalette for this frame's scale bar, extracting
+        a new one only when the scale bar has changed. A new palette's index
+        is built here, so a scale change is timed as "palette build" and
+        "index build" rather than inside whatever stage looks up
+        temperatures first; its LUT starts empty and fills as frames are
+        converted.
+        """
+        x1, y1, x2, y2 = self.scale_box
+        crop = image[y1:y2, x1:x2]
+        key = (min_temp, max_temp, crop.shape, crop.tobytes())
+        palette = self._entries.get(key)
+        if palette is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return palette
+
+        self.misses += 1
+        with latency.timer("palette build"):
+            palette = TemperaturePalette.from_scale(
+                image, min_temp, max_temp, x1, y1, x2, y2
+            )
+        palette.use_lut = self.use_lut
+        palette.prepare()
+        self._entries[key] = palette
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return palette
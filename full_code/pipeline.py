@@ -0,0 +1,261 @@
+import queue
+import signal
+import threading
+import time
+import traceback
+
+import latency
+
+
+class StageCounter:
+    """
+    Throughput counter for one pipeline stage: items handled, items dropped
+    and time spent on them. Each counter is only updated by its own stage's
+    thread, so no locking is needed.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.dropped = 0
+        self.busy = 0.0
+        self.start_time = time.perf_counter()
+
+    def add(self, busy):
+        self.count += 1
+        self.busy += busy
+
+    def rate(self):
+        """Items handled per second since the stage started."""
+        elapsed = time.perf_counter() - self.start_time
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        text = f"{self.name}: {self.count} items ({self.rate():.1f}/s)"
+        if self.count:
+            text += f", {1000 * self.busy / self.count:.1f} ms each"
+        if self.dropped:
+            text += f", {self.dropped} dropped"
+        return text
+
+
+def monotonic_wall_clock():
+    """
+    Return a clock giving wall-clock seconds since the epoch that never
+    steps backwards: the wall time when the clock was made plus the
+    monotonic time elapsed since, so system clock adjustments mid-session
+    cannot reorder samples.
+    """
+    wall_start = time.time()
+    monotonic_start = time.monotonic()
+    return lambda: wall_start + (time.monotonic() - monotonic_start)
+
+
+def put_dropping_oldest(q, item):
+    """
+    Put item on a bounded queue without blocking, discarding the oldest
+    queued entry while it is full. Returns True if an entry was discarded.
+    """
+    dropped = False
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped = True
+            except queue.Empty:
+                pass
+
+
+class CaptureThread(threading.Thread):
+    """
+    Drain the camera at its native rate. Every frame goes to the frames queue
+    as (timestamp, frame) for display, and one frame every sample_interval
+    seconds goes to the samples queue as (sample_index, timestamp, frame).
+    Neither put ever blocks: when a consumer falls behind, its oldest queued
+    frame is dropped instead of stalling cap.read(). A recorded or
+    synthetic source (see frame_source.py) is not live, so there samples
+    are never dropped: capture waits for the samples queue instead.
+    A None on either queue means capture has ended. Without display no
+    frames are queued for display; with max_frames capture ends by itself
+    after that many frames.
+    """
+
+    def __init__(
+        self,
+        cap,
+        sample_interval,
+        display_size=2,
+        sample_size=8,
+        display=True,
+        max_frames=None,
+    ):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.sample_interval = sample_interval
+        self.display = display
+        self.max_frames = max_frames
+        self.live = getattr(cap, "live", True)
+        self.frames = queue.Queue(maxsize=display_size)
+        self.samples = queue.Queue(maxsize=sample_size)
+        self.counter = StageCounter("Capture")
+        self.samples_taken = 0
+        self.samples_dropped = 0
+        self.failed = False
+        self.clock = monotonic_wall_clock()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        # The first sample is taken one interval after streaming starts.
+        last_sample_time = self.clock()
+        try:
+            while not self._stop_event.is_set():
+                start = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret:
+                    self.failed = True
+                    break
+                now = self.clock()
+                read_time = time.perf_counter() - start
+                self.counter.add(read_time)
+                latency.record("frame read", read_time)
+
+                if now - last_sample_time >= self.sample_interval:
+                    # The display thread draws overlays on its frame, so the
+                    # sample gets its own clean copy.
+                    sample = (self.samples_taken, now, frame.copy())
+                    if not self.live:
+                        self._put_waiting(sample)
+                    elif put_dropping_oldest(self.samples, sample):
+                        self.samples_dropped += 1
+                    self.samples_taken += 1
+                    last_sample_time = now
+                if self.display and put_dropping_oldest(self.frames, (now, frame)):
+                    self.counter.dropped += 1
+                if (
+                    self.max_frames is not None
+                    and self.counter.count >= self.max_frames
+                ):
+                    break
+        finally:
+            put_dropping_oldest(self.frames, None)
+            if self.live:
+                put_dropping_oldest(self.samples, None)
+            else:
+                # The end marker waits its turn so no queued sample is lost;
+                # the stages drain their inbox until it, so this cannot hang.
+                self.samples.put(None)
+
+    def _put_waiting(self, item):
+        """Block until the samples queue has room, unless capture is stopped."""
+        while not self._stop_event.is_set():
+            try:
+                self.samples.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                pass
+
+    def summary(self):
+        text = self.counter.summary().replace("dropped", "not displayed")
+        if self.samples_dropped:
+            text += f", {self.samples_dropped} samples dropped"
+        return text
+
+
+class StageThread(threading.Thread):
+    """
+    Run func on every item from inbox in a worker thread. Non-None results
+    are put on the stage's own bounded outbox, if it has one; a full outbox
+    blocks this stage only (the capture thread upstream drops frames instead
+    of waiting). With drop_when_full the oldest queued result is discarded
+    instead, for consumers such as the GUI that may stop reading.
+    A None item ends the stage and is passed on downstream.
+    """
+
+    def __init__(self, name, func, inbox, outbox_size=0, drop_when_full=False):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.inbox = inbox
+        self.outbox = queue.Queue(maxsize=outbox_size) if outbox_size else None
+        self.drop_when_full = drop_when_full
+        self.counter = StageCounter(name.capitalize())
+        self.error = None
+
+    def run(self):
+        try:
+            while True:
+                item = self.inbox.get()
+                if item is None:
+                    break
+                if self.error is not None:
+                    # Keep draining so the stages upstream never block on us.
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    result = self.func(item)
+                except Exception as e:
+                    self.error = e
+                    print(f"{self.name} stage failed; dropping its remaining input.")
+                    traceback.print_exc()
+                    continue
+                self.counter.add(time.perf_counter() - start)
+
+                if self.outbox is None or result is None:
+                    continue
+                if self.drop_when_full:
+                    if put_dropping_oldest(self.outbox, result):
+                        self.counter.dropped += 1
+                else:
+                    self.outbox.put(result)
+        finally:
+            # Without drop_when_full the end marker waits its turn like the
+            # results, so none of them is discarded to make room for it.
+            if self.outbox is not None and self.drop_when_full:
+                put_dropping_oldest(self.outbox, None)
+            elif self.outbox is not None:
+                self.outbox.put(None)
+
+
+def wait_for_stop(capture, duration=None, poll_interval=0.2):
+    """
+    Block until SIGINT (Ctrl+C) or SIGTERM arrives, duration seconds have
+    passed or capture has ended, for runs without a window to press 'q' in.
+    """
+    stop = threading.Event()
+    handled = (signal.SIGINT, signal.SIGTERM)
+    previous = {
+        sig: signal.signal(sig, lambda signum, frame: stop.set()) for sig in handled
+    }
+    start = time.monotonic()
+    try:
+        while not stop.wait(poll_interval):
+            if not capture.is_alive():
+                if capture.failed:
+                    print("Can't receive frame. Exiting...")
+                break
+            if duration is not None and time.monotonic() - start >= duration:
+                break
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+
+def stop_pipeline(capture, stages):
+    """
+    Stop capturing and wait for every stage to finish the samples already
+    queued, then print each stage's throughput.
+    """
+    capture.stop()
+    capture.join()
+    for stage in stages:
+        stage.join()
+    print("Pipeline throughput:")
+    print(f"  {capture.summary()}")
+    for stage in stages:
+        print(f"  {stage.counter.summary()}")
@@ -1,5 +1,7 @@
 import cv2
 
+from frame_source import open_source
+
 # Global list to store the selected points
 points = []
 
@@ -15,10 +17,12 @@ def mouse_callback(event, x, y, flags, param):
 def main():
     global points
     camera_index = 1  # Update the index if your camera is different
-    cap = cv2.VideoCapture(camera_index)
+    # camera_index may also be a video file, a photo directory or
+    # "synthetic" to run without the camera (see full_code/frame_source.py).
+    cap = open_source(camera_index)
 
     if not cap.isOpened():
-        print(f"Cannot open camera at index {camera_index}")
+        print(f"Cannot open frame source {camera_index}")
         return
 
     window_name = "FLIR E6390 (Webcam-like) Stream"
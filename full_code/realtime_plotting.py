@@ -1,71 +1,27 @@
 import cv2
 import numpy as np
-import csv
 import os
+import queue
 import time
 from datetime import datetime
 import matplotlib.pyplot as plt
 
-
-def bgr_to_rgb(color):
-    """Convert a BGR tuple to normalized RGB tuple."""
-    b, g, r = color
-    return (r / 255.0, g / 255.0, b / 255.0)
-
-
-def extract_color_temp_map(image, min_temp, max_temp, x1=306, y1=36, x2=315, y2=211):
-    """
-    Extract the color-to-temperature mapping from the scale bar region.
-    Coordinates (x1, y1) to (x2, y2) should cover the vertical temperature scale.
-    """
-    height, width, _ = image.shape
-    if x1 < 0 or x2 > width or y1 < 0 or y2 > height:
-        raise ValueError("Scale bar coordinates are out of image bounds.")
-
-    cropped_scale = image[y1:y2, x1:x2]
-    scale_height, scale_width, _ = cropped_scale.shape
-    color_temp_map = []
-
-    for row_index in range(scale_height):
-        row_pixels = cropped_scale[row_index, :, :]
-        # Average over the width for this row.
-        avg_bgr = np.mean(row_pixels, axis=0).tolist()
-        fraction = row_index / (scale_height - 1) if scale_height > 1 else 0
-        # Interpolate temperature from top (max_temp) to bottom (min_temp)
-        row_temp = max_temp - fraction * (max_temp - min_temp)
-        color_temp_map.append((row_temp, avg_bgr))
-
-    # Sort the mapping by temperature (ascending order)
-    color_temp_map.sort(key=lambda x: x[0])
-    return color_temp_map
-
-
-def estimate_temperature(image, color_temp_map, x_target, y_target):
-    """
-    Estimate the temperature at the specified (x, y) point.
-    Compares the target pixel's normalized RGB to each row's color in the scale.
-    """
-    height, width, _ = image.shape
-    if not (0 <= x_target < width and 0 <= y_target < height):
-        raise ValueError("Target coordinates are out of image bounds.")
-
-    target_color = image[y_target, x_target, :]
-    target_rgb = bgr_to_rgb(target_color)
-
-    min_distance = float("inf")
-    estimated_temp = None
-    for temp, bgr in color_temp_map:
-        row_rgb = bgr_to_rgb(bgr)
-        # Euclidean distance in RGB space.
-        distance = np.sqrt(
-            (target_rgb[0] - row_rgb[0]) ** 2
-            + (target_rgb[1] - row_rgb[1]) ** 2
-            + (target_rgb[2] - row_rgb[2]) ** 2
-        )
-        if distance < min_distance:
-            min_distance = distance
-            estimated_temp = temp
-    return estimated_temp
+from frame_source import open_source
+from frame_store import FrameStoreWriter
+from live_plot import LivePlot
+from metrics import MetricsServer, register_pipeline
+from overlay import SparklineOverlay
+from image_writer import ImageWriter
+import latency
+from palette import PaletteCache
+from pipeline import CaptureThread, StageThread, stop_pipeline
+from points import (
+    PointSampler,
+    load_points,
+    summarize_temperatures,
+)
+from rollups import RESOLUTIONS, Rollups, combine, query_rollups
+from temperature_log import TemperatureLogWriter, export_csv
 
 
 def main():
@@ -88,198 +44,302 @@ def main():
 
     # Ask the user to enter the points file name or path.
     points_file = input("Enter the filename or path for the points file: ").strip()
-    points = []  # will store tuples of (x, y, name)
     try:
-        with open(points_file, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    parts = line.split(",")
-                    if len(parts) == 3:
-                        try:
-                            x = int(parts[0].strip())
-                            y = int(parts[1].strip())
-                            name = parts[2].strip()
-                            points.append((x, y, name))
-                        except ValueError:
-                            print(f"Skipping invalid line: {line}")
-                    elif len(parts) == 2:
-                        try:
-                            x = int(parts[0].strip())
-                            y = int(parts[1].strip())
-                            name = f"Point {len(points)+1}"
-                            points.append((x, y, name))
-                        except ValueError:
-                            print(f"Skipping invalid line: {line}")
-        if len(points) != 5:
-            print(
-                "Error: The file must contain exactly 5 points (each with x,y[,name])."
-            )
-            return
+        points = load_points(points_file)  # tuples of (x, y, name)
     except FileNotFoundError:
         print(f"Error: File '{points_file}' not found.")
         return
+    if not points:
+        print("Error: The file must contain at least one point (x,y[,name]).")
+        return
+    sampler = PointSampler(points)
 
-    # Create photos directory if it doesn't exist.
+    # Sampled frames are appended to a chunked, memory-mapped frame store
+    # (see frame_store.py) rather than written as one image file each.
+    # Set export_photos to also write every frame as an image in photos_dir.
+    frame_store_dir = "frames"
+    export_photos = False
     photos_dir = "photos"
-    if not os.path.exists(photos_dir):
+    if export_photos and not os.path.exists(photos_dir):
         os.makedirs(photos_dir)
 
-    # Open CSV file for logging temperature data.
+    # Log temperature data to an append-only binary log of fixed-width
+    # records (see temperature_log.py); it is exported to CSV at the end.
+    log_filename = "photo_temperature_data.bin"
     csv_filename = "photo_temperature_data.csv"
-    csvfile = open(csv_filename, "w", newline="")
-    writer = csv.writer(csvfile)
-    header = ["Photo", "Timestamp"]
-    for pt in points:
-        header.append(f"Estimated Temperature {pt[2]} (C)")
-    writer.writerow(header)
-
-    # Setup camera. Change camera_index if needed.
+    columns = [f"Estimated Temperature {name} (C)" for name in sampler.names]
+    temp_log = TemperatureLogWriter(log_filename, columns, overwrite=True)
+    # Streaming min/max/mean/count of every point per 10 s, 1 min and 15 min,
+    # kept next to the log so reports need not scan the raw samples.
+    rollups = Rollups(log_filename, columns, overwrite=True)
+
+    # Setup camera. Change camera_index if needed. To replay a recording
+    # instead, set source to a video file, a directory of photos or a frame
+    # store, or "synthetic", and replay_speed to "realtime", "fast" or a
+    # number of frames per second (see frame_source.py).
     camera_index = 1  # Adjust as needed; often index 0 is the default camera.
-    cap = cv2.VideoCapture(camera_index)
+    source = camera_index
+    replay_speed = "realtime"
+    cap = open_source(source, replay_speed)
     if not cap.isOpened():
-        print(f"Cannot open camera at index {camera_index}")
-        csvfile.close()
+        print(f"Cannot open frame source {source}")
+        temp_log.close()
+        rollups.close()
         return
 
-    # Initialize variables for photo capture and plotting.
-    last_capture_time = time.time()
-    start_time = last_capture_time  # record when streaming started
-    img_counter = 0
-
-    # Initialize real-time plotting in interactive mode.
-    plt.ion()
-    fig, ax = plt.subplots()
-    ax.set_xlabel("Time (s)")
-    ax.set_ylabel("Temperature (C)")
-    ax.set_title("Real-Time Temperature Data")
-    times_data = []
-    # Create a list for each of the 5 points.
-    temps_for_points = [[] for _ in range(5)]
-    plot_lines = [ax.plot([], [], marker="o", label=points[i][2])[0] for i in range(5)]
-    ax.legend()
+    # Set measure_latency to time every stage (frame read, estimation, disk
+    # writes, overlay, display, plot) into latency histograms, reported every
+    # latency_interval seconds and at exit; while off the timers are no-ops.
+    measure_latency = False
+    latency_interval = 60.0  # seconds between latency reports.
+    if measure_latency:
+        latency.enable(latency_interval)
+
+    # Set metrics_port (e.g. 9108) to serve pipeline health and the latest
+    # temperatures in the Prometheus text format at
+    # http://127.0.0.1:<metrics_port>/metrics for a local scraper (see
+    # metrics.py); stage latencies are included while measure_latency is on.
+    metrics_port = None
+
+    start_time = time.time()  # record when streaming started
+
+    # Exported photos are encoded and written on background threads. image_format is
+    # "png", "webp" (lossless) or "npy" (raw, fastest); png_compression runs
+    # from 0 (fastest, largest) to 9. With image_queue_policy "block" a slow
+    # disk holds up the logging stage, with "drop" photos are skipped instead.
+    image_format = "png"
+    png_compression = 1
+    image_queue_policy = "block"
+    image_writer = None
+    if export_photos:
+        image_writer = ImageWriter(
+            image_format, png_compression, policy=image_queue_policy
+        )
+    frame_store = FrameStoreWriter(frame_store_dir)
+
+    # Palettes are only rebuilt when the scale bar pixels or min/max change.
+    palette_cache = PaletteCache()
+
+    # live_chart picks how samples are charted: "matplotlib" (a separate plot
+    # window), "overlay" (sparklines with current and min/max values drawn
+    # into the video, far lighter) or "both". Sparklines need few points.
+    live_chart = "matplotlib"
+    few_points = len(points) <= 10
+
+    # The matplotlib chart shows the last plot_window seconds from a
+    # fixed-size history and redraws at most plot_max_fps times a second,
+    # so it costs the same after a week as after a minute.
+    plot_window = 300.0  # seconds of history shown.
+    plot_max_fps = 5
+    live_plot = None
+    if live_chart in ("matplotlib", "both"):
+        live_plot = LivePlot(
+            sampler.names,
+            window=plot_window,
+            capacity=int(plot_window / max(sampling_interval, 0.01)) + 2,
+            max_fps=plot_max_fps,
+            few_points=few_points,
+        )
+    sparklines = None
+    if live_chart in ("overlay", "both") and few_points:
+        sparkline_samples = 60  # samples of history per sparkline.
+        sparklines = SparklineOverlay(points, history=sparkline_samples)
+
+    def process(sample):
+        """Processing stage: estimate the temperatures of one captured frame."""
+        img_counter, capture_time, frame = sample
+        try:
+            # Process the frame to estimate the temperature.
+            palette = palette_cache.get(frame, min_temp, max_temp)
+        except ValueError as e:
+            print(f"Error processing image: {e}")
+            palette = None
+
+        if palette is not None:
+            # All points are gathered and looked up in a single pass.
+            with latency.timer("estimation"):
+                temps = sampler.sample(frame, palette)
+            for idx in np.flatnonzero(~sampler.inside(frame)):
+                print(
+                    f"Error processing {sampler.names[idx]} in sample {img_counter}: Target coordinates are out of image bounds."
+                )
+        else:
+            temps = None
+        return img_counter, capture_time, frame, temps
+
+    latest_sample = None  # (capture time, temperatures), for the metrics page.
+
+    def record(result):
+        """Sink stage: store the frame, log the sample and pass it on to the plot."""
+        nonlocal latest_sample
+        img_counter, capture_time, frame, temps = result
+        with latency.timer("frame store write"):
+            frame_number = frame_store.append(frame, capture_time)
+        if image_writer is not None:
+            photo_filename = f"image_{frame_number:06d}{image_writer.extension}"
+            image_writer.save(os.path.join(photos_dir, photo_filename), frame)
+
+        timestamp_str = datetime.fromtimestamp(capture_time).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        with latency.timer("log write"):
+            temp_log.append(capture_time, frame_number, temps)
+            if temps is not None:
+                rollups.add(capture_time, temps)
+        if temps is not None:
+            print(
+                f"Captured frame {frame_number} at {timestamp_str} with temperatures: {summarize_temperatures(temps)}"
+            )
+        else:
+            temps = np.full(len(points), np.nan, dtype=np.float32)
+            print(
+                f"Captured frame {frame_number} at {timestamp_str} but failed to estimate temperatures."
+            )
+        latest_sample = (capture_time, temps)
+        return capture_time - start_time, temps
+
+    # The camera is drained on its own thread, so a slow PNG write or plot
+    # redraw never holds up acquisition; samples flow capture -> processing ->
+    # sink over bounded queues and frames are dropped rather than queued up.
+    # The GUI (OpenCV window and matplotlib) stays on this thread.
+    capture = CaptureThread(cap, sampling_interval)
+    processing = StageThread("processing", process, capture.samples, outbox_size=4)
+    sink = StageThread(
+        "sink", record, processing.outbox, outbox_size=64, drop_when_full=True
+    )
+    metrics = None
+    if metrics_port is not None:
+        metrics = MetricsServer(metrics_port)
+        register_pipeline(
+            metrics,
+            capture,
+            [processing, sink],
+            palette_cache,
+            sampler.names,
+            lambda: latest_sample,
+        )
+        metrics.start()
+        print(f"Serving metrics at http://{metrics.host}:{metrics.port}/metrics")
+    for thread in (capture, processing, sink):
+        thread.start()
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Can't receive frame. Exiting...")
+        try:
+            captured = capture.frames.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if captured is None:
+            if capture.failed:
+                print("Can't receive frame. Exiting...")
             break
+        current_time, frame = captured
+
+        # Add every sample logged since the last frame to the chart history;
+        # the matplotlib chart itself is only redrawn at its capped rate. This
+        # comes first so the sparklines drawn below include the newest sample.
+        while True:
+            try:
+                logged = sink.outbox.get_nowait()
+            except queue.Empty:
+                break
+            if logged is None:
+                break
+            sample_time, temps = logged
+            if live_plot is not None:
+                live_plot.add(sample_time, temps)
+            if sparklines is not None:
+                sparklines.add(temps)
+        if live_plot is not None:
+            with latency.timer("plot update"):
+                live_plot.refresh()
 
         # Get frame height for overlay text.
         height = frame.shape[0]
-        current_time = time.time()
         elapsed_time = current_time - start_time
 
-        # Draw overlay text.
-        overlay_text1 = f"Time Elapsed: {elapsed_time:.1f} s"
-        overlay_text2 = f"Photos Captured: {img_counter}"
-        cv2.putText(
-            frame,
-            overlay_text1,
-            (10, height - 40),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (0, 255, 0),
-            1,
-            cv2.LINE_AA,
-        )
-        cv2.putText(
-            frame,
-            overlay_text2,
-            (10, height - 10),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (0, 255, 0),
-            1,
-            cv2.LINE_AA,
-        )
-
-        # Pinpoint the points of interest by drawing circles and names.
-        for x, y, name in points:
-            cv2.circle(frame, (x, y), 5, (0, 0, 255), 2)  # red circle with radius 5
+        # Draw overlay text, the points and the sparklines.
+        with latency.timer("overlay"):
+            overlay_text1 = f"Time Elapsed: {elapsed_time:.1f} s"
+            overlay_text2 = f"Photos Captured: {sink.counter.count}"
             cv2.putText(
                 frame,
-                name,
-                (x + 8, y - 8),
+                overlay_text1,
+                (10, height - 40),
                 cv2.FONT_HERSHEY_SIMPLEX,
                 0.5,
-                (255, 0, 0),
+                (0, 255, 0),
+                1,
+                cv2.LINE_AA,
+            )
+            cv2.putText(
+                frame,
+                overlay_text2,
+                (10, height - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 255, 0),
                 1,
                 cv2.LINE_AA,
             )
 
-        # Display the live video stream.
-        cv2.imshow("FLIR E6390 (Webcam-like) Stream", frame)
-
-        # Capture photo and process every sampling_interval seconds.
-        if current_time - last_capture_time >= sampling_interval:
-            photo_filename = f"image_{img_counter:03d}.png"
-            photo_path = os.path.join(photos_dir, photo_filename)
-            cv2.imwrite(photo_path, frame)
-
-            try:
-                # Process the frame to estimate the temperature.
-                color_temp_map = extract_color_temp_map(frame, min_temp, max_temp)
-            except ValueError as e:
-                print(f"Error processing image: {e}")
-                color_temp_map = None
-
-            timestamp_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            temps = []
-            if color_temp_map is not None:
-                for idx, (x, y, name) in enumerate(points):
-                    try:
-                        estimated_temp = estimate_temperature(
-                            frame, color_temp_map, x, y
-                        )
-                    except ValueError as e:
-                        print(f"Error processing {name} in image {photo_filename}: {e}")
-                        estimated_temp = np.nan
-                    temps.append(estimated_temp)
-                print(
-                    f"Captured {photo_filename} at {timestamp_str} with temperatures: {', '.join([f'{t:.2f}' if not np.isnan(t) else 'Error' for t in temps])}"
-                )
-            else:
-                temps = [np.nan] * len(points)
-                print(
-                    f"Captured {photo_filename} at {timestamp_str} but failed to estimate temperatures."
-                )
+            # Pinpoint the points of interest by drawing circles and names.
+            for x, y, name in points:
+                cv2.circle(frame, (x, y), 5, (0, 0, 255), 2)  # red circle with radius 5
+                if few_points:
+                    cv2.putText(
+                        frame,
+                        name,
+                        (x + 8, y - 8),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5,
+                        (255, 0, 0),
+                        1,
+                        cv2.LINE_AA,
+                    )
+            if sparklines is not None:
+                sparklines.draw(frame)
 
-            # Log the data into CSV.
-            csv_row = [photo_filename, timestamp_str]
-            for temp in temps:
-                if np.isnan(temp):
-                    csv_row.append("Error")
-                else:
-                    csv_row.append(f"{temp:.2f}")
-            writer.writerow(csv_row)
-
-            # Update real-time plot data.
-            times_data.append(elapsed_time)
-            for i in range(5):
-                temps_for_points[i].append(temps[i])
-                # Update the existing plot line data instead of redrawing the whole plot.
-                plot_lines[i].set_data(times_data, temps_for_points[i])
-            ax.relim()
-            ax.autoscale_view()
-
-            plt.draw()
-            plt.pause(0.001)
-
-            img_counter += 1
-            last_capture_time = current_time
+        # Display the live video stream.
+        with latency.timer("display"):
+            cv2.imshow("FLIR E6390 (Webcam-like) Stream", frame)
+            key = cv2.waitKey(1) & 0xFF
 
         # Allow user to quit the application by pressing 'q'.
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+        if key == ord("q"):
             break
 
-    # Clean up.
+    # Clean up once the queued samples have been written.
+    stop_pipeline(capture, [processing, sink])
+    frame_store.close()
+    print(f"{len(frame_store)} frames stored in '{frame_store.store_dir}'.")
+    if image_writer is not None:
+        image_writer.close()
+        print(image_writer.summary())
     cap.release()
     cv2.destroyAllWindows()
-    csvfile.close()
-    plt.ioff()
-    plt.show()
-    print(f"Temperature data saved to '{csv_filename}'.")
+    temp_log.close()
+    with latency.timer("CSV export"):
+        export_csv(log_filename, csv_filename)
+    rollups.close()
+    latency.disable()
+    if metrics is not None:
+        metrics.close()
+
+    # Summarize the session from the coarsest rollup tier.
+    _, buckets = query_rollups(log_filename, RESOLUTIONS[-1])
+    counts, mins, maxs, means = combine(buckets)
+    if few_points:
+        for name, count, low, high, mean in zip(
+            sampler.names, counts, mins, maxs, means
+        ):
+            print(
+                f"{name}: {count} samples, min {low:.2f}, mean {mean:.2f}, max {high:.2f}"
+            )
+    if live_plot is not None:
+        live_plot.finish()
+        plt.show()
+    print(f"Palette cache: {palette_cache.hits} hits, {palette_cache.misses} misses.")
+    print(f"Temperature data saved to '{log_filename}' and '{csv_filename}'.")
 
 
 if __name__ == "__main__":
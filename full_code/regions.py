@@ -0,0 +1,161 @@
+import cv2
+import numpy as np
+
+REGION_KINDS = ("rect", "poly")
+
+
+def load_regions(points_file):
+    """
+    Read regions of interest declared in the points file next to the points:
+        rect, x1, y1, x2, y2[, name]
+        poly, x1, y1, x2, y2, x3, y3[, ...][, name]
+    Rectangle corners follow the scale bar convention, so x2 and y2 are
+    exclusive. Unnamed regions are called "Region N". Returns a list of
+    (kind, [(x, y), ...], name) tuples.
+    """
+    regions = []
+    with open(points_file, "r") as f:
+        for line in f:
+            parts = [part.strip() for part in line.strip().split(",")]
+            kind = parts[0].lower()
+            if kind not in REGION_KINDS:
+                continue
+
+            values = parts[1:]
+            name = f"Region {len(regions)+1}"
+            if len(values) % 2 == 1:
+                name = values.pop()
+            try:
+                coords = [int(v) for v in values]
+            except ValueError:
+                print(f"Skipping invalid region: {line.strip()}")
+                continue
+            corners = list(zip(coords[0::2], coords[1::2]))
+            if (kind == "rect" and len(corners) != 2) or (
+                kind == "poly" and len(corners) < 3
+            ):
+                print(f"Skipping invalid region: {line.strip()}")
+                continue
+            regions.append((kind, corners, name))
+    return regions
+
+
+class RegionStats:
+    """
+    Per-frame min/max/mean/percentile temperature of every region.
+    Rectangle means come from one summed-area table over the temperature map,
+    so they cost four lookups each whatever the rectangle size. Min, max and
+    the percentile still read every pixel of a region, so a frame costs
+    O(total region area): a summed-area table only gives sums, and a min/max
+    table would have to be rebuilt for every new map, costing more than the
+    reads it saves. Polygon masks are rasterized once per frame size and
+    kept as flat pixel indices. compute() only reads the map within
+    bounds(), so the rest of the frame need not be converted.
+    """
+
+    def __init__(self, regions, percentile=95):
+        self.names = [name for _, _, name in regions]
+        self.regions = regions
+        self.percentile = percentile
+        self._frame_shape = None
+
+    def __len__(self):
+        return len(self.regions)
+
+    def header(self):
+        """CSV column names, four per region."""
+        columns = []
+        for name in self.names:
+            columns += [
+                f"{name} Min (C)",
+                f"{name} Max (C)",
+                f"{name} Mean (C)",
+                f"{name} P{self.percentile:g} (C)",
+            ]
+        return columns
+
+    def bounds(self, shape):
+        """
+        The (x1, y1, x2, y2) box, x2 and y2 exclusive, around every region
+        pixel of a frame of this shape; empty if no region is inside it.
+        """
+        if shape != self._frame_shape:
+            self._prepare(shape)
+        return self._bounds
+
+    def _prepare(self, shape):
+        height, width = shape
+        self._frame_shape = shape
+        self._rect_rows = []
+        self._rects = []
+        self._polygons = []
+        for row, (kind, corners, _) in enumerate(self.regions):
+            if kind == "rect":
+                (x1, y1), (x2, y2) = corners
+                x1, x2 = sorted((min(max(x1, 0), width), min(max(x2, 0), width)))
+                y1, y2 = sorted((min(max(y1, 0), height), min(max(y2, 0), height)))
+                self._rect_rows.append(row)
+                self._rects.append((x1, y1, x2, y2))
+            else:
+                mask = np.zeros(shape, dtype=np.uint8)
+                cv2.fillPoly(mask, [np.array(corners, dtype=np.int32)], 1)
+                self._polygons.append((row, np.flatnonzero(mask)))
+        self._rect_rows = np.array(self._rect_rows, dtype=np.intp)
+        self._rects = np.array(self._rects, dtype=np.intp).reshape(-1, 4)
+
+        boxes = [
+            (x1, y1, x2, y2)
+            for x1, y1, x2, y2 in self._rects.tolist()
+            if x1 < x2 and y1 < y2
+        ]
+        for _, indices in self._polygons:
+            if indices.size:
+                ys, xs = np.divmod(indices, width)
+                boxes.append((xs.min(), ys.min(), xs.max() + 1, ys.max() + 1))
+        if boxes:
+            x1s, y1s, x2s, y2s = zip(*boxes)
+            self._bounds = (int(min(x1s)), int(min(y1s)), int(max(x2s)), int(max(y2s)))
+        else:
+            self._bounds = (0, 0, 0, 0)
+
+    def compute(self, temp_map):
+        """
+        Return a float32 array of shape (regions, 4) holding min, max, mean
+        and percentile temperature, with NaN for regions outside the frame.
+        """
+        if temp_map.shape != self._frame_shape:
+            self._prepare(temp_map.shape)
+        stats = np.full((len(self.regions), 4), np.nan, dtype=np.float32)
+
+        if len(self._rects):
+            # The summed-area table only spans bounds(), in its coordinates.
+            bx1, by1, bx2, by2 = self._bounds
+            block = temp_map[by1:by2, bx1:bx2]
+            sat = np.zeros((block.shape[0] + 1, block.shape[1] + 1))
+            np.cumsum(
+                np.cumsum(block, axis=0, dtype=np.float64), axis=1, out=sat[1:, 1:]
+            )
+            x1, y1, x2, y2 = self._rects.T
+            sx1, sx2 = (np.clip(x - bx1, 0, bx2 - bx1) for x in (x1, x2))
+            sy1, sy2 = (np.clip(y - by1, 0, by2 - by1) for y in (y1, y2))
+            area = (x2 - x1) * (y2 - y1)
+            sums = sat[sy2, sx2] - sat[sy1, sx2] - sat[sy2, sx1] + sat[sy1, sx1]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                stats[self._rect_rows, 2] = sums / area
+            for row, (x1, y1, x2, y2), size in zip(self._rect_rows, self._rects, area):
+                if size:
+                    values = temp_map[y1:y2, x1:x2]
+                    stats[row, [0, 1, 3]] = _spread(values, self.percentile)
+
+        flat = temp_map.ravel()
+        for row, indices in self._polygons:
+            if indices.size:
+                values = flat[indices]
+                stats[row, [0, 1, 3]] = _spread(values, self.percentile)
+                stats[row, 2] = values.mean(dtype=np.float64)
+        return stats
+
+
+def _spread(values, percentile):
+    """Min, max and percentile of a block of temperatures."""
+    return values.min(), values.max(), np.percentile(values, percentile)
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity history of (time, values) samples. Every row is written
+    twice, capacity rows apart, so the latest samples are always one
+    contiguous slice and reading them never copies.
+    """
+
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        self._values = np.zeros((2 * capacity, width), dtype=np.float32)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, t, values):
+        for row in (self._next, self._next + self.capacity):
+            self._times[row] = t
+            self._values[row] = values
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def view(self):
+        """(times, values) of the stored samples, oldest first, as views."""
+        end = self._next + self.capacity if self._size == self.capacity else self._next
+        start = end - self._size
+        return self._times[start:end], self._values[start:end]
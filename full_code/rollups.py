@@ -0,0 +1,175 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+from temperature_log import HEADER_SIZE
+
+MAGIC = b"TRUP"
+
+# Rollup resolutions in seconds: 10 s, 1 min and 15 min.
+RESOLUTIONS = (10, 60, 900)
+
+
+def rollup_dtype(columns):
+    """One finished bucket: its start time and per-column count/min/max/mean."""
+    shape = (len(columns),)
+    return np.dtype(
+        [
+            ("start", "<f8"),
+            ("count", "<u4", shape),
+            ("min", "<f4", shape),
+            ("max", "<f4", shape),
+            ("mean", "<f4", shape),
+        ]
+    )
+
+
+def rollup_path(base_path, resolution):
+    """File holding one tier, e.g. photo_temperature_data.60s.bin."""
+    return f"{os.path.splitext(base_path)[0]}.{resolution}s.bin"
+
+
+class RollupTier:
+    """
+    Running count/min/max/sum of every column over one time bucket. Each
+    sample only updates the running arrays; when a sample lands in a later
+    bucket the finished one is appended to the tier's file as one record.
+    NaN values are left out of a column's statistics.
+    """
+
+    def __init__(self, path, columns, resolution, overwrite=False):
+        self.path = path
+        self.resolution = resolution
+        self.dtype = rollup_dtype(columns)
+        if overwrite or not os.path.exists(path) or not os.path.getsize(path):
+            header = json.dumps(
+                {"columns": list(columns), "resolution": resolution}
+            ).encode("utf-8")
+            if len(header) + 8 > HEADER_SIZE:
+                raise ValueError("Too many or too long column names for the header.")
+            with open(path, "wb") as f:
+                f.write(MAGIC + struct.pack("<I", len(header)) + header)
+                f.write(b"\0" * (HEADER_SIZE - 8 - len(header)))
+        elif read_rollup_header(path) != {
+            "columns": list(columns),
+            "resolution": resolution,
+        }:
+            raise ValueError(f"Rollup '{path}' has different columns.")
+        self._file = open(path, "ab")
+        self._bucket = None
+        self._record = np.zeros(1, dtype=self.dtype)
+        self._count = np.zeros(len(columns), dtype=np.uint32)
+        self._min = np.empty(len(columns), dtype=np.float32)
+        self._max = np.empty(len(columns), dtype=np.float32)
+        self._sum = np.zeros(len(columns), dtype=np.float64)
+
+    def add(self, timestamp, values):
+        bucket = int(timestamp // self.resolution)
+        if bucket != self._bucket:
+            self.flush()
+            self._bucket = bucket
+            self._count[:] = 0
+            self._min[:] = np.nan
+            self._max[:] = np.nan
+            self._sum[:] = 0.0
+
+        valid = ~np.isnan(values)
+        self._count += valid
+        # fmin/fmax ignore NaN on either side, so empty columns fill in.
+        np.fmin(self._min, values, out=self._min)
+        np.fmax(self._max, values, out=self._max)
+        self._sum += np.where(valid, values, 0.0)
+
+    def flush(self):
+        """Write the current bucket, if it has any samples."""
+        if self._bucket is None:
+            return
+        record = self._record[0]
+        record["start"] = self._bucket * self.resolution
+        record["count"] = self._count
+        record["min"] = self._min
+        record["max"] = self._max
+        with np.errstate(invalid="ignore", divide="ignore"):
+            record["mean"] = self._sum / self._count
+        self._file.write(self._record.tobytes())
+        self._file.flush()
+        self._bucket = None
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class Rollups:
+    """
+    Streaming min/max/mean/count rollups of a temperature log at several
+    resolutions, each persisted next to the log (see rollup_path).
+    """
+
+    def __init__(self, base_path, columns, resolutions=RESOLUTIONS, overwrite=False):
+        self.tiers = [
+            RollupTier(rollup_path(base_path, res), columns, res, overwrite)
+            for res in resolutions
+        ]
+
+    def add(self, timestamp, values):
+        """Add one sample (float32 per column, NaN for failures) to every tier."""
+        values = np.asarray(values, dtype=np.float32)
+        for tier in self.tiers:
+            tier.add(timestamp, values)
+
+    def close(self):
+        """Write the unfinished buckets."""
+        for tier in self.tiers:
+            tier.close()
+
+
+def read_rollup_header(path):
+    with open(path, "rb") as f:
+        start = f.read(8)
+        if start[:4] != MAGIC:
+            raise ValueError(f"'{path}' is not a rollup file.")
+        (length,) = struct.unpack("<I", start[4:])
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+def query_rollups(base_path, resolution, start_time=None, end_time=None):
+    """
+    Return (columns, records) for the buckets of one resolution that start
+    in [start_time, end_time). records is a read-only memory-mapped slice
+    with the fields of rollup_dtype, found by binary search on bucket start.
+    """
+    path = rollup_path(base_path, resolution)
+    columns = read_rollup_header(path)["columns"]
+    dtype = rollup_dtype(columns)
+    count = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+    if count == 0:
+        return columns, np.zeros(0, dtype=dtype)
+    records = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+    first = 0 if start_time is None else np.searchsorted(records["start"], start_time)
+    last = count if end_time is None else np.searchsorted(records["start"], end_time)
+    return columns, records[first:last]
+
+
+def combine(records):
+    """
+    Merge rollup records into one per-column (count, min, max, mean), e.g.
+    for a report over the buckets returned by query_rollups.
+    """
+    columns = records.dtype["count"].shape[0]
+    if not len(records):
+        empty = np.full(columns, np.nan, dtype=np.float32)
+        return np.zeros(columns, dtype=np.uint64), empty, empty.copy(), empty.copy()
+    count = records["count"].sum(axis=0, dtype=np.uint64)
+    total = np.nansum(records["mean"] * records["count"], axis=0, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    # fmin/fmax skip the NaN of buckets where a column had no valid sample.
+    return (
+        count,
+        np.fmin.reduce(records["min"], axis=0),
+        np.fmax.reduce(records["max"], axis=0),
+        mean,
+    )
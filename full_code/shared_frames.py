@@ -0,0 +1,527 @@
+import argparse
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_source import open_source, parse_speed
+from palette import PaletteCache
+from points import PointSampler, load_points
+from synthetic_frames import FRAME_HEIGHT, FRAME_WIDTH
+
+FRAME_SHAPE = (FRAME_HEIGHT, FRAME_WIDTH, 3)
+SCALE_BOX = (306, 36, 315, 211)
+
+# Header words, int64: frames published, closed flag, then one sequence word
+# per slot and a cursor, step and offset per reader. A slot's sequence is 0
+# while empty, 2n + 1 while frame n is written into it and 2n + 2 once frame
+# n is complete, so a reader can tell from it whether the frame it holds is
+# still the one it took. A reader's cursor is the first frame it still
+# needs, or -1 while no reader is attached under that index; it only takes
+# the frames n with n % step == offset.
+_HEAD = 0
+_CLOSED = 1
+_SEQUENCES = 2
+# How long readers and a waiting writer sleep between looks at the header.
+POLL_INTERVAL = 0.0005
+
+
+class SharedFrameRing:
+    """
+    A ring of preallocated frame slots in one shared memory block, for
+    handing frames from the capture process to analysis processes without
+    pickling them through a queue. The writer fills a slot in place and
+    publishes it (FrameRingWriter); each reader gets the frames as NumPy
+    views into the block (FrameRingReader), so a frame is never copied after
+    it was decoded. A slot is reused slots frames later, so a reader must be
+    done with a frame by then; it finds out afterwards whether it was.
+
+    The ring is created by the capture side and passed to worker processes
+    as a Process argument, where it attaches to the same block. The header
+    words are only read and written under a multiprocessing lock, which also
+    orders them against the frame data on any CPU; the frame data itself is
+    never locked.
+    """
+
+    def __init__(self, slots=8, shape=FRAME_SHAPE, dtype=np.uint8, readers=4):
+        if slots < 2:
+            raise ValueError("A frame ring needs at least 2 slots.")
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.readers = readers
+        self.lock = multiprocessing.Lock()
+        self._creator = os.getpid()
+        self._shm = shared_memory.SharedMemory(create=True, size=self._size())
+        self.name = self._shm.name
+        self._map()
+        self._header[:] = 0
+        self._cursors[:] = -1
+        self._steps[:] = 1
+
+    def _layout(self):
+        header_words = _SEQUENCES + self.slots + 3 * self.readers
+        timestamps = 8 * header_words
+        # Frames start on a cache line.
+        frames = -(-(timestamps + 8 * self.slots) // 64) * 64
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        return header_words, timestamps, frames, frame_bytes
+
+    def _size(self):
+        _, _, frames, frame_bytes = self._layout()
+        return frames + self.slots * frame_bytes
+
+    def _map(self):
+        header_words, timestamps, frames, _ = self._layout()
+        buf = self._shm.buf
+        self._header = np.ndarray((header_words,), np.int64, buf, 0)
+        self._sequences = self._header[_SEQUENCES : _SEQUENCES + self.slots]
+        readers = self._header[_SEQUENCES + self.slots :].reshape(self.readers, 3)
+        self._cursors = readers[:, 0]
+        self._steps = readers[:, 1]
+        self._offsets = readers[:, 2]
+        self._timestamps = np.ndarray((self.slots,), np.float64, buf, timestamps)
+        self._frames = np.ndarray((self.slots,) + self.shape, self.dtype, buf, frames)
+
+    def __getstate__(self):
+        # Worker processes attach to the block by name.
+        return {
+            "slots": self.slots,
+            "shape": self.shape,
+            "dtype": self.dtype.str,
+            "readers": self.readers,
+            "lock": self.lock,
+            "name": self.name,
+            "creator": self._creator,
+        }
+
+    def __setstate__(self, state):
+        self.slots = state["slots"]
+        self.shape = state["shape"]
+        self.dtype = np.dtype(state["dtype"])
+        self.readers = state["readers"]
+        self.lock = state["lock"]
+        self.name = state["name"]
+        self._creator = state["creator"]
+        self._shm = shared_memory.SharedMemory(name=self.name)
+        self._map()
+
+    @property
+    def frame_bytes(self):
+        return self._layout()[3]
+
+    def attached(self):
+        """Number of readers attached."""
+        with self.lock:
+            return int((self._cursors >= 0).sum())
+
+    def published(self):
+        """Number of frames published so far."""
+        with self.lock:
+            return int(self._header[_HEAD])
+
+    def close(self):
+        """Unmap the block in this process; views into it must be gone."""
+        self._header = self._sequences = None
+        self._cursors = self._steps = self._offsets = None
+        self._timestamps = self._frames = None
+        self._shm.close()
+
+    def unlink(self):
+        """Free the block; only the creating process does so."""
+        if os.getpid() == self._creator:
+            self._shm.unlink()
+
+
+class FrameRingWriter:
+    """
+    The single writer of a SharedFrameRing. acquire() returns the next slot
+    as an array to fill, e.g. by frame_source.read(slot) or
+    cv2.VideoCapture.read(slot), and publish() hands it to the readers;
+    write() does both for a frame that already exists.
+
+    A live source never waits: the slot is overwritten even if a reader has
+    not finished with the frame in it. With wait=True, as for a recording,
+    acquire() waits up to timeout seconds for every reader to finish with
+    that frame first. Either way, overwriting a frame that a reader still
+    needed counts as an overrun.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.written = 0
+        self.reused = 0
+        self.overruns = 0
+        self.wait_time = 0.0
+        self._number = None
+
+    def acquire(self, wait=False, timeout=None):
+        ring = self.ring
+        with ring.lock:
+            number = int(ring._header[_HEAD])
+        slot = number % ring.slots
+        previous = number - ring.slots
+        if previous >= 0:
+            self.reused += 1
+            start = time.monotonic()
+            while True:
+                with ring.lock:
+                    # Only a reader that takes the frame and has not got
+                    # past it still needs it.
+                    cursors = ring._cursors
+                    needed = bool(
+                        (
+                            (cursors >= 0)
+                            & (cursors <= previous)
+                            & ((previous - ring._offsets) % ring._steps == 0)
+                        ).any()
+                    )
+                    if not needed or not wait:
+                        # Readers that look at the slot from now on skip it.
+                        ring._sequences[slot] = 2 * number + 1
+                        break
+                if timeout is not None and time.monotonic() - start >= timeout:
+                    wait = False
+                    continue
+                time.sleep(POLL_INTERVAL)
+            self.wait_time += time.monotonic() - start
+            if needed:
+                self.overruns += 1
+        else:
+            with ring.lock:
+                ring._sequences[slot] = 2 * number + 1
+        self._number = number
+        return ring._frames[slot]
+
+    def publish(self, timestamp=None):
+        """Make the acquired slot available to readers as the next frame."""
+        ring = self.ring
+        number = self._number
+        slot = number % ring.slots
+        with ring.lock:
+            ring._timestamps[slot] = time.time() if timestamp is None else timestamp
+            ring._sequences[slot] = 2 * number + 2
+            ring._header[_HEAD] = number + 1
+        self._number = None
+        self.written += 1
+
+    def cancel(self):
+        """Give up the acquired slot, e.g. when the source failed to read."""
+        ring = self.ring
+        with ring.lock:
+            ring._sequences[self._number % ring.slots] = 0
+        self._number = None
+
+    def write(self, frame, timestamp=None, wait=False, timeout=None):
+        self.acquire(wait, timeout)[...] = frame
+        self.publish(timestamp)
+
+    def close(self):
+        """Tell the readers that no more frames will come."""
+        with self.ring.lock:
+            self.ring._header[_CLOSED] = 1
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "slots reused": self.reused,
+            "overruns": self.overruns,
+            "wait seconds": round(self.wait_time, 3),
+        }
+
+
+class FrameRef:
+    """One frame taken from the ring: its number, timestamp and slot view."""
+
+    __slots__ = ("number", "timestamp", "frame", "slot")
+
+    def __init__(self, number, timestamp, frame, slot):
+        self.number = number
+        self.timestamp = timestamp
+        self.frame = frame
+        self.slot = slot
+
+
+class FrameRingReader:
+    """
+    One reader of a SharedFrameRing, attached under index, which no other
+    reader may use at the same time. It takes the frames numbered offset,
+    offset + step, ... published after it attached, so step readers with
+    offsets 0 to step - 1 share the frames between them.
+
+    next() returns a FrameRef whose frame is a view into the slot; once done
+    with it, release() says whether the slot still held that frame, and a
+    result computed from a frame that was overwritten meanwhile should be
+    thrown away. Frames that were overwritten before next() got to them are
+    skipped and counted.
+    """
+
+    def __init__(self, ring, index=0, step=1, offset=0):
+        if not 0 <= index < ring.readers:
+            raise ValueError(f"Reader index must be below {ring.readers}.")
+        self.ring = ring
+        self.index = index
+        self.step = step
+        self.offset = offset
+        self.read = 0
+        self.skipped = 0
+        self.torn = 0
+        with ring.lock:
+            self._position = self._first_from(int(ring._header[_HEAD]))
+            ring._steps[index] = step
+            ring._offsets[index] = offset
+            ring._cursors[index] = self._position
+
+    def _first_from(self, number):
+        """The first frame at or after number that this reader takes."""
+        return number + (self.offset - number) % self.step
+
+    def next(self, timeout=None):
+        """The next frame, or None once the writer closed or after timeout."""
+        ring = self.ring
+        start = time.monotonic()
+        while True:
+            with ring.lock:
+                head = int(ring._header[_HEAD])
+                closed = bool(ring._header[_CLOSED])
+                if head > self._position:
+                    oldest = self._first_from(max(head - ring.slots, 0))
+                    if self._position < oldest:
+                        self.skipped += (oldest - self._position) // self.step
+                        self._position = oldest
+                    number = self._position
+                    self._position = number + self.step
+                    slot = number % ring.slots
+                    if ring._sequences[slot] != 2 * number + 2:
+                        # The writer is already refilling its slot.
+                        self.skipped += 1
+                        ring._cursors[self.index] = self._position
+                        continue
+                    ring._cursors[self.index] = number
+                    self.read += 1
+                    return FrameRef(
+                        number,
+                        float(ring._timestamps[slot]),
+                        ring._frames[slot],
+                        slot,
+                    )
+            if closed:
+                return None
+            if timeout is not None and time.monotonic() - start >= timeout:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, ref):
+        """True if the frame was not overwritten while the reader had it."""
+        ring = self.ring
+        with ring.lock:
+            intact = ring._sequences[ref.slot] == 2 * ref.number + 2
+            ring._cursors[self.index] = self._position
+        if not intact:
+            self.torn += 1
+        return bool(intact)
+
+    def close(self):
+        with self.ring.lock:
+            self.ring._cursors[self.index] = -1
+
+    def stats(self):
+        return {"read": self.read, "skipped": self.skipped, "torn": self.torn}
+
+
+def analysis_worker(transport, index, workers, points, min_temp, max_temp, results):
+    """
+    Estimate the points of every workers-th frame, taking frames from the
+    shared ring or, for comparison, from a queue of pickled frames; send
+    (index, processed, discarded, mean temperature, reader stats) at the end.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sampler = PointSampler(points)
+    palette_cache = PaletteCache()
+    processed = 0
+    discarded = 0
+    total = 0.0
+    stats = {}
+    if isinstance(transport, SharedFrameRing):
+        reader = FrameRingReader(transport, index, step=workers, offset=index)
+        while True:
+            ref = reader.next()
+            if ref is None:
+                break
+            palette = palette_cache.get(ref.frame, min_temp, max_temp)
+            temps = sampler.sample(ref.frame, palette)
+            if reader.release(ref):
+                processed += 1
+                total += float(np.nanmean(temps))
+            else:
+                discarded += 1
+        stats = reader.stats()
+        reader.close()
+        del ref
+        transport.close()
+    else:
+        while True:
+            item = transport.get()
+            if item is None:
+                break
+            _, frame = item
+            palette = palette_cache.get(frame, min_temp, max_temp)
+            total += float(np.nanmean(sampler.sample(frame, palette)))
+            processed += 1
+    mean = total / processed if processed else float("nan")
+    results.put((index, processed, discarded, mean, stats))
+
+
+def random_points(count, height, seed=0):
+    rng = np.random.default_rng(seed)
+    xs = rng.integers(0, SCALE_BOX[0] - 20, count)
+    ys = rng.integers(0, height, count)
+    return [(int(x), int(y), f"Point {i+1}") for i, (x, y) in enumerate(zip(xs, ys))]
+
+
+def run(args):
+    """
+    Capture args.frames frames in this process and spread their analysis
+    over args.workers processes through the chosen transport; returns the
+    capture rate in frames per second.
+    """
+    cap = open_source(args.source, args.speed)
+    if not cap.isOpened():
+        print(f"Error: Cannot open frame source {args.source}.")
+        return None
+    live = getattr(cap, "live", True)
+    ret, frame = cap.read()
+    if not ret:
+        print("Error: The frame source has no frames.")
+        return None
+    if args.points_file:
+        points = load_points(args.points_file)
+    else:
+        points = random_points(25, frame.shape[0])
+
+    results = multiprocessing.Queue()
+    if args.transport == "shm":
+        ring = SharedFrameRing(args.slots, frame.shape, frame.dtype, args.workers)
+        writer = FrameRingWriter(ring)
+        transports = [ring] * args.workers
+    else:
+        ring = None
+        transports = [multiprocessing.Queue(args.slots) for _ in range(args.workers)]
+    workers = [
+        multiprocessing.Process(
+            target=analysis_worker,
+            args=(t, i, args.workers, points, args.min_temp, args.max_temp, results),
+            name=f"analysis {i + 1}",
+            daemon=True,
+        )
+        for i, t in enumerate(transports)
+    ]
+    for worker in workers:
+        worker.start()
+    # Readers only take frames published after they attached.
+    while ring is not None and ring.attached() < len(workers):
+        if not all(worker.is_alive() for worker in workers):
+            print("Error: An analysis process exited.")
+            break
+        time.sleep(0.01)
+
+    count = 0
+    pickled = 0
+    start = time.perf_counter()
+    try:
+        while args.frames is None or count < args.frames:
+            if ring is not None and frame is not None:
+                # The first frame was read to size the ring.
+                writer.write(frame, wait=not live, timeout=1.0)
+                frame = None
+            elif ring is not None:
+                slot = writer.acquire(wait=not live, timeout=1.0)
+                ret, _ = cap.read(slot)
+                if not ret:
+                    writer.cancel()
+                    break
+                writer.publish()
+            else:
+                if frame is None:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                target = transports[count % args.workers]
+                item = (time.time(), frame)
+                pickled += len(pickle.dumps(item, pickle.HIGHEST_PROTOCOL))
+                if live:
+                    try:
+                        target.put_nowait(item)
+                    except queue.Full:
+                        pass
+                else:
+                    target.put(item)
+                frame = None
+            count += 1
+    except KeyboardInterrupt:
+        print("Stopping...")
+    elapsed = time.perf_counter() - start
+    cap.release()
+
+    if ring is not None:
+        writer.close()
+    else:
+        for target in transports:
+            target.put(None)
+    for _ in workers:
+        index, processed, discarded, mean, stats = results.get()
+        line = f"Worker {index + 1}: {processed} frames analysed, mean {mean:.2f} C"
+        if ring is not None:
+            line += f", {discarded} discarded; reader {stats}"
+        print(line)
+    for worker in workers:
+        worker.join()
+
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Captured {count} frames in {elapsed:.2f} s ({rate:.1f} frames/s).")
+    if ring is not None:
+        print(f"Writer: {writer.stats()}")
+        ring.close()
+        ring.unlink()
+    else:
+        print(f"Pickled {pickled / 1e6:.1f} MB of frames through the queues.")
+    return rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Hand frames to analysis processes through shared memory."
+    )
+    parser.add_argument(
+        "--source", default="synthetic", help="frame source, as in frame_source.py"
+    )
+    parser.add_argument(
+        "--speed", default="fast", help="replay speed: realtime, fast or frames/s"
+    )
+    parser.add_argument("--frames", type=int, default=1000, help="frames to capture")
+    parser.add_argument("--workers", type=int, default=2, help="analysis processes")
+    parser.add_argument("--slots", type=int, default=8, help="frames in the ring")
+    parser.add_argument(
+        "--transport",
+        choices=("shm", "queue"),
+        default="shm",
+        help="shared memory ring, or pickled frames through queues to compare",
+    )
+    parser.add_argument("--points-file", help="points to estimate (default: 25 random)")
+    parser.add_argument("--min-temp", type=float, default=20.0)
+    parser.add_argument("--max-temp", type=float, default=45.0)
+    args = parser.parse_args(argv)
+    try:
+        args.speed = parse_speed(args.speed)
+    except ValueError as e:
+        parser.error(str(e))
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
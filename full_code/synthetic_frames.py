@@ -0,0 +1,248 @@
+import csv
+import math
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from palette import PaletteCache
+
+# Frame size and scale bar location of the FLIR E6390 stream.
+FRAME_WIDTH = 320
+FRAME_HEIGHT = 246
+SCALE_BOX = (306, 36, 315, 211)
+
+DEFAULT_PALETTE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "color_temp_map.csv"
+)
+
+# One generated frame: the BGR image, the noise-free temperature field it
+# shows (float32, one value per pixel) and the scale range it was rendered
+# with, i.e. the min/max temperature a user would read off the screen.
+SyntheticFrame = namedtuple("SyntheticFrame", "image field min_temp max_temp")
+
+
+def load_palette_colors(csv_path=DEFAULT_PALETTE):
+    """
+    Read the BGR colors of a color_temp_map.csv style palette, ordered from
+    the coldest to the hottest row. Only the colors are used: the generator
+    stretches them over whatever range each frame is rendered with.
+    """
+    with open(csv_path, "r", newline="") as f:
+        rows = [
+            (float(row["Temperature"]), [float(row[c]) for c in "BGR"])
+            for row in csv.DictReader(f)
+        ]
+    rows.sort(key=lambda row: row[0])
+    return np.array([bgr for _, bgr in rows], dtype=np.float64)
+
+
+class SyntheticFlirGenerator:
+    """
+    Produce FLIR-style frames with a known temperature field, for load and
+    accuracy tests without the camera. The scene is an ambient background
+    with a gentle gradient and a few gaussian hotspots moving along smooth
+    paths; each frame renders it through the palette colors and draws the
+    scale bar where extract_color_temp_map expects it, top row hottest.
+    Sensor noise (noise, in degrees) only affects the rendered image, not
+    the returned ground-truth field.
+
+    With auto_range the scale follows the scene like the camera's automatic
+    range: min/max are the field's extremes rounded outwards to range_step
+    degrees, so the scale bar (and so the palette) changes only when the
+    scene leaves the current range. Otherwise every frame uses the fixed
+    min_temp/max_temp and hotter or colder pixels saturate.
+
+    Frames depend only on seed, index and t, so any frame can be generated
+    again, in any order. Calling the generator returns just the image, as
+    SyntheticSource expects; generate() also returns the ground truth.
+    """
+
+    def __init__(
+        self,
+        width=FRAME_WIDTH,
+        height=FRAME_HEIGHT,
+        colors=None,
+        hotspots=3,
+        ambient=25.0,
+        hotspot_temp=15.0,
+        noise=0.2,
+        auto_range=True,
+        range_step=1.0,
+        min_temp=20.0,
+        max_temp=45.0,
+        seed=0,
+    ):
+        self.width = width
+        self.height = height
+        self.colors = load_palette_colors() if colors is None else np.asarray(colors)
+        self.noise = noise
+        self.auto_range = auto_range
+        self.range_step = range_step
+        self.min_temp = min_temp
+        self.max_temp = max_temp
+        self.seed = seed
+        # The scale bar keeps its place relative to the frame at other sizes.
+        x1, y1, x2, y2 = SCALE_BOX
+        self.scale_box = (
+            round(x1 * width / FRAME_WIDTH),
+            round(y1 * height / FRAME_HEIGHT),
+            round(x2 * width / FRAME_WIDTH),
+            round(y2 * height / FRAME_HEIGHT),
+        )
+
+        # The static part of the scene: ambient plus a vertical gradient.
+        self._y, self._x = np.mgrid[0:height, 0:width].astype(np.float32)
+        self._background = ambient + 2.0 * (self._y / height - 0.5)
+
+        # Every hotspot gets its own peak, size, path and pulse.
+        rng = np.random.default_rng(seed)
+        self._hotspots = [
+            {
+                "peak": hotspot_temp * rng.uniform(0.4, 1.0),
+                "radius": min(width, height) * rng.uniform(0.05, 0.15),
+                "speed": rng.uniform(0.02, 0.1, size=2),
+                "phase": rng.uniform(0, 2 * math.pi, size=3),
+                "pulse": rng.uniform(0.01, 0.05),
+            }
+            for _ in range(hotspots)
+        ]
+
+    def field(self, t):
+        """The noise-free temperature of every pixel at time t (seconds)."""
+        field = self._background.copy()
+        for spot in self._hotspots:
+            phase_x, phase_y, phase_pulse = spot["phase"]
+            center_x = self.width * (
+                0.5 + 0.4 * math.sin(2 * math.pi * spot["speed"][0] * t + phase_x)
+            )
+            center_y = self.height * (
+                0.5 + 0.4 * math.sin(2 * math.pi * spot["speed"][1] * t + phase_y)
+            )
+            peak = spot["peak"] * (
+                0.75 + 0.25 * math.sin(2 * math.pi * spot["pulse"] * t + phase_pulse)
+            )
+            distance = (self._x - center_x) ** 2 + (self._y - center_y) ** 2
+            field += peak * np.exp(distance / (-2 * spot["radius"] ** 2))
+        return field
+
+    def scale_range(self, field):
+        """The min/max temperature the scale shows for this field."""
+        if not self.auto_range:
+            return self.min_temp, self.max_temp
+        step = self.range_step
+        low = math.floor(float(field.min()) / step) * step
+        high = math.ceil(float(field.max()) / step) * step
+        if high <= low:
+            high = low + step
+        return low, high
+
+    def render(self, temps, min_temp, max_temp):
+        """BGR colors of temps on a scale from min_temp to max_temp."""
+        last = len(self.colors) - 1
+        rows = (temps - min_temp) * (last / (max_temp - min_temp))
+        rows = np.clip(np.rint(rows), 0, last).astype(np.intp)
+        return self.colors[rows]
+
+    def generate(self, index, t):
+        """Return the SyntheticFrame for frame number index at time t."""
+        rng = np.random.default_rng((self.seed, index))
+        field = self.field(t)
+        min_temp, max_temp = self.scale_range(field)
+
+        measured = field
+        if self.noise:
+            measured = field + rng.normal(0.0, self.noise, field.shape).astype(
+                np.float32
+            )
+        image = self.render(measured, min_temp, max_temp).astype(np.uint8)
+
+        # The scale bar: its top row shows max_temp and its bottom row
+        # min_temp, the layout TemperaturePalette.from_scale reads.
+        x1, y1, x2, y2 = self.scale_box
+        rows = y2 - y1
+        temps = max_temp - np.arange(rows) / max(rows - 1, 1) * (max_temp - min_temp)
+        image[y1:y2, x1:x2] = self.render(temps, min_temp, max_temp)[:, None]
+        # The range labels the camera prints next to the bar.
+        for text, y in ((f"{max_temp:.1f}", y1 - 4), (f"{min_temp:.1f}", y2 + 12)):
+            cv2.putText(
+                image,
+                text,
+                (max(x1 - 20, 0), y),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.35,
+                (255, 255, 255),
+                1,
+                cv2.LINE_AA,
+            )
+        return SyntheticFrame(image, field, min_temp, max_temp)
+
+    def __call__(self, index, t):
+        return self.generate(index, t).image
+
+
+def main():
+    # Measure generation speed and the error of the estimation path against
+    # the ground truth over a run of synthetic frames.
+    try:
+        frame_count = int(input("Enter the number of frames to generate: "))
+        point_count = int(input("Enter the number of points to sample per frame: "))
+        fps = float(input("Enter the simulated frame rate (frames/s): "))
+    except ValueError:
+        print("Invalid input. Please enter numeric values.")
+        return
+
+    generator = SyntheticFlirGenerator()
+    x1, y1, x2, y2 = generator.scale_box
+    # Points are matched with temperatures(), so palettes need no LUT.
+    cache = PaletteCache(use_lut=False, x1=x1, y1=y1, x2=x2, y2=y2)
+    # Sample points anywhere left of the scale bar and its labels.
+    rng = np.random.default_rng(1)
+    xs = rng.integers(0, x1 - 20, point_count)
+    ys = rng.integers(0, generator.height, point_count)
+
+    generate_time = 0.0
+    palette_time = 0.0
+    estimate_time = 0.0
+    exact_errors = []
+    for index in range(frame_count):
+        start = time.perf_counter()
+        frame = generator.generate(index, index / fps)
+        generate_time += time.perf_counter() - start
+
+        # The scale auto-ranges, so palette lookups and rebuilds are timed
+        # apart from the estimate itself.
+        start = time.perf_counter()
+        palette = cache.get(frame.image, frame.min_temp, frame.max_temp)
+        palette_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        pixels = frame.image[ys, xs]
+        exact = palette.temperatures(pixels)
+        estimate_time += time.perf_counter() - start
+        truth = frame.field[ys, xs]
+        exact_errors.append(np.abs(exact - truth))
+
+    exact_errors = np.concatenate(exact_errors)
+    print(
+        f"Generated {frame_count} frames at {frame_count / generate_time:.1f} frames/s."
+    )
+    print(
+        f"Estimated {point_count} points per frame at "
+        f"{frame_count / estimate_time:.1f} frames/s."
+    )
+    print(
+        f"Palettes: {1000 * palette_time / frame_count:.2f} ms per frame "
+        f"(cache: {cache.hits} hits, {cache.misses} misses)."
+    )
+    print(
+        f"Exact palette error: mean {exact_errors.mean():.3f} C, "
+        f"95th percentile {np.percentile(exact_errors, 95):.3f} C, "
+        f"max {exact_errors.max():.3f} C."
+    )
+
+
+if __name__ == "__main__":
+    main()
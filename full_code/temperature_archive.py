@@ -0,0 +1,306 @@
+import json
+import lzma
+import os
+import zlib
+
+import numpy as np
+
+# Fixed-point code reserved for missing (NaN) temperatures.
+MISSING_CODE = 0xFFFF
+
+# One index record per compressed chunk, with the fixed-point scale of the
+# session that wrote it: temp = temp_offset + temp_scale * code.
+CHUNK_DTYPE = np.dtype(
+    [
+        ("offset", "<u8"),
+        ("nbytes", "<u4"),
+        ("first_frame", "<u4"),
+        ("frames", "<u4"),
+        ("delta", "u1"),
+        ("temp_offset", "<f8"),
+        ("temp_scale", "<f8"),
+    ]
+)
+# Archives of format version 1 had one scale, in meta.json, for all chunks.
+V1_CHUNK_DTYPE = np.dtype(
+    [
+        ("offset", "<u8"),
+        ("nbytes", "<u4"),
+        ("first_frame", "<u4"),
+        ("frames", "<u4"),
+        ("delta", "u1"),
+    ]
+)
+FORMAT_VERSION = 2
+
+META_FILE = "meta.json"
+CHUNKS_FILE = "chunks.bin"
+INDEX_FILE = "index.bin"
+TIMESTAMPS_FILE = "timestamps.bin"
+
+CODECS = ("zlib", "lzma")
+
+
+def shape_archive_dir(archive_dir, shape):
+    """The archive beside archive_dir for maps of another shape: archive_dir_WxH."""
+    height, width = shape[:2]
+    return f"{os.path.normpath(archive_dir)}_{width}x{height}"
+
+
+def _compress(codec, level, data):
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    return lzma.compress(data, preset=level)
+
+
+def _decompress(codec, data):
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return lzma.decompress(data)
+
+
+def encode_chunk(codes, codec="zlib", level=6):
+    """
+    Compress a (frames, H, W) uint16 block and return (data, delta).
+    With delta the first frame is kept as is and every later frame as its
+    wrapping difference from the previous one, so a scene that barely
+    changes becomes mostly zeros. A moving camera changes most pixels
+    between samples and the differences compress worse than the values, so
+    delta encoding is only used when at least half the differences are zero.
+    The low and high bytes are then stored as separate planes, which
+    zlib/lzma squeeze much better than interleaved 16-bit values.
+    """
+    deltas = codes.copy()
+    deltas[1:] -= codes[:-1]
+    delta = np.count_nonzero(deltas[1:]) * 2 <= deltas[1:].size
+    values = deltas if delta else codes
+    planes = np.ascontiguousarray(values).view(np.uint8).reshape(-1, 2).T
+    return _compress(codec, level, np.ascontiguousarray(planes).tobytes()), delta
+
+
+def decode_chunk(data, frames, frame_shape, codec="zlib", delta=True):
+    """Inverse of encode_chunk: return the (frames, H, W) uint16 codes."""
+    planes = np.frombuffer(_decompress(codec, data), dtype=np.uint8).reshape(2, -1)
+    values = np.ascontiguousarray(planes.T).view(np.uint16)
+    values = values.reshape((frames,) + tuple(frame_shape))
+    if not delta:
+        return values
+    # uint16 arithmetic wraps around exactly as the encoder's subtraction did.
+    return np.cumsum(values, axis=0, dtype=np.uint16)
+
+
+class TemperatureArchiveWriter:
+    """
+    Append temperature maps to a compact archive. Temperatures are stored as
+    uint16 fixed-point codes, temp = offset + scale * code, with offset and
+    scale fixed for the session from the scale bar range (a resolution of
+    (max_temp - min_temp) / 65534 degrees). Every chunk_frames maps are
+    delta-encoded and compressed together (see encode_chunk). Each chunk
+    records its session's offset and scale, so sessions with different
+    ranges can append to the same archive. Maps of another shape than an
+    existing archive's go to an archive of their own beside it (see
+    shape_archive_dir); archive_dir names the archive in use.
+    Maps still buffered when the program dies are lost, so close() the
+    writer at the end of the session.
+    """
+
+    def __init__(
+        self, archive_dir, min_temp, max_temp, chunk_frames=32, codec="zlib", level=6
+    ):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        self.chunk_frames = chunk_frames
+        self.level = level
+        self.offset = float(min_temp)
+        self.scale = (float(max_temp) - float(min_temp)) / (MISSING_CODE - 1)
+        self._codec = codec
+        self._open(archive_dir, codec)
+
+    def _open(self, archive_dir, codec):
+        self.archive_dir = archive_dir
+        self.codec = codec
+        self.frame_shape = None
+        self._count = 0
+        self._appended = 0
+        self._pending = []
+        self._pending_timestamps = []
+
+        if os.path.isfile(os.path.join(archive_dir, META_FILE)):
+            with open(os.path.join(archive_dir, META_FILE), "r") as f:
+                meta = json.load(f)
+            if meta.get("version", 1) != FORMAT_VERSION:
+                raise ValueError(
+                    f"Archive '{archive_dir}' has an older format; "
+                    "archive to a new directory."
+                )
+            self.frame_shape = tuple(meta["shape"])
+            self.codec = meta["codec"]
+            index = np.fromfile(self._path(INDEX_FILE), dtype=CHUNK_DTYPE)
+            if len(index):
+                self._count = int(index[-1]["first_frame"] + index[-1]["frames"])
+        else:
+            os.makedirs(archive_dir, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.archive_dir, name)
+
+    def __len__(self):
+        return self._count + len(self._pending)
+
+    def append(self, temp_map, timestamp):
+        """Add one temperature map (NaN for unknown pixels); return its frame number."""
+        if self.frame_shape is None:
+            self.frame_shape = temp_map.shape
+            with open(self._path(META_FILE), "w") as f:
+                json.dump(
+                    {
+                        "version": FORMAT_VERSION,
+                        "shape": list(temp_map.shape),
+                        "codec": self.codec,
+                    },
+                    f,
+                )
+        elif temp_map.shape != self.frame_shape and not self._appended:
+            # Archived by an earlier session; start or continue the archive
+            # for this shape instead.
+            self._open(shape_archive_dir(self.archive_dir, temp_map.shape), self._codec)
+            return self.append(temp_map, timestamp)
+        elif temp_map.shape != self.frame_shape:
+            raise ValueError(
+                f"Map shape {temp_map.shape} does not match the archive's {self.frame_shape}"
+            )
+
+        codes = np.rint((temp_map - self.offset) / self.scale)
+        codes = np.clip(codes, 0, MISSING_CODE - 1)
+        codes[np.isnan(temp_map)] = MISSING_CODE
+        self._pending.append(codes.astype(np.uint16))
+        self._pending_timestamps.append(timestamp)
+        self._appended += 1
+        if len(self._pending) == self.chunk_frames:
+            self.flush()
+        return len(self) - 1
+
+    def flush(self):
+        """Compress and write the buffered maps as one chunk."""
+        if not self._pending:
+            return
+        data, delta = encode_chunk(np.stack(self._pending), self.codec, self.level)
+        with open(self._path(CHUNKS_FILE), "ab") as chunks:
+            offset = chunks.tell()
+            chunks.write(data)
+        with open(self._path(TIMESTAMPS_FILE), "ab") as timestamps:
+            timestamps.write(np.array(self._pending_timestamps, dtype="<f8").tobytes())
+        # The index record goes last: a chunk is only visible once complete.
+        record = np.array(
+            [
+                (
+                    offset,
+                    len(data),
+                    self._count,
+                    len(self._pending),
+                    delta,
+                    self.offset,
+                    self.scale,
+                )
+            ],
+            dtype=CHUNK_DTYPE,
+        )
+        with open(self._path(INDEX_FILE), "ab") as index:
+            index.write(record.tobytes())
+        self._count += len(self._pending)
+        self._pending = []
+        self._pending_timestamps = []
+
+    def close(self):
+        self.flush()
+
+
+class TemperatureArchive:
+    """
+    Read temperature maps back from an archive without any palette matching.
+    Reading a frame decompresses only its chunk; the last decoded chunk is
+    kept, so walking through frames in order decodes each chunk once.
+    """
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        with open(os.path.join(archive_dir, META_FILE), "r") as f:
+            meta = json.load(f)
+        self.frame_shape = tuple(meta["shape"])
+        self.codec = meta["codec"]
+        version = meta.get("version", 1)
+        chunks_path = os.path.join(archive_dir, CHUNKS_FILE)
+        if os.path.exists(chunks_path) and os.path.getsize(chunks_path):
+            self._chunks = np.memmap(chunks_path, dtype=np.uint8, mode="r")
+        else:
+            self._chunks = np.zeros(0, dtype=np.uint8)
+        index = np.fromfile(
+            os.path.join(archive_dir, INDEX_FILE),
+            dtype=CHUNK_DTYPE if version >= 2 else V1_CHUNK_DTYPE,
+        )
+        if version < 2:
+            # Give the old records the archive-wide scale.
+            self.index = np.zeros(len(index), dtype=CHUNK_DTYPE)
+            for name in V1_CHUNK_DTYPE.names:
+                self.index[name] = index[name]
+            self.index["temp_offset"] = meta["offset"]
+            self.index["temp_scale"] = meta["scale"]
+        else:
+            self.index = index
+        frames = (
+            int(self.index[-1]["first_frame"] + self.index[-1]["frames"])
+            if len(self.index)
+            else 0
+        )
+        self.timestamps = np.fromfile(
+            os.path.join(archive_dir, TIMESTAMPS_FILE), dtype="<f8"
+        )[:frames]
+        self._cached_chunk = None
+        self._cached_codes = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _chunk(self, frame_number):
+        if not 0 <= frame_number < len(self):
+            raise IndexError(f"Frame {frame_number} is not in the archive")
+        return (
+            int(np.searchsorted(self.index["first_frame"], frame_number, side="right"))
+            - 1
+        )
+
+    def scale(self, frame_number):
+        """The (offset, scale) of one frame's fixed-point codes."""
+        record = self.index[self._chunk(frame_number)]
+        return float(record["temp_offset"]), float(record["temp_scale"])
+
+    def codes(self, frame_number):
+        """The uint16 fixed-point codes of one frame."""
+        chunk = self._chunk(frame_number)
+        if chunk != self._cached_chunk:
+            record = self.index[chunk]
+            start = int(record["offset"])
+            data = self._chunks[start : start + int(record["nbytes"])].tobytes()
+            self._cached_codes = decode_chunk(
+                data,
+                int(record["frames"]),
+                self.frame_shape,
+                self.codec,
+                bool(record["delta"]),
+            )
+            self._cached_chunk = chunk
+        return self._cached_codes[frame_number - int(self.index[chunk]["first_frame"])]
+
+    def frame(self, frame_number):
+        """One temperature map as float32 degrees, NaN where it was unknown."""
+        codes = self.codes(frame_number)
+        offset, scale = self.scale(frame_number)
+        temps = (offset + scale * codes).astype(np.float32)
+        temps[codes == MISSING_CODE] = np.nan
+        return temps
+
+    def frame_number_at(self, timestamp):
+        """Number of the last frame taken at or before timestamp (or the first frame)."""
+        return max(
+            int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1, 0
+        )
@@ -0,0 +1,156 @@
+import csv
+import json
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b"TLOG"
+# The header is padded so the records start at a fixed, aligned offset.
+HEADER_SIZE = 4096
+
+
+def record_dtype(columns):
+    """
+    One fixed-width record: capture timestamp, frame number, a flag telling
+    whether the scale bar could be read, and one float32 per column, NaN
+    where the value could not be estimated.
+    """
+    return np.dtype(
+        [
+            ("timestamp", "<f8"),
+            ("frame", "<i8"),
+            ("estimated", "u1"),
+            ("values", "<f4", (len(columns),)),
+        ]
+    )
+
+
+class TemperatureLogWriter:
+    """
+    Append-only binary temperature log. The file starts with a header
+    holding the column names; each sample is then one fixed-width record,
+    so the whole log can be memory-mapped as a structured array.
+    Appending to an existing log requires the same columns; with overwrite
+    an existing log is replaced instead.
+    """
+
+    def __init__(self, log_path, columns, overwrite=False):
+        self.log_path = log_path
+        self.columns = list(columns)
+        self.dtype = record_dtype(self.columns)
+
+        if not overwrite and os.path.exists(log_path) and os.path.getsize(log_path):
+            existing = read_header(log_path)
+            if existing != self.columns:
+                raise ValueError(f"Log '{log_path}' has different columns.")
+            # Drop a record cut short by a crash so new records stay aligned.
+            records = (os.path.getsize(log_path) - HEADER_SIZE) // self.dtype.itemsize
+            with open(log_path, "r+b") as f:
+                f.truncate(HEADER_SIZE + records * self.dtype.itemsize)
+        else:
+            header = json.dumps({"columns": self.columns}).encode("utf-8")
+            if len(header) + 8 > HEADER_SIZE:
+                raise ValueError(
+                    "Too many or too long column names for the log header."
+                )
+            with open(log_path, "wb") as f:
+                f.write(MAGIC + struct.pack("<I", len(header)) + header)
+                f.write(b"\0" * (HEADER_SIZE - 8 - len(header)))
+        self._file = open(log_path, "ab")
+        self._record = np.zeros(1, dtype=self.dtype)
+
+    def append(self, timestamp, frame, values):
+        """Append one sample; values is None when nothing could be estimated."""
+        record = self._record[0]
+        record["timestamp"] = timestamp
+        record["frame"] = frame
+        if values is None:
+            record["estimated"] = 0
+            record["values"] = np.nan
+        else:
+            record["estimated"] = 1
+            record["values"] = values
+        self._file.write(self._record.tobytes())
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_header(log_path):
+    """Return the column names stored in a log's header."""
+    with open(log_path, "rb") as f:
+        start = f.read(8)
+        if start[:4] != MAGIC:
+            raise ValueError(f"'{log_path}' is not a temperature log.")
+        (length,) = struct.unpack("<I", start[4:])
+        return json.loads(f.read(length).decode("utf-8"))["columns"]
+
+
+def read_log(log_path):
+    """
+    Memory-map a temperature log. Returns (columns, records), where records
+    is a read-only structured array with the fields of record_dtype; e.g.
+    records["values"][:, i] is the time series of columns[i].
+    """
+    columns = read_header(log_path)
+    dtype = record_dtype(columns)
+    count = (os.path.getsize(log_path) - HEADER_SIZE) // dtype.itemsize
+    if count == 0:
+        return columns, np.zeros(0, dtype=dtype)
+    records = np.memmap(
+        log_path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,)
+    )
+    return columns, records
+
+
+def export_csv(log_path, csv_filename, batch_size=10000):
+    """
+    Write a log out in the photo_temperature_data.csv layout: frame number,
+    timestamp, then one column per value with "Error" for failed values and
+    "N/A" across rows where the scale bar could not be read.
+    """
+    columns, records = read_log(log_path)
+    # Rows are formatted with one %-format per row rather than through
+    # csv.writer, which is many times faster for wide logs; numbers and
+    # timestamps never need quoting.
+    row_format = "%d,%s" + ",%.2f" * len(columns) + "\r\n"
+    missing_row = "%d,%s" + ",N/A" * len(columns) + "\r\n"
+    with open(csv_filename, "w", newline="") as csvfile:
+        csv.writer(csvfile).writerow(["Frame", "Timestamp"] + columns)
+        for start in range(0, len(records), batch_size):
+            batch = records[start : start + batch_size]
+            lines = []
+            for timestamp, frame, estimated, values in zip(
+                batch["timestamp"].tolist(),
+                batch["frame"].tolist(),
+                batch["estimated"].tolist(),
+                batch["values"].tolist(),
+            ):
+                timestamp_str = datetime.fromtimestamp(timestamp).strftime(
+                    "%Y-%m-%d %H:%M:%S"
+                )
+                if estimated:
+                    line = row_format % (frame, timestamp_str, *values)
+                    lines.append(line.replace("nan", "Error"))
+                else:
+                    lines.append(missing_row % (frame, timestamp_str))
+            csvfile.write("".join(lines))
+    return len(records)
+
+
+def main():
+    # Convert a binary temperature log to CSV on demand.
+    log_path = input("Enter the filename or path of the temperature log: ").strip()
+    if not os.path.exists(log_path):
+        print(f"Error: File '{log_path}' not found.")
+        return
+    csv_filename = os.path.splitext(log_path)[0] + ".csv"
+    count = export_csv(log_path, csv_filename)
+    print(f"Exported {count} samples to '{csv_filename}'.")
+
+
+if __name__ == "__main__":
+    main()
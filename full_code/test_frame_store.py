@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from frame_store import FrameStore, FrameStoreWriter
+
+
+def frames(count, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(count)]
+
+
+def test_frames_round_trip(tmp_path):
+    store_dir = str(tmp_path / "frames")
+    stored = frames(10, (4, 6, 3))
+    # Small chunks, so the frames span several chunk files.
+    writer = FrameStoreWriter(store_dir, chunk_frames=4)
+    for i, frame in enumerate(stored[:6]):
+        assert writer.append(frame, 100.0 + i) == i
+    writer.close()
+    # A second session continues after the last frame.
+    writer = FrameStoreWriter(store_dir)
+    for i, frame in enumerate(stored[6:], start=6):
+        assert writer.append(frame, 100.0 + i) == i
+    writer.close()
+
+    store = FrameStore(store_dir)
+    assert len(store) == len(stored)
+    assert store.timestamps.tolist() == [100.0 + i for i in range(len(stored))]
+    for i, frame in enumerate(stored):
+        assert (store.frame(i) == frame).all()
+    assert (store.frame_at(105.5) == stored[5]).all()
+    assert store.frame_numbers_between(102.0, 104.0) == range(2, 4)
+
+
+def test_other_shape_gets_its_own_store(tmp_path):
+    store_dir = str(tmp_path / "frames")
+    small, large = frames(3, (4, 6, 3)), frames(2, (8, 10, 3), seed=1)
+
+    writer = FrameStoreWriter(store_dir)
+    for i, frame in enumerate(small):
+        writer.append(frame, float(i))
+    writer.close()
+
+    # A later session with another frame size continues beside it.
+    writer = FrameStoreWriter(store_dir)
+    for i, frame in enumerate(large):
+        writer.append(frame, 10.0 + i)
+    writer.close()
+    assert writer.store_dir == str(tmp_path / "frames_10x8")
+
+    assert len(FrameStore(store_dir)) == 3
+    store = FrameStore(writer.store_dir)
+    assert len(store) == 2
+    assert all((store.frame(i) == frame).all() for i, frame in enumerate(large))
+
+    # Within one session the shape stays fixed.
+    writer = FrameStoreWriter(store_dir)
+    writer.append(small[0], 20.0)
+    with pytest.raises(ValueError):
+        writer.append(large[0], 21.0)
+    writer.close()
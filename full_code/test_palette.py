@@ -0,0 +1,119 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from benchmark import distinct_colors, resample_palette
+from image_writer import read_image
+from palette import (
+    TemperaturePalette,
+    build_temperature_lut,
+    estimate_temperature,
+    extract_color_temp_map,
+    lookup_temperature,
+    pack_bgr,
+)
+
+PHOTOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "photos")
+# Every tenth bundled photo keeps the exact searches to a few seconds.
+PHOTO_PATHS = sorted(
+    os.path.join(PHOTOS_DIR, name)
+    for name in os.listdir(PHOTOS_DIR)
+    if name.lower().endswith(".png")
+)[::10]
+
+
+@pytest.fixture(scope="module", params=PHOTO_PATHS, ids=os.path.basename)
+def photo(request):
+    image = read_image(request.param)
+    return image, extract_color_temp_map(image, 20, 40)
+
+
+def test_lut_matches_exact(photo):
+    image, palette = photo
+    exact = palette.temperatures(image)
+    lut_palette = TemperaturePalette(palette.temps, palette.colors)
+    # Empty, filled by the first lookup, then read back.
+    assert (lut_palette.lookup(image) == exact).all()
+    assert (lut_palette.lookup(image) == exact).all()
+    # Partly filled: another photo's colors under the same scale.
+    other = read_image(PHOTO_PATHS[-1])
+    assert (lut_palette.lookup(other) == palette.temperatures(other)).all()
+
+
+def test_exact_path_matches_temperature_at(photo):
+    image, palette = photo
+    exact = palette.temperatures(image)
+    rng = np.random.default_rng(0)
+    for y, x in zip(rng.integers(0, image.shape[0], 200), rng.integers(0, 300, 200)):
+        assert exact[y, x] == palette.temperature_at(image, x, y)
+
+
+def test_lut_resolves_colors_between_rows():
+    image = read_image(PHOTO_PATHS[0])
+    palette = extract_color_temp_map(image, 20, 40)
+    lut_palette = TemperaturePalette(palette.temps, palette.colors)
+    pixel = np.array([[[0, 20, 110]]], dtype=np.uint8)
+    expected = estimate_temperature(pixel, palette, 0, 0)
+    assert lut_palette.lookup(pixel)[0, 0] == expected
+    assert lookup_temperature(pixel, lut_palette, 0, 0) == expected
+
+
+def test_dense_lut_within_its_error_bound():
+    image = read_image(PHOTO_PATHS[0])
+    palette = extract_color_temp_map(image, 20, 40)
+    lut, max_error = build_temperature_lut(palette, 32)
+    assert not np.isnan(lut).any()
+    errors = np.abs(lut[pack_bgr(image, 32)] - palette.temperatures(image))
+    assert errors.max() <= max_error + 1e-4
+
+
+def baseline_nearest_row(palette, bgr):
+    """The original per-row loop of estimate_temperature, returning the row."""
+    b, g, r = (int(c) for c in bgr)
+    target = (r / 255.0, g / 255.0, b / 255.0)
+    min_distance, nearest = float("inf"), None
+    for row, (_, (cb, cg, cr)) in enumerate(palette):
+        row_rgb = (cr / 255.0, cg / 255.0, cb / 255.0)
+        distance = np.sqrt(
+            (target[0] - row_rgb[0]) ** 2
+            + (target[1] - row_rgb[1]) ** 2
+            + (target[2] - row_rgb[2]) ** 2
+        )
+        if distance < min_distance:
+            min_distance, nearest = distance, row
+    return nearest
+
+
+@pytest.mark.parametrize("rows", [175, 2800])
+def test_index_matches_baseline_loop(photo, rows):
+    image, palette = photo
+    palette = resample_palette(palette, rows)
+    rng = np.random.default_rng(0)
+    pixels = np.concatenate(
+        [
+            distinct_colors(image, 150),
+            rng.integers(0, 256, (50, 3)).astype(np.uint8),
+        ]
+    )
+    expected = [baseline_nearest_row(palette, bgr) for bgr in pixels]
+    assert palette.index.query_rows(pixels).tolist() == expected
+
+
+def test_index_scales_logarithmically_with_rows():
+    image = read_image(PHOTO_PATHS[0])
+    palette = extract_color_temp_map(image, 20, 40)
+    colors = distinct_colors(image, 5000)
+
+    def per_color(rows):
+        index = resample_palette(palette, rows).index
+        runs = []
+        for _ in range(3):
+            start = time.perf_counter()
+            index.query_rows(colors)
+            runs.append(time.perf_counter() - start)
+        return min(runs)
+
+    # 64 times the rows; a per-row scan would be about 64 times slower.
+    assert per_color(11200) < 8 * per_color(175)
@@ -0,0 +1,54 @@
+import queue
+import time
+
+import numpy as np
+
+from frame_source import FAST, SyntheticSource
+from pipeline import CaptureThread, StageThread
+
+
+def test_stage_passes_every_result_downstream():
+    inbox = queue.Queue()
+    count = 50
+    for item in range(count):
+        inbox.put(item)
+    inbox.put(None)
+    stage = StageThread("processing", lambda item: item * 2, inbox, outbox_size=2)
+
+    received = []
+
+    def record(result):
+        # A slow consumer keeps the small outbox full.
+        time.sleep(0.001)
+        received.append(result)
+
+    sink = StageThread("sink", record, stage.outbox)
+    stage.start()
+    sink.start()
+    stage.join(timeout=10)
+    sink.join(timeout=10)
+    assert not sink.is_alive()
+    assert received == [item * 2 for item in range(count)]
+
+
+def test_recorded_source_samples_are_all_processed():
+    count = 30
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    source = SyntheticSource(lambda index, t: frame, count=count, speed=FAST)
+    capture = CaptureThread(source, 0.0, sample_size=2, display=False)
+
+    def process(sample):
+        # Slower than capture, so the samples queue stays full.
+        time.sleep(0.002)
+        return sample[0]
+
+    processing = StageThread("processing", process, capture.samples, outbox_size=2)
+    received = []
+    sink = StageThread("sink", received.append, processing.outbox)
+    for thread in (capture, processing, sink):
+        thread.start()
+    for thread in (capture, processing, sink):
+        thread.join(timeout=10)
+    assert not sink.is_alive()
+    assert capture.samples_taken == count
+    assert received == list(range(count))
@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+
+from image_writer import read_image
+from palette import PaletteCache, estimate_temperature
+from points import PointSampler
+
+PHOTOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "photos")
+
+
+def test_sampler_matches_estimate_temperature():
+    paths = sorted(
+        os.path.join(PHOTOS_DIR, name)
+        for name in os.listdir(PHOTOS_DIR)
+        if name.lower().endswith(".png")
+    )
+    rng = np.random.default_rng(0)
+    points = [
+        (int(x), int(y), f"Point {i + 1}")
+        for i, (x, y) in enumerate(
+            zip(rng.integers(0, 300, 50), rng.integers(0, 246, 50))
+        )
+    ]
+    # One point outside the frame reads NaN.
+    points.append((400, 10, "Outside"))
+    sampler = PointSampler(points)
+    cache = PaletteCache()
+    for path in paths:
+        frame = read_image(path)
+        palette = cache.get(frame, 20, 40)
+        temps = sampler.sample(frame, palette)
+        expected = [
+            estimate_temperature(frame, palette, x, y) for x, y, _ in points[:-1]
+        ]
+        assert temps[:-1].tolist() == np.float32(expected).tolist()
+        assert np.isnan(temps[-1])
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+
+from image_writer import read_image
+from palette import PaletteCache, temperature_map
+from regions import RegionStats
+
+PHOTOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "photos")
+
+REGIONS = [
+    ("rect", [(10, 10), (60, 50)], "Rect"),
+    ("rect", [(250, 200), (400, 300)], "Clipped"),
+    ("rect", [(500, 10), (520, 20)], "Outside"),
+    ("poly", [(100, 120), (180, 130), (140, 200)], "Poly"),
+]
+
+
+def test_bounded_map_gives_the_same_stats():
+    paths = sorted(
+        os.path.join(PHOTOS_DIR, name)
+        for name in os.listdir(PHOTOS_DIR)
+        if name.lower().endswith(".png")
+    )[::10]
+    regions = RegionStats(REGIONS)
+    cache = PaletteCache()
+    for path in paths:
+        frame = read_image(path)
+        palette = cache.get(frame, 20, 40)
+        box = regions.bounds(frame.shape[:2])
+        assert box == (10, 10, 320, 246)
+        full = regions.compute(temperature_map(frame, palette))
+        bounded = regions.compute(temperature_map(frame, palette, box))
+        np.testing.assert_allclose(bounded, full, rtol=1e-6)
+        assert np.isnan(bounded[2]).all()
+
+
+def test_no_region_inside_the_frame():
+    regions = RegionStats([("rect", [(500, 10), (520, 20)], "Outside")])
+    assert regions.bounds((246, 320)) == (0, 0, 0, 0)
+    temp_map = np.full((246, 320), np.nan, dtype=np.float32)
+    assert np.isnan(regions.compute(temp_map)).all()
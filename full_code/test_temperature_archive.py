@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from temperature_archive import TemperatureArchive, TemperatureArchiveWriter
+
+
+def maps(count, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.uniform(20.0, 40.0, shape).astype(np.float32) for _ in range(count)]
+
+
+def test_maps_round_trip(tmp_path):
+    archive_dir = str(tmp_path / "temperature_maps")
+    stored = maps(10, (4, 6))
+    stored[3][1, 2] = np.nan
+    # A still scene, so some chunks are delta-encoded.
+    stored[7] = stored[8] = stored[9] = stored[6]
+    writer = TemperatureArchiveWriter(archive_dir, 20, 40, chunk_frames=4)
+    for i, temp_map in enumerate(stored[:6]):
+        assert writer.append(temp_map, 100.0 + i) == i
+    writer.close()
+    # A second session with another scale range appends to the same archive.
+    writer = TemperatureArchiveWriter(archive_dir, 10, 50, chunk_frames=4)
+    for i, temp_map in enumerate(stored[6:], start=6):
+        assert writer.append(temp_map, 100.0 + i) == i
+    writer.close()
+
+    archive = TemperatureArchive(archive_dir)
+    assert len(archive) == len(stored)
+    assert archive.timestamps.tolist() == [100.0 + i for i in range(len(stored))]
+    for i, temp_map in enumerate(stored):
+        _, scale = archive.scale(i)
+        np.testing.assert_allclose(archive.frame(i), temp_map, atol=scale)
+    assert np.isnan(archive.frame(3)[1, 2])
+
+
+def test_other_shape_gets_its_own_archive(tmp_path):
+    archive_dir = str(tmp_path / "temperature_maps")
+    small, large = maps(3, (4, 6)), maps(2, (8, 10), seed=1)
+
+    writer = TemperatureArchiveWriter(archive_dir, 20, 40)
+    for i, temp_map in enumerate(small):
+        writer.append(temp_map, float(i))
+    writer.close()
+
+    # A later session with another frame size continues beside it.
+    writer = TemperatureArchiveWriter(archive_dir, 20, 40)
+    for i, temp_map in enumerate(large):
+        writer.append(temp_map, 10.0 + i)
+    writer.close()
+    assert writer.archive_dir == str(tmp_path / "temperature_maps_10x8")
+
+    assert len(TemperatureArchive(archive_dir)) == 3
+    archive = TemperatureArchive(writer.archive_dir)
+    assert len(archive) == 2
+    for i, temp_map in enumerate(large):
+        np.testing.assert_allclose(archive.frame(i), temp_map, atol=1e-3)
+
+    # Within one session the shape stays fixed.
+    writer = TemperatureArchiveWriter(archive_dir, 20, 40)
+    writer.append(small[0], 20.0)
+    with pytest.raises(ValueError):
+        writer.append(large[0], 21.0)
@@ -0,0 +1,42 @@
+import csv
+
+import numpy as np
+
+from temperature_log import TemperatureLogWriter, export_csv, read_log
+
+COLUMNS = ["Point 1", "Point 2", "Point 3"]
+
+
+def test_log_round_trip(tmp_path):
+    log_path = str(tmp_path / "temperature_data.bin")
+    samples = [
+        (100.0, 0, [21.5, 22.25, 30.0]),
+        (101.0, 1, None),
+        (102.0, 2, [21.75, np.nan, 30.5]),
+    ]
+    log = TemperatureLogWriter(log_path, COLUMNS)
+    for sample in samples[:2]:
+        log.append(*sample)
+    log.close()
+    # A later session appends to the same log.
+    log = TemperatureLogWriter(log_path, COLUMNS)
+    log.append(*samples[2])
+    log.close()
+
+    columns, records = read_log(log_path)
+    assert columns == COLUMNS
+    assert records["timestamp"].tolist() == [100.0, 101.0, 102.0]
+    assert records["frame"].tolist() == [0, 1, 2]
+    assert records["estimated"].tolist() == [1, 0, 1]
+    np.testing.assert_array_equal(records["values"][0], samples[0][2])
+    assert np.isnan(records["values"][1]).all()
+    np.testing.assert_array_equal(records["values"][2], samples[2][2])
+
+    csv_path = str(tmp_path / "temperature_data.csv")
+    assert export_csv(log_path, csv_path) == 3
+    with open(csv_path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Frame", "Timestamp"] + COLUMNS
+    assert rows[1][2:] == ["21.50", "22.25", "30.00"]
+    assert rows[2][2:] == ["N/A"] * 3
+    assert rows[3][2:] == ["21.75", "Error", "30.50"]
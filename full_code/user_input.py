@@ -1,220 +1,427 @@
+import argparse
 import cv2
+import json
 import numpy as np
-import csv
 import os
+import queue
 import time
 from datetime import datetime
 
+from frame_source import open_source, parse_speed
+from frame_store import FrameStoreWriter
+from image_writer import ImageWriter
+import latency
+from metrics import MetricsServer, register_pipeline
+from palette import PaletteCache, temperature_map
+from pipeline import CaptureThread, StageThread, stop_pipeline, wait_for_stop
+from points import (
+    PointSampler,
+    load_points,
+    summarize_temperatures,
+)
+from regions import RegionStats, load_regions
+from temperature_archive import TemperatureArchiveWriter
+from temperature_log import TemperatureLogWriter, export_csv
 
-def bgr_to_rgb(color):
-    """Convert a BGR tuple to normalized RGB tuple."""
-    b, g, r = color
-    return (r / 255.0, g / 255.0, b / 255.0)
 
-
-def extract_color_temp_map(image, min_temp, max_temp, x1=306, y1=36, x2=315, y2=211):
-    """
-    Extract the color-to-temperature mapping from the scale bar region.
-    Coordinates (x1, y1) to (x2, y2) should cover the vertical temperature scale.
-    """
-    # Ensure the crop coordinates are within the image bounds.
-    height, width, _ = image.shape
-    if x1 < 0 or x2 > width or y1 < 0 or y2 > height:
-        raise ValueError("Scale bar coordinates are out of image bounds.")
-
-    cropped_scale = image[y1:y2, x1:x2]
-    scale_height, scale_width, _ = cropped_scale.shape
-    color_temp_map = []
-
-    for row_index in range(scale_height):
-        row_pixels = cropped_scale[row_index, :, :]
-        # Average over the width for this row.
-        avg_bgr = np.mean(row_pixels, axis=0).tolist()
-        fraction = row_index / (scale_height - 1) if scale_height > 1 else 0
-        # Interpolate temperature from top (max_temp) to bottom (min_temp)
-        row_temp = max_temp - fraction * (max_temp - min_temp)
-        color_temp_map.append((row_temp, avg_bgr))
-
-    # Sort the mapping by temperature (ascending order)
-    color_temp_map.sort(key=lambda x: x[0])
-    return color_temp_map
-
-
-def estimate_temperature(image, color_temp_map, x_target, y_target):
+def parse_settings(argv=None):
     """
-    Estimate the temperature at the specified (x, y) point.
-    Compares the target pixel's normalized RGB to each row's color in the scale.
+    Read session settings from the command line, e.g.
+        python user_input.py --headless --config session.json --duration 3600
+    A JSON config file may hold any of the settings by their long option
+    name (min_temp, max_temp, points_file, interval, camera_index, source,
+    speed, duration, max_frames, latency_histograms, latency_interval, metrics_port);
+    options given on the command line win.
+    To run without the camera, e.g. for benchmarks, set source to a video
+    file, a directory of photos or a frame store, or "synthetic" and speed
+    to "realtime", "fast" or a number of frames per second.
     """
-    height, width, _ = image.shape
-    if not (0 <= x_target < width and 0 <= y_target < height):
-        raise ValueError("Target coordinates are out of image bounds.")
-
-    target_color = image[y_target, x_target, :]
-    target_rgb = bgr_to_rgb(target_color)
-
-    min_distance = float("inf")
-    estimated_temp = None
-    for temp, bgr in color_temp_map:
-        row_rgb = bgr_to_rgb(bgr)
-        # Euclidean distance in RGB space.
-        distance = np.sqrt(
-            (target_rgb[0] - row_rgb[0]) ** 2
-            + (target_rgb[1] - row_rgb[1]) ** 2
-            + (target_rgb[2] - row_rgb[2]) ** 2
-        )
-        if distance < min_distance:
-            min_distance = distance
-            estimated_temp = temp
-    return estimated_temp
+    parser = argparse.ArgumentParser(description="Log FLIR point temperatures.")
+    parser.add_argument("--config", help="JSON file with settings")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="no window, overlay or prompts; stop with Ctrl+C/SIGTERM or a limit",
+    )
+    parser.add_argument("--min-temp", dest="min_temp", type=float)
+    parser.add_argument("--max-temp", dest="max_temp", type=float)
+    parser.add_argument("--points", dest="points_file")
+    parser.add_argument("--interval", type=float, help="seconds between samples")
+    parser.add_argument("--camera", dest="camera_index", type=int)
+    parser.add_argument(
+        "--source", help="video file, photo directory, frame store or 'synthetic'"
+    )
+    parser.add_argument(
+        "--speed", help="replay speed: 'realtime', 'fast' or frames per second"
+    )
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument(
+        "--frames", dest="max_frames", type=int, help="stop after this many frames"
+    )
+    parser.add_argument(
+        "--latency",
+        dest="latency_histograms",
+        action="store_true",
+        default=None,
+        help="measure per-stage latency histograms",
+    )
+    parser.add_argument(
+        "--latency-interval",
+        dest="latency_interval",
+        type=float,
+        help="seconds between latency reports",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        dest="metrics_port",
+        type=int,
+        help="serve Prometheus metrics on this local port",
+    )
+    args = parser.parse_args(argv)
+
+    settings = {
+        "min_temp": None,
+        "max_temp": None,
+        "points_file": None,
+        "interval": 2.0,  # seconds between captures.
+        "camera_index": 1,  # often index 0 is the default camera.
+        "source": None,  # None reads the camera at camera_index.
+        "speed": "realtime",  # replay speed of a recorded or synthetic source.
+        "duration": None,
+        "max_frames": None,
+        "latency_histograms": False,  # per-stage latency histograms (see latency.py).
+        "latency_interval": 60.0,  # seconds between latency reports.
+        "metrics_port": None,  # e.g. 9108 to serve metrics (see metrics.py).
+    }
+    if args.config:
+        with open(args.config, "r") as f:
+            config = json.load(f)
+        unknown = set(config) - set(settings)
+        if unknown:
+            parser.error(
+                f"unknown settings in {args.config}: {', '.join(sorted(unknown))}"
+            )
+        settings.update(config)
+    for key in settings:
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    try:
+        settings["speed"] = parse_speed(settings["speed"])
+    except ValueError as e:
+        parser.error(str(e))
+    settings["headless"] = args.headless
+    return settings
 
 
-def main():
-    # Ask the user for the scale parameters.
+def main(argv=None):
+    settings = parse_settings(argv)
+    headless = settings["headless"]
+
+    # Ask the user for the scale parameters and points file unless they were
+    # given as arguments or in the config file.
+    missing = [
+        key for key in ("min_temp", "max_temp", "points_file") if settings[key] is None
+    ]
+    if missing and headless:
+        print(
+            f"Error: headless mode needs {', '.join(missing)} as arguments or in the config file."
+        )
+        return
     try:
-        min_temp = float(input("Enter the MIN temperature on the scale: "))
-        max_temp = float(input("Enter the MAX temperature on the scale: "))
+        if settings["min_temp"] is None:
+            settings["min_temp"] = float(
+                input("Enter the MIN temperature on the scale: ")
+            )
+        if settings["max_temp"] is None:
+            settings["max_temp"] = float(
+                input("Enter the MAX temperature on the scale: ")
+            )
     except ValueError:
         print("Invalid input. Please enter numeric values for temperatures.")
         return
 
     # Ask the user to enter the points file name or path.
-    points_file = input("Enter the filename or path for the points file: ").strip()
-    points = []
+    if settings["points_file"] is None:
+        settings["points_file"] = input(
+            "Enter the filename or path for the points file: "
+        ).strip()
+    run(**settings)
+
+
+def run(
+    min_temp,
+    max_temp,
+    points_file,
+    interval=2.0,
+    camera_index=1,
+    source=None,
+    speed="realtime",
+    headless=False,
+    duration=None,
+    max_frames=None,
+    latency_histograms=False,
+    latency_interval=60.0,
+    metrics_port=None,
+):
+    """Capture and log one session; see parse_settings for the arguments."""
     try:
-        with open(points_file, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    parts = line.split(",")
-                    if len(parts) == 2:
-                        try:
-                            x = int(parts[0].strip())
-                            y = int(parts[1].strip())
-                            points.append((x, y))
-                        except ValueError:
-                            print(f"Skipping invalid line: {line}")
-        if len(points) != 5:
-            print("Error: The file must contain exactly 5 points.")
-            return
+        points = load_points(points_file)
+        regions = load_regions(points_file)
     except FileNotFoundError:
         print(f"Error: File '{points_file}' not found.")
         return
+    if not points and not regions:
+        print("Error: The file must contain at least one point (x,y[,name]) or region.")
+        return
+    sampler = PointSampler(points)
+    region_stats = RegionStats(regions)
 
-    # Create photos directory if it doesn't exist.
+    # Sampled frames are appended to a chunked, memory-mapped frame store
+    # (see frame_store.py) rather than written as one image file each.
+    # Set export_photos to also write every frame as an image in photos_dir.
+    frame_store_dir = "frames"
+    export_photos = False
     photos_dir = "photos"
-    if not os.path.exists(photos_dir):
+    if export_photos and not os.path.exists(photos_dir):
         os.makedirs(photos_dir)
 
-    # Open CSV file for logging temperature data.
+    # Optionally archive the full-frame temperature map of every capture as
+    # compressed 16-bit fixed-point values (see temperature_archive.py).
+    save_temperature_maps = False
+    temp_maps_dir = "temperature_maps"
+
+    # Log temperature data to an append-only binary log of fixed-width
+    # records (see temperature_log.py); it is exported to CSV at the end.
+    log_filename = "photo_temperature_data.bin"
     csv_filename = "photo_temperature_data.csv"
-    csvfile = open(csv_filename, "w", newline="")
-    writer = csv.writer(csvfile)
-    header = ["Photo", "Timestamp"]
-    for i in range(5):
-        header.append(f"Estimated Temperature Point {i+1} (C)")
-    writer.writerow(header)
-
-    # Setup camera. Change camera_index if needed.
-    camera_index = 1  # Adjust as needed; often index 0 is the default camera.
-    cap = cv2.VideoCapture(camera_index)
+    columns = [f"Estimated Temperature {name} (C)" for name in sampler.names]
+    columns += region_stats.header()
+    temp_log = TemperatureLogWriter(log_filename, columns, overwrite=True)
+
+    # Setup camera, or the recording or generator standing in for it.
+    if source is None:
+        source = camera_index
+    cap = open_source(source, speed)
     if not cap.isOpened():
-        print(f"Cannot open camera at index {camera_index}")
-        csvfile.close()
+        print(f"Cannot open frame source {source}")
+        temp_log.close()
         return
 
-    photo_capture_interval = 2  # seconds between captures; adjust as needed.
-    last_capture_time = time.time()
-    start_time = last_capture_time  # record when streaming started
-    img_counter = 0
+    # Per-stage latency histograms, reported every latency_interval seconds
+    # and at exit; while off, the stage timers cost next to nothing.
+    if latency_histograms:
+        latency.enable(latency_interval)
+
+    start_time = time.time()  # record when streaming started
+
+    # Exported photos are encoded and written on background threads. image_format is
+    # "png", "webp" (lossless) or "npy" (raw, fastest); png_compression runs
+    # from 0 (fastest, largest) to 9. With image_queue_policy "block" a slow
+    # disk holds up the logging stage, with "drop" photos are skipped instead.
+    image_format = "png"
+    png_compression = 1
+    image_queue_policy = "block"
+    image_writer = None
+    if export_photos:
+        image_writer = ImageWriter(
+            image_format, png_compression, policy=image_queue_policy
+        )
+    frame_store = FrameStoreWriter(frame_store_dir)
+    temp_archive = None
+    if save_temperature_maps:
+        try:
+            temp_archive = TemperatureArchiveWriter(temp_maps_dir, min_temp, max_temp)
+        except ValueError as e:
+            print(f"Error: {e} Temperature maps will not be archived.")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Can't receive frame. Exiting...")
+    # Temperatures are matched exactly against the scale rows. With use_lut
+    # each palette also remembers the temperature of every color it has
+    # converted (up to 16 MB per palette), so once the scene's colors are
+    # known a frame is a single table gather; set it to False to search every
+    # time. Palettes are only rebuilt when the scale bar pixels or min/max change.
+    use_lut = True  # identical results either way
+    palette_cache = PaletteCache(use_lut)
+
+    def process(sample):
+        """Processing stage: estimate the temperatures of one captured frame."""
+        img_counter, capture_time, frame = sample
+        try:
+            # Process the frame to estimate the temperature.
+            palette = palette_cache.get(frame, min_temp, max_temp)
+        except ValueError as e:
+            print(f"Error processing image: {e}")
+            palette = None
+
+        temp_values = region_values = temp_map = None
+        if palette is not None:
+            with latency.timer("estimation"):
+                # All points are gathered and looked up in a single pass.
+                temp_values = sampler.sample(frame, palette)
+                if save_temperature_maps:
+                    temp_map = temperature_map(frame, palette)
+                elif region_stats:
+                    # Only the part of the frame the regions cover is needed.
+                    box = region_stats.bounds(frame.shape[:2])
+                    temp_map = temperature_map(frame, palette, box)
+                if region_stats:
+                    region_values = region_stats.compute(temp_map)
+            for idx in np.flatnonzero(~sampler.inside(frame)):
+                print(
+                    f"Error processing {sampler.names[idx]} in sample {img_counter}: Target coordinates are out of image bounds."
+                )
+        return (
+            img_counter,
+            capture_time,
+            frame,
+            temp_values,
+            region_values,
+            temp_map,
+        )
+
+    latest_sample = None  # (capture time, temperatures), for the metrics page.
+
+    def record(result):
+        """Sink stage: store the frame and temperature map and log the sample."""
+        nonlocal latest_sample
+        img_counter, capture_time, frame, temp_values, region_values, temp_map = result
+        with latency.timer("frame store write"):
+            frame_number = frame_store.append(frame, capture_time)
+        if image_writer is not None:
+            photo_filename = f"image_{frame_number:06d}{image_writer.extension}"
+            image_writer.save(os.path.join(photos_dir, photo_filename), frame)
+
+        timestamp_str = datetime.fromtimestamp(capture_time).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        if temp_values is not None:
+            values = temp_values
+            if region_values is not None:
+                values = np.concatenate([temp_values, region_values.ravel()])
+            print(
+                f"Captured frame {frame_number} at {timestamp_str} with temperatures: {summarize_temperatures(temp_values)}"
+            )
+        else:
+            values = None
+            print(
+                f"Captured frame {frame_number} at {timestamp_str} but failed to estimate temperatures."
+            )
+        with latency.timer("log write"):
+            temp_log.append(capture_time, frame_number, values)
+        latest_sample = (capture_time, temp_values)
+
+        if temp_archive is not None:
+            # Failed frames get an empty map so archive and frame store
+            # numbers stay the same.
+            if temp_map is None:
+                temp_map = np.full(frame.shape[:2], np.nan, dtype=np.float32)
+            with latency.timer("archive write"):
+                temp_archive.append(temp_map, capture_time)
+
+    # The camera is drained on its own thread, so a slow PNG write or palette
+    # rebuild never holds up acquisition; samples flow capture -> processing ->
+    # sink over bounded queues and frames are dropped rather than queued up.
+    # Headless runs skip the window and overlays entirely.
+    capture = CaptureThread(cap, interval, display=not headless, max_frames=max_frames)
+    processing = StageThread("processing", process, capture.samples, outbox_size=4)
+    sink = StageThread("sink", record, processing.outbox)
+    metrics = None
+    if metrics_port is not None:
+        metrics = MetricsServer(metrics_port)
+        register_pipeline(
+            metrics,
+            capture,
+            [processing, sink],
+            palette_cache,
+            sampler.names,
+            lambda: latest_sample,
+        )
+        metrics.start()
+        print(f"Serving metrics at http://{metrics.host}:{metrics.port}/metrics")
+    for thread in (capture, processing, sink):
+        thread.start()
+    run_start = time.monotonic()
+
+    if headless:
+        wait_for_stop(capture, duration)
+    while not headless:
+        try:
+            captured = capture.frames.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if captured is None:
+            if capture.failed:
+                print("Can't receive frame. Exiting...")
             break
+        current_time, frame = captured
 
         # Get frame height to place text.
         height = frame.shape[0]
-        current_time = time.time()
         elapsed_time = current_time - start_time
         overlay_text1 = f"Time Elapsed: {elapsed_time:.1f} s"
-        overlay_text2 = f"Photos Captured: {img_counter}"
+        overlay_text2 = f"Photos Captured: {sink.counter.count}"
 
         # Draw overlay text.
-        cv2.putText(
-            frame,
-            overlay_text1,
-            (10, height - 40),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (0, 255, 0),
-            1,
-            cv2.LINE_AA,
-        )
-        cv2.putText(
-            frame,
-            overlay_text2,
-            (10, height - 10),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (0, 255, 0),
-            1,
-            cv2.LINE_AA,
-        )
+        with latency.timer("overlay"):
+            cv2.putText(
+                frame,
+                overlay_text1,
+                (10, height - 40),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 255, 0),
+                1,
+                cv2.LINE_AA,
+            )
+            cv2.putText(
+                frame,
+                overlay_text2,
+                (10, height - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 255, 0),
+                1,
+                cv2.LINE_AA,
+            )
 
         # Display the live video stream.
-        cv2.imshow("FLIR E6390 (Webcam-like) Stream", frame)
-
-        # Capture photo every photo_capture_interval seconds.
-        if current_time - last_capture_time >= photo_capture_interval:
-            photo_filename = f"image_{img_counter:03d}.png"
-            photo_path = os.path.join(photos_dir, photo_filename)
-            cv2.imwrite(photo_path, frame)
-
-            try:
-                # Process the frame to estimate the temperature.
-                color_temp_map = extract_color_temp_map(frame, min_temp, max_temp)
-            except ValueError as e:
-                print(f"Error processing image: {e}")
-                color_temp_map = None
-
-            timestamp_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            temps = []
-            if color_temp_map is not None:
-                for idx, (x_target, y_target) in enumerate(points):
-                    try:
-                        estimated_temp = estimate_temperature(
-                            frame, color_temp_map, x_target, y_target
-                        )
-                        temps.append(f"{estimated_temp:.2f}")
-                    except ValueError as e:
-                        print(
-                            f"Error processing point {idx+1} in image {photo_filename}: {e}"
-                        )
-                        temps.append("Error")
-                print(
-                    f"Captured {photo_filename} at {timestamp_str} with temperatures: {', '.join(temps)}"
-                )
-            else:
-                temps = ["N/A"] * len(points)
-                print(
-                    f"Captured {photo_filename} at {timestamp_str} but failed to estimate temperatures."
-                )
-
-            writer.writerow([photo_filename, timestamp_str] + temps)
-
-            img_counter += 1
-            last_capture_time = current_time
+        with latency.timer("display"):
+            cv2.imshow("FLIR E6390 (Webcam-like) Stream", frame)
+            key = cv2.waitKey(1) & 0xFF
 
-        # Allow user to quit the application by pressing 'q'.
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+        # Allow user to quit the application by pressing 'q', or stop after
+        # the configured duration.
+        if key == ord("q"):
+            break
+        if duration is not None and time.monotonic() - run_start >= duration:
             break
 
-    # Clean up.
+    # Clean up once the queued samples have been written.
+    elapsed = time.monotonic() - run_start
+    stop_pipeline(capture, [processing, sink])
+    if elapsed > 0:
+        print(
+            f"Achieved {capture.counter.count / elapsed:.1f} frames/s and "
+            f"{sink.counter.count / elapsed:.2f} samples/s over {elapsed:.1f} s."
+        )
+    frame_store.close()
+    print(f"{len(frame_store)} frames stored in '{frame_store.store_dir}'.")
+    if temp_archive is not None:
+        temp_archive.close()
+        print(f"Temperature maps archived in '{temp_archive.archive_dir}'.")
+    if image_writer is not None:
+        image_writer.close()
+        print(image_writer.summary())
     cap.release()
-    cv2.destroyAllWindows()
-    csvfile.close()
-    print(f"Temperature data saved to '{csv_filename}'.")
+    if not headless:
+        cv2.destroyAllWindows()
+    temp_log.close()
+    with latency.timer("CSV export"):
+        export_csv(log_filename, csv_filename)
+    latency.disable()
+    if metrics is not None:
+        metrics.close()
+    print(f"Palette cache: {palette_cache.hits} hits, {palette_cache.misses} misses.")
+    print(f"Temperature data saved to '{log_filename}' and '{csv_filename}'.")
 
 
 if __name__ == "__main__":
@@ -1,53 +1,16 @@
 import cv2
-import numpy as np
 import csv
 import os
+import sys
 import time
 from datetime import datetime
 
-
-def extract_color_temp_map(image, min_temp, max_temp, x1=306, y1=36, x2=315, y2=211):
-    """
-    Extract the color-to-temperature mapping from the scale bar region.
-    Coordinates (x1, y1) to (x2, y2) should cover the vertical temperature scale.
-    """
-    cropped_scale = image[y1:y2, x1:x2]
-    scale_height, scale_width, _ = cropped_scale.shape
-    color_temp_map = []
-    for row_index in range(scale_height):
-        row_pixels = cropped_scale[row_index, :, :]
-        avg_bgr = np.mean(row_pixels, axis=0).tolist()  # Average BGR values
-        fraction = row_index / (scale_height - 1) if scale_height > 1 else 0
-        # Interpolate temperature from top (max_temp) to bottom (min_temp)
-        row_temp = max_temp - fraction * (max_temp - min_temp)
-        color_temp_map.append((row_temp, avg_bgr))
-    color_temp_map.sort(key=lambda x: x[0])
-    return color_temp_map
-
-
-def estimate_temperature(image, color_temp_map, x_target, y_target):
-    """
-    Estimate the temperature at the specified (x, y) point.
-    Compares the target pixel's normalized RGB to each row's color in the scale.
-    """
-    target_color = image[y_target, x_target, :]
-    b, g, r = target_color
-    target_rgb = (r / 255.0, g / 255.0, b / 255.0)
-
-    min_distance = float("inf")
-    estimated_temp = None
-    for temp, bgr in color_temp_map:
-        tb, tg, tr = bgr
-        row_rgb = (tr / 255.0, tg / 255.0, tb / 255.0)
-        distance = np.sqrt(
-            (target_rgb[0] - row_rgb[0]) ** 2
-            + (target_rgb[1] - row_rgb[1]) ** 2
-            + (target_rgb[2] - row_rgb[2]) ** 2
-        )
-        if distance < min_distance:
-            min_distance = distance
-            estimated_temp = temp
-    return estimated_temp
+# The shared palette code lives in full_code/.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "full_code")
+)
+from frame_source import open_source
+from palette import extract_color_temp_map, estimate_temperature
 
 
 def main():
@@ -74,9 +37,11 @@ def main():
 
     # Setup camera. Change camera_index if needed.
     camera_index = 1
-    cap = cv2.VideoCapture(camera_index)
+    # camera_index may also be a video file, a photo directory or
+    # "synthetic" to run without the camera (see full_code/frame_source.py).
+    cap = open_source(camera_index)
     if not cap.isOpened():
-        print(f"Cannot open camera at index {camera_index}")
+        print(f"Cannot open frame source {camera_index}")
         csvfile.close()
         return
 
@@ -1,71 +1,16 @@
 import cv2
-import numpy as np
 import csv
 import os
+import sys
 import time
 from datetime import datetime
 
-
-def bgr_to_rgb(color):
-    """Convert a BGR tuple to normalized RGB tuple."""
-    b, g, r = color
-    return (r / 255.0, g / 255.0, b / 255.0)
-
-
-def extract_color_temp_map(image, min_temp, max_temp, x1=306, y1=36, x2=315, y2=211):
-    """
-    Extract the color-to-temperature mapping from the scale bar region.
-    Coordinates (x1, y1) to (x2, y2) should cover the vertical temperature scale.
-    """
-    # Ensure the crop coordinates are within the image bounds.
-    height, width, _ = image.shape
-    if x1 < 0 or x2 > width or y1 < 0 or y2 > height:
-        raise ValueError("Scale bar coordinates are out of image bounds.")
-
-    cropped_scale = image[y1:y2, x1:x2]
-    scale_height, scale_width, _ = cropped_scale.shape
-    color_temp_map = []
-
-    for row_index in range(scale_height):
-        row_pixels = cropped_scale[row_index, :, :]
-        # Average over the width for this row.
-        avg_bgr = np.mean(row_pixels, axis=0).tolist()
-        fraction = row_index / (scale_height - 1) if scale_height > 1 else 0
-        # Interpolate temperature from top (max_temp) to bottom (min_temp)
-        row_temp = max_temp - fraction * (max_temp - min_temp)
-        color_temp_map.append((row_temp, avg_bgr))
-
-    # Sort the mapping by temperature (ascending order)
-    color_temp_map.sort(key=lambda x: x[0])
-    return color_temp_map
-
-
-def estimate_temperature(image, color_temp_map, x_target, y_target):
-    """
-    Estimate the temperature at the specified (x, y) point.
-    Compares the target pixel's normalized RGB to each row's color in the scale.
-    """
-    height, width, _ = image.shape
-    if not (0 <= x_target < width and 0 <= y_target < height):
-        raise ValueError("Target coordinates are out of image bounds.")
-
-    target_color = image[y_target, x_target, :]
-    target_rgb = bgr_to_rgb(target_color)
-
-    min_distance = float("inf")
-    estimated_temp = None
-    for temp, bgr in color_temp_map:
-        row_rgb = bgr_to_rgb(bgr)
-        # Euclidean distance in RGB space.
-        distance = np.sqrt(
-            (target_rgb[0] - row_rgb[0]) ** 2
-            + (target_rgb[1] - row_rgb[1]) ** 2
-            + (target_rgb[2] - row_rgb[2]) ** 2
-        )
-        if distance < min_distance:
-            min_distance = distance
-            estimated_temp = temp
-    return estimated_temp
+# The shared palette code lives in full_code/.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "full_code")
+)
+from frame_source import open_source
+from palette import PaletteCache, lookup_temperature
 
 
 def main():
@@ -92,9 +37,11 @@ def main():
 
     # Setup camera. Change camera_index if needed.
     camera_index = 1  # Adjust as needed; often index 0 is the default camera.
-    cap = cv2.VideoCapture(camera_index)
+    # camera_index may also be a video file, a photo directory or
+    # "synthetic" to run without the camera (see full_code/frame_source.py).
+    cap = open_source(camera_index)
     if not cap.isOpened():
-        print(f"Cannot open camera at index {camera_index}")
+        print(f"Cannot open frame source {camera_index}")
         csvfile.close()
         return
 
@@ -103,6 +50,14 @@ def main():
     start_time = last_capture_time  # record when streaming started
     img_counter = 0
 
+    # Temperatures are matched exactly against the scale rows. With use_lut
+    # each palette also remembers the temperature of every color it has
+    # converted (up to 16 MB per palette), so once the scene's colors are
+    # known a frame is a single table gather; set it to False to search every
+    # time. Palettes are only rebuilt when the scale bar pixels or min/max change.
+    use_lut = True  # identical results either way
+    palette_cache = PaletteCache(use_lut)
+
     while True:
         ret, frame = cap.read()
         if not ret:
@@ -149,10 +104,8 @@ def main():
 
             try:
                 # Process the frame to estimate the temperature.
-                color_temp_map = extract_color_temp_map(frame, min_temp, max_temp)
-                estimated_temp = estimate_temperature(
-                    frame, color_temp_map, x_target, y_target
-                )
+                palette = palette_cache.get(frame, min_temp, max_temp)
+                estimated_temp = lookup_temperature(frame, palette, x_target, y_target)
             except ValueError as e:
                 print(f"Error processing image: {e}")
                 estimated_temp = None
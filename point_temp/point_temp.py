@@ -1,65 +1,166 @@
-import cv2
-import numpy as np
 import csv
 import os
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+# The shared palette code lives in full_code/.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "full_code")
+)
+from frame_store import FrameStore, is_frame_store
+from image_writer import read_image
+from palette import PaletteCache, estimate_temperature
 
-def extract_color_temp_map(image, min_temp, max_temp, x1=306, y1=36, x2=315, y2=211):
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".npy")
+
+# Each worker process keeps its own palette cache across the images it handles,
+# and its own read-only mapping of the frame store being processed.
+_palette_cache = None
+_frame_store = None
+
+
+def list_photos(photos_dir):
+    """Return the image filenames in photos_dir in sorted order."""
+    return [
+        photo_filename
+        for photo_filename in sorted(os.listdir(photos_dir))
+        if photo_filename.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def estimate_point(image, min_temp, max_temp, x_target, y_target):
+    """Estimate the temperature at (x_target, y_target) in one image."""
+    global _palette_cache
+    if _palette_cache is None:
+        _palette_cache = PaletteCache()
+
+    # Build the color-to-temperature map from the scale bar (cached while the
+    # scale bar stays the same) and estimate the temperature at the point.
+    palette = _palette_cache.get(image, min_temp, max_temp)
+    return estimate_temperature(image, palette, x_target, y_target)
+
+
+def process_photo(photo_path, min_temp, max_temp, x_target, y_target):
     """
-    Extracts a color-to-temperature mapping from the cropped scale bar region.
-    The scale bar is assumed to run vertically from (x1, y1) to (x2, y2).
+    Estimate the temperature at (x_target, y_target) in one photo.
+    Returns (photo_filename, timestamp_str, estimated_temp, error): if the
+    image could not be read or processed, estimated_temp is None and error
+    says why, so one bad photo does not stop the others.
     """
-    cropped_scale = image[y1:y2, x1:x2]
-    scale_height, scale_width, _ = cropped_scale.shape
-    color_temp_map = []
-
-    # For each row in the scale bar, compute the average BGR color and
-    # map the row to a temperature by linear interpolation.
-    for row_index in range(scale_height):
-        row_pixels = cropped_scale[row_index, :, :]
-        avg_bgr = np.mean(row_pixels, axis=0).tolist()  # [B, G, R]
-        fraction = row_index / (scale_height - 1) if scale_height > 1 else 0
-        row_temp = max_temp - fraction * (max_temp - min_temp)
-        color_temp_map.append((row_temp, avg_bgr))
-
-    # Sort by ascending temperature (optional, as our interpolation already
-    # goes from top (max_temp) to bottom (min_temp))
-    color_temp_map.sort(key=lambda x: x[0])
-    return color_temp_map
-
-
-def estimate_temperature(image, color_temp_map, x_target, y_target):
+    photo_filename = os.path.basename(photo_path)
+    # Get the file's modification time as a proxy for capture timestamp.
+    mod_time = os.path.getmtime(photo_path)
+    timestamp_str = datetime.fromtimestamp(mod_time).strftime("%Y-%m-%d %H:%M:%S")
+
+    image = read_image(photo_path)
+    if image is None:
+        return photo_filename, timestamp_str, None, "Could not read image."
+    try:
+        estimated_temp = estimate_point(image, min_temp, max_temp, x_target, y_target)
+    except ValueError as e:
+        return photo_filename, timestamp_str, None, str(e)
+    return photo_filename, timestamp_str, estimated_temp, None
+
+
+def process_frame(store_dir, frame_number, min_temp, max_temp, x_target, y_target):
+    """
+    Estimate the temperature at (x_target, y_target) in one frame of a frame
+    store. The frame is read straight from the memory-mapped chunk file.
+    Returns (frame_number, timestamp_str, estimated_temp, error) like
+    process_photo.
     """
-    Estimates the temperature at a target (x,y) coordinate in the image.
-    The target pixel’s BGR color is compared to each row of the scale using
-    Euclidean distance in RGB space.
+    global _frame_store
+    if _frame_store is None or _frame_store.store_dir != store_dir:
+        _frame_store = FrameStore(store_dir)
+    if frame_number >= len(_frame_store):
+        _frame_store.refresh()
+
+    timestamp_str = datetime.fromtimestamp(
+        _frame_store.timestamps[frame_number]
+    ).strftime("%Y-%m-%d %H:%M:%S")
+    image = _frame_store.frame(frame_number)
+    try:
+        estimated_temp = estimate_point(image, min_temp, max_temp, x_target, y_target)
+    except ValueError as e:
+        return frame_number, timestamp_str, None, str(e)
+    return frame_number, timestamp_str, estimated_temp, None
+
+
+def process_photo_paths(
+    photo_paths, min_temp, max_temp, x_target, y_target, executor=None, chunk_size=16
+):
     """
-    # Get the BGR color at the target point and convert to normalized RGB
-    target_color = image[y_target, x_target, :]  # note: image[y, x]
-    b, g, r = target_color
-    target_rgb = (r / 255.0, g / 255.0, b / 255.0)
-
-    min_distance = float("inf")
-    estimated_temp = None
-    # Compare with each row in the color_temp_map
-    for temp, bgr in color_temp_map:
-        tb, tg, tr = bgr
-        row_rgb = (tr / 255.0, tg / 255.0, tb / 255.0)
-        distance = np.sqrt(
-            (target_rgb[0] - row_rgb[0]) ** 2
-            + (target_rgb[1] - row_rgb[1]) ** 2
-            + (target_rgb[2] - row_rgb[2]) ** 2
+    Run process_photo over photo_paths, on the given process pool if any, and
+    return an iterator of the results in the same order as photo_paths.
+    """
+    count = len(photo_paths)
+    args = (
+        photo_paths,
+        [min_temp] * count,
+        [max_temp] * count,
+        [x_target] * count,
+        [y_target] * count,
+    )
+    if executor is None:
+        return map(process_photo, *args)
+    # map() hands out chunk_size images per task and returns the results in
+    # submission order.
+    return executor.map(process_photo, *args, chunksize=chunk_size)
+
+
+def process_photos(
+    photos_dir, min_temp, max_temp, x_target, y_target, workers=None, chunk_size=16
+):
+    """
+    Process every image in photos_dir over a pool of worker processes and
+    yield process_photo results in filename order. workers=None uses all
+    CPU cores; workers=1 processes the images in this process.
+    """
+    photo_paths = [
+        os.path.join(photos_dir, photo_filename)
+        for photo_filename in list_photos(photos_dir)
+    ]
+    if workers == 1:
+        yield from process_photo_paths(
+            photo_paths, min_temp, max_temp, x_target, y_target
         )
-        if distance < min_distance:
-            min_distance = distance
-            estimated_temp = temp
-    return estimated_temp
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from process_photo_paths(
+            photo_paths, min_temp, max_temp, x_target, y_target, executor, chunk_size
+        )
+
 
+def process_frames(
+    store_dir, min_temp, max_temp, x_target, y_target, workers=None, chunk_size=16
+):
+    """
+    Process every frame of the frame store in store_dir like process_photos.
+    Workers receive frame numbers rather than pixels and map the chunk files
+    themselves, so no image data is pickled between processes.
+    """
+    frame_numbers = range(len(FrameStore(store_dir)))
+    count = len(frame_numbers)
+    args = (
+        [store_dir] * count,
+        frame_numbers,
+        [min_temp] * count,
+        [max_temp] * count,
+        [x_target] * count,
+        [y_target] * count,
+    )
+    if workers == 1:
+        yield from map(process_frame, *args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(process_frame, *args, chunksize=chunk_size)
 
-def main():
-    photos_dir = r"E:\Novak_part_time_job\Thermal\point_temp\photos"
+
+def main(photos_dir=r"E:\Novak_part_time_job\Thermal\point_temp\photos"):
     if not os.path.exists(photos_dir):
         print("Photos directory not found!")
         return
@@ -74,41 +175,41 @@ def main():
         print("Invalid input. Please enter numeric values.")
         return
 
+    workers = None  # worker processes; None uses every CPU core, 1 disables the pool.
+    chunk_size = 16  # images handed to a worker at a time.
+
     # Prepare the output CSV file.
     csv_filename = "photo_temperature_data.csv"
+    start_time = time.time()
+    processed = 0
     with open(csv_filename, "w", newline="") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["Photo", "Timestamp", "Estimated Temperature (°)"])
 
-        # Loop through all image files in the photos directory.
-        for photo_filename in sorted(os.listdir(photos_dir)):
-            if photo_filename.lower().endswith((".png", ".jpg", ".jpeg")):
-                photo_path = os.path.join(photos_dir, photo_filename)
-                image = cv2.imread(photo_path)
-                if image is None:
-                    print(f"WARNING: Could not read image {photo_filename}. Skipping.")
-                    continue
-
-                # Build the color-to-temperature map from the scale bar.
-                color_temp_map = extract_color_temp_map(image, min_temp, max_temp)
-                # Estimate the temperature at the specified (x, y) point.
-                estimated_temp = estimate_temperature(
-                    image, color_temp_map, x_target, y_target
-                )
-
-                # Get the file's modification time as a proxy for capture timestamp.
-                mod_time = os.path.getmtime(photo_path)
-                timestamp_str = datetime.fromtimestamp(mod_time).strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                )
-
-                print(
-                    f"Photo: {photo_filename}, Timestamp: {timestamp_str}, Estimated Temperature: {estimated_temp:.2f}"
-                )
-                writer.writerow(
-                    [photo_filename, timestamp_str, f"{estimated_temp:.2f}"]
-                )
-
+        # Loop through every frame of a frame store, or every image file in
+        # a directory of photos.
+        if is_frame_store(photos_dir):
+            results = process_frames(
+                photos_dir, min_temp, max_temp, x_target, y_target, workers, chunk_size
+            )
+        else:
+            results = process_photos(
+                photos_dir, min_temp, max_temp, x_target, y_target, workers, chunk_size
+            )
+        for photo_filename, timestamp_str, estimated_temp, error in results:
+            if error is not None:
+                print(f"WARNING: {photo_filename}: {error} Skipping.")
+                continue
+
+            print(
+                f"Photo: {photo_filename}, Timestamp: {timestamp_str}, Estimated Temperature: {estimated_temp:.2f}"
+            )
+            writer.writerow([photo_filename, timestamp_str, f"{estimated_temp:.2f}"])
+            processed += 1
+
+    elapsed = time.time() - start_time
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {processed} images in {elapsed:.2f} s ({rate:.1f} images/s).")
     print(f"Temperature data has been saved to '{csv_filename}'.")
 
 
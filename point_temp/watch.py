@@ -0,0 +1,232 @@
+import csv
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from point_temp import list_photos, process_photo_paths
+
+CSV_HEADER = ["Photo", "Timestamp", "Estimated Temperature (°)"]
+
+
+def ignore_interrupts():
+    """Pool initializer: leave Ctrl+C to the watching process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def load_manifest(manifest_path, settings):
+    """
+    Read the checkpoint manifest: a JSON-lines file whose first line holds the
+    settings it was written with and every further line one processed photo,
+    with its temperature or, if it failed, the error.
+    Returns a dict of photo filename -> entry, or None when the manifest is
+    missing or was written with different settings.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+
+    processed = {}
+    with open(manifest_path, "r") as f:
+        lines = f.read().splitlines()
+    if not lines or json.loads(lines[0]) != {"settings": settings}:
+        print(f"Manifest '{manifest_path}' uses other settings; starting a new one.")
+        return None
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # A line cut short by a crash; that photo is simply processed again.
+            continue
+        processed[entry["photo"]] = entry
+    return processed
+
+
+def rotate_file(path):
+    """
+    Move a non-empty file aside as name.YYYYmmdd-HHMMSS.ext; return the new
+    path, or None if there was nothing to move.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    base, ext = os.path.splitext(path)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(os.path.getmtime(path)))
+    rotated = f"{base}.{stamp}{ext}"
+    counter = 1
+    while os.path.exists(rotated):
+        counter += 1
+        rotated = f"{base}.{stamp}-{counter}{ext}"
+    os.replace(path, rotated)
+    return rotated
+
+
+def find_new_photos(photos_dir, processed, settle_time):
+    """
+    Return (filename, size, mtime) for photos that are not in the manifest, or
+    whose size or modification time changed since they were processed.
+    Files modified within the last settle_time seconds may still be being
+    written and are left for the next poll.
+    """
+    now = time.time()
+    new_photos = []
+    for photo_filename in list_photos(photos_dir):
+        try:
+            stat = os.stat(os.path.join(photos_dir, photo_filename))
+        except FileNotFoundError:
+            continue
+        if now - stat.st_mtime < settle_time:
+            continue
+        entry = processed.get(photo_filename)
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or entry["mtime"] != stat.st_mtime
+        ):
+            new_photos.append((photo_filename, stat.st_size, stat.st_mtime))
+    return new_photos
+
+
+def watch(
+    photos_dir,
+    min_temp,
+    max_temp,
+    x_target,
+    y_target,
+    csv_filename="photo_temperature_data.csv",
+    manifest_path="photo_temperature_manifest.jsonl",
+    poll_interval=2.0,
+    settle_time=1.0,
+    workers=None,
+    chunk_size=16,
+):
+    """
+    Process new photos in photos_dir as they appear until interrupted with
+    Ctrl+C. Results are appended to csv_filename, then recorded in the
+    manifest, so a restart only processes photos it has not seen yet. When
+    a new manifest is started, e.g. because the settings changed, the rows
+    already in csv_filename belong to the old one, so that file is moved
+    aside first.
+    """
+    settings = {
+        "min_temp": min_temp,
+        "max_temp": max_temp,
+        "x_target": x_target,
+        "y_target": y_target,
+    }
+    processed = load_manifest(manifest_path, settings)
+    if processed is None:
+        processed = {}
+        rotated = rotate_file(csv_filename)
+        if rotated is not None:
+            print(f"Earlier results were moved to '{rotated}'.")
+        with open(manifest_path, "w") as manifest:
+            manifest.write(json.dumps({"settings": settings}) + "\n")
+    print(f"Resuming with {len(processed)} photos already processed.")
+
+    new_csv = not os.path.exists(csv_filename) or os.path.getsize(csv_filename) == 0
+    executor = None
+    if workers != 1:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=ignore_interrupts
+        )
+    try:
+        with open(csv_filename, "a", newline="") as csvfile, open(
+            manifest_path, "a"
+        ) as manifest:
+            writer = csv.writer(csvfile)
+            if new_csv:
+                writer.writerow(CSV_HEADER)
+
+            while True:
+                new_photos = find_new_photos(photos_dir, processed, settle_time)
+                if not new_photos:
+                    time.sleep(poll_interval)
+                    continue
+
+                start_time = time.time()
+                photo_paths = [
+                    os.path.join(photos_dir, photo_filename)
+                    for photo_filename, _, _ in new_photos
+                ]
+                results = process_photo_paths(
+                    photo_paths,
+                    min_temp,
+                    max_temp,
+                    x_target,
+                    y_target,
+                    executor,
+                    chunk_size,
+                )
+                entries = []
+                for (photo_filename, size, mtime), result in zip(new_photos, results):
+                    _, timestamp_str, estimated_temp, error = result
+                    if error is not None:
+                        print(f"WARNING: {photo_filename}: {error}")
+                    else:
+                        writer.writerow(
+                            [photo_filename, timestamp_str, f"{estimated_temp:.2f}"]
+                        )
+                    # Failed photos are recorded too, with the error, so they
+                    # are not retried until the file changes.
+                    entries.append(
+                        {
+                            "photo": photo_filename,
+                            "size": size,
+                            "mtime": mtime,
+                            "timestamp": timestamp_str,
+                            "temperature": estimated_temp,
+                            "error": error,
+                        }
+                    )
+
+                # The CSV rows are flushed before the manifest, so a crash in
+                # between repeats these photos rather than losing them.
+                csvfile.flush()
+                for entry in entries:
+                    manifest.write(json.dumps(entry) + "\n")
+                    processed[entry["photo"]] = entry
+                manifest.flush()
+
+                elapsed = time.time() - start_time
+                rate = len(entries) / elapsed if elapsed > 0 else 0.0
+                print(
+                    f"Processed {len(entries)} new images in {elapsed:.2f} s ({rate:.1f} images/s)."
+                )
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print(f"Temperature data has been saved to '{csv_filename}'.")
+
+
+def main(photos_dir=r"E:\Novak_part_time_job\Thermal\point_temp\photos"):
+    if not os.path.exists(photos_dir):
+        print("Photos directory not found!")
+        return
+
+    # Ask the user for scale min/max temperatures and the target point coordinates.
+    try:
+        min_temp = float(input("Enter the MIN temperature on the scale: "))
+        max_temp = float(input("Enter the MAX temperature on the scale: "))
+        x_target = int(input("Enter the x-coordinate of the target point: "))
+        y_target = int(input("Enter the y-coordinate of the target point: "))
+    except ValueError:
+        print("Invalid input. Please enter numeric values.")
+        return
+
+    poll_interval = 2.0  # seconds between directory scans.
+    workers = None  # worker processes; None uses every CPU core, 1 disables the pool.
+    watch(
+        photos_dir,
+        min_temp,
+        max_temp,
+        x_target,
+        y_target,
+        poll_interval=poll_interval,
+        workers=workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
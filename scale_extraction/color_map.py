@@ -1,9 +1,17 @@
 import cv2
 import numpy as np
 import csv
+import os
+import sys
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 
+# The shared palette code lives in full_code/.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "full_code")
+)
+from palette import TemperaturePalette
+
 
 def main():
     # -------------------------------------------------------------------------
@@ -18,58 +26,37 @@ def main():
     # Coordinates for the scale bar (example)
     x1, y1 = 306, 36
     x2, y2 = 315, 211
-    cropped_scale = image[y1:y2, x1:x2]
 
     # -------------------------------------------------------------------------
-    # 2) ASK USER FOR MIN/MAX TEMPERATURE AND BUILD color_temp_map
+    # 2) ASK USER FOR MIN/MAX TEMPERATURE AND BUILD THE PALETTE
     # -------------------------------------------------------------------------
     min_temp = float(input("Enter the MIN temperature on the scale: "))
     max_temp = float(input("Enter the MAX temperature on the scale: "))
 
-    scale_height, scale_width, _ = cropped_scale.shape
-    color_temp_map = []  # will hold (temperature, [B, G, R])
-
-    for row_index in range(scale_height):
-        row_pixels = cropped_scale[row_index, :, :]
-        avg_bgr = np.mean(row_pixels, axis=0).tolist()  # [B, G, R]
-
-        # Interpolate temperature from top = max_temp to bottom = min_temp
-        fraction = row_index / (scale_height - 1) if scale_height > 1 else 0
-        row_temp = max_temp - fraction * (max_temp - min_temp)
-
-        color_temp_map.append((row_temp, avg_bgr))
+    # The palette holds one (temperature, [B, G, R]) row per scale bar row,
+    # already sorted by ascending temperature.
+    palette = TemperaturePalette.from_scale(image, min_temp, max_temp, x1, y1, x2, y2)
 
     # -------------------------------------------------------------------------
-    # 3) CREATE A CUSTOM MATPLOTLIB COLORMAP FROM color_temp_map
+    # 3) CREATE A CUSTOM MATPLOTLIB COLORMAP FROM THE PALETTE
     # -------------------------------------------------------------------------
-    # color_temp_map is a list of (temp, [B, G, R]) from top (max_temp) to bottom (min_temp).
     # We want to:
-    #   1) Sort by temperature (descending or ascending)
+    #   1) Sort by temperature (the palette is already ascending)
     #   2) Normalize temperature to [0, 1]
     #   3) Convert BGR to normalized RGB
     #   4) Create a colormap
 
-    # 3a. Sort by ascending temperature if needed
-    color_temp_map.sort(key=lambda x: x[0])  # sorts by temperature ascending
-
-    # 3b. Extract separate lists for temperature and BGR
-    temps = [item[0] for item in color_temp_map]  # e.g. [5.0, 6.0, ..., 42.7]
-    bgrs = [item[1] for item in color_temp_map]  # e.g. [[10, 50, 200], ...]
+    # 3b. Use the palette's temperature and BGR arrays directly
+    temps = palette.temps  # e.g. [5.0, 6.0, ..., 42.7]
+    bgrs = palette.colors  # e.g. [[10, 50, 200], ...]
 
     # 3c. Normalize temperature range to [0, 1]
-    tmin, tmax = min(temps), max(temps)
-    temp_norm = [(t - tmin) / (tmax - tmin) if (tmax - tmin) != 0 else 0 for t in temps]
+    tmin, tmax = temps.min(), temps.max()
+    temp_norm = (temps - tmin) / (tmax - tmin) if tmax != tmin else np.zeros(len(temps))
 
     # 3d. Convert BGR to normalized RGB
     # OpenCV images are typically BGR in [0..255]. Matplotlib expects RGB in [0..1].
-    rgbs = []
-    for bgr in bgrs:
-        b, g, r = bgr
-        # Convert to 0..1 range
-        r_norm = r / 255.0
-        g_norm = g / 255.0
-        b_norm = b / 255.0
-        rgbs.append((r_norm, g_norm, b_norm))
+    rgbs = [tuple(rgb) for rgb in bgrs[:, ::-1] / 255.0]
 
     # 3e. Build a list of (normalized_temp, (r, g, b)) for the colormap
     cdict = list(zip(temp_norm, rgbs))
@@ -104,7 +91,7 @@ def main():
     with open(csv_filename, "w", newline="") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["RowIndex", "Temperature", "B", "G", "R"])
-        for row_index, (temp, bgr) in enumerate(color_temp_map):
+        for row_index, (temp, bgr) in enumerate(palette):
             b, g, r = bgr
             writer.writerow(
                 [row_index, f"{temp:.2f}", f"{b:.2f}", f"{g:.2f}", f"{r:.2f}"]